@@ -4,6 +4,9 @@ import nest_asyncio
 nest_asyncio.apply()
 
 from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Any, Awaitable, Coroutine, Dict
@@ -12,7 +15,7 @@ import uuid
 import models
 
 from apps.agent_zero_core.python.helpers import extract_tools, files, errors, history, tokens
-from apps.agent_zero_core.python.helpers import dirty_json
+from apps.agent_zero_core.python.helpers import dirty_json, model_router, prompt_layout, utility_cache
 from apps.agent_zero_core.python.helpers.print_style import PrintStyle
 from langchain_core.prompts import (
     ChatPromptTemplate,
@@ -34,8 +37,13 @@ class AgentContextType(Enum):
 
 class AgentContext:
 
+    # reads (get/first/all) take no lock: single dict operations are atomic under
+    # the GIL. Writers serialize on _write_lock; creation is guarded per id.
     _contexts: dict[str, "AgentContext"] = {}
     _counter: int = 0
+    _write_lock = threading.RLock()
+    _creation_guards: dict[str, list] = {}  # id -> [lock, waiters]
+    _guards_lock = threading.Lock()
 
     def __init__(
         self,
@@ -51,6 +59,7 @@ class AgentContext:
         last_message: datetime | None = None,
     ):
         # build context
+        self._load_lock = threading.RLock()  # load/unload and use (touch, communicate)
         self.id = id or str(uuid.uuid4())
         self.name = name
         self.config = config
@@ -61,15 +70,126 @@ class AgentContext:
         self.task: DeferredTask | None = None
         self.created_at = created_at or datetime.now(timezone.utc)
         self.type = type
-        AgentContext._counter += 1
-        self.no = AgentContext._counter
         # set to start of unix epoch
         self.last_message = last_message or datetime.now(timezone.utc)
+        self.last_access = time.monotonic()  # LRU key for idle eviction
+
+        with AgentContext._write_lock:
+            AgentContext._counter += 1
+            self.no = AgentContext._counter
+            existing = self._contexts.get(self.id, None)
+            if existing:
+                AgentContext.remove(self.id)
+            self._contexts[self.id] = self
+
+    # attributes a stub context (see `stub`) fills in on first access
+    _LAZY_FIELDS = frozenset(("config", "log", "agent0", "streaming_agent"))
+
+    @classmethod
+    def stub(
+        cls,
+        id: str,
+        loader: Callable[["AgentContext"], None],
+        summary: dict,
+        name: str | None = None,
+        created_at: datetime | None = None,
+        type: AgentContextType = AgentContextType.USER,
+        last_message: datetime | None = None,
+    ) -> "AgentContext":
+        """Register a context known only from its saved summary.
+
+        Agents, history and log are not built until one of `_LAZY_FIELDS` is
+        first read; then `loader(context)` fills them in. `summary` provides
+        log_guid/log_version/log_length so `serialize` works without loading.
+        """
+        ctx = cls.__new__(cls)
+        ctx.id = id
+        ctx.name = name
+        ctx.paused = False
+        ctx.task = None
+        ctx.created_at = created_at or datetime.now(timezone.utc)
+        ctx.type = type
+        ctx.last_message = last_message or datetime.now(timezone.utc)
+        ctx.last_access = 0.0
+        ctx._summary = summary
+        ctx._loader = loader
+        ctx._load_lock = threading.RLock()
+        with AgentContext._write_lock:
+            AgentContext._counter += 1
+            ctx.no = AgentContext._counter
+            if id not in AgentContext._contexts:
+                AgentContext._contexts[id] = ctx
+        return AgentContext._contexts[id]
+
+    def __getattr__(self, name: str):
+        # only reached for attributes that are not set: lazy fields of a stub
+        d = self.__dict__
+        if name in AgentContext._LAZY_FIELDS and "_load_lock" in d:
+            with d["_load_lock"]:
+                loader = d.get("_loader")
+                if loader is not None:
+                    d["_loader"] = None  # loading: re-entrant reads fall through
+                    try:
+                        loader(self)
+                    finally:
+                        d.pop("_loader", None)
+                    self.last_access = time.monotonic()
+            if name in d:
+                return d[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @property
+    def is_loaded(self) -> bool:
+        return "_loader" not in self.__dict__
+
+    def touch(self):
+        # waits for an unload in progress; after it the context is loaded again on access
+        with self._load_lock:
+            self.last_access = time.monotonic()
+
+    def is_busy(self) -> bool:
+        return bool(self.task and self.task.is_alive())
 
-        existing = self._contexts.get(self.id, None)
-        if existing:
-            AgentContext.remove(self.id)
-        self._contexts[self.id] = self
+    def unload(
+        self,
+        loader: Callable[["AgentContext"], None],
+        save: Callable[["AgentContext"], dict],
+        idle_before: float | None = None,
+    ) -> bool:
+        """Turn a loaded context back into a stub (see `stub`), releasing agents,
+        history, log and per-agent resources (shells, browser sessions).
+        `save` persists it and returns the stub summary; `loader` restores it on
+        next access. Returns False, keeping the context, when it is busy, paused or
+        was used after `idle_before` - checked under the lock touch() and
+        communicate() take, so a request racing the caller's idle check wins."""
+        d = self.__dict__
+        with self._load_lock:
+            if not self.is_loaded:
+                return False
+            if self.is_busy() or self.paused:
+                return False
+            if idle_before is not None and self.last_access > idle_before:
+                return False
+            summary = save(self)
+            agent = d.get("agent0")
+            while agent:
+                _release_agent_resources(agent)
+                agent = agent.get_data(Agent.DATA_NAME_SUBORDINATE)
+            self._summary = summary
+            self._loader = loader
+            for name in AgentContext._LAZY_FIELDS:
+                d.pop(name, None)
+            return True
+
+    def has_live_sessions(self) -> bool:
+        """True when an agent of this (loaded) context holds an open terminal
+        or browser session, state that unload would destroy."""
+        agent = self.__dict__.get("agent0")
+        while agent:
+            if _has_live_sessions(agent):
+                return True
+            agent = agent.get_data(Agent.DATA_NAME_SUBORDINATE)
+        return False
 
     @staticmethod
     def get(id: str):
@@ -87,12 +207,49 @@ class AgentContext:
 
     @staticmethod
     def remove(id: str):
-        context = AgentContext._contexts.pop(id, None)
+        with AgentContext._write_lock:
+            context = AgentContext._contexts.pop(id, None)
         if context and context.task:
             context.task.kill()
         return context
 
+    @staticmethod
+    @contextmanager
+    def creation_guard(id: str):
+        """Serialize creation of one context id without blocking lookups or other ids."""
+        with AgentContext._guards_lock:
+            guard = AgentContext._creation_guards.setdefault(id, [threading.Lock(), 0])
+            guard[1] += 1
+        try:
+            with guard[0]:
+                yield
+        finally:
+            with AgentContext._guards_lock:
+                guard[1] -= 1
+                if not guard[1]:
+                    del AgentContext._creation_guards[id]
+
+    @staticmethod
+    def get_or_create(id: str, factory: Callable[[], "AgentContext"]) -> "AgentContext":
+        got = AgentContext._contexts.get(id)
+        if got:
+            return got
+        with AgentContext.creation_guard(id):
+            # another request may have created it while we waited
+            got = AgentContext._contexts.get(id)
+            if got:
+                return got
+            return factory()
+
     def serialize(self):
+        if self.is_loaded:
+            log_info = {
+                "log_guid": self.log.guid,
+                "log_version": len(self.log.updates),
+                "log_length": len(self.log.logs),
+            }
+        else:
+            log_info = self._summary
         return {
             "id": self.id,
             "name": self.name,
@@ -102,9 +259,9 @@ class AgentContext:
                 else Localization.get().serialize_datetime(datetime.fromtimestamp(0))
             ),
             "no": self.no,
-            "log_guid": self.log.guid,
-            "log_version": len(self.log.updates),
-            "log_length": len(self.log.logs),
+            "log_guid": log_info["log_guid"],
+            "log_version": log_info["log_version"],
+            "log_length": log_info["log_length"],
             "paused": self.paused,
             "last_message": (
                 Localization.get().serialize_datetime(self.last_message)
@@ -127,6 +284,8 @@ class AgentContext:
     ) -> list[Log.LogItem]:
         items: list[Log.LogItem] = []
         for context in AgentContext.all():
+            if not context.is_loaded:
+                continue  # do not load every saved chat just to append a notice
             items.append(
                 context.log.log(
                     type, heading, content, kvps, temp, update_progress, id, **kwargs
@@ -155,6 +314,11 @@ class AgentContext:
         return self.streaming_agent or self.agent0
 
     def communicate(self, msg: "UserMessage", broadcast_level: int = 1):
+        # the task is started before an eviction can re-check is_busy()
+        with self._load_lock:
+            return self._communicate(msg, broadcast_level)
+
+    def _communicate(self, msg: "UserMessage", broadcast_level: int):
         self.paused = False  # unpause if paused
 
         current_agent = self.get_agent()
@@ -258,6 +422,24 @@ class LoopData:
             setattr(self, key, value)
 
 
+class CtxWindow:
+    """Last prompt sent to the chat model, rendered to text only when requested."""
+
+    def __init__(self, prompt: list[BaseMessage]):
+        self.prompt = prompt
+        self._text: str | None = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = ChatPromptTemplate.from_messages(self.prompt).format()
+        return self._text
+
+    @property
+    def tokens(self) -> int:
+        return tokens.estimate_tokens(self.text)
+
+
 # intervention exception class - skips rest of message loop iteration
 class InterventionException(Exception):
     pass
@@ -272,6 +454,32 @@ class HandledException(Exception):
     pass
 
 
+def _has_live_sessions(agent: "Agent") -> bool:
+    for key, value in agent.data.items():
+        if key in (Agent.DATA_NAME_SUPERIOR, Agent.DATA_NAME_SUBORDINATE):
+            continue
+        # browser agent state / code execution state, see _release_agent_resources
+        if getattr(value, "browser_session", None) or getattr(value, "shells", None):
+            return True
+    return False
+
+
+def _release_agent_resources(agent: "Agent"):
+    for key, value in list(agent.data.items()):
+        if key in (Agent.DATA_NAME_SUPERIOR, Agent.DATA_NAME_SUBORDINATE):
+            continue
+        try:
+            # browser agent state
+            kill_task = getattr(value, "kill_task", None)
+            if callable(kill_task):
+                kill_task()
+            # code execution state: interactive local/ssh shells
+            for shell in (getattr(value, "shells", None) or {}).values():
+                shell.close()
+        except Exception as e:
+            PrintStyle.error(f"Error releasing {key} of {agent.agent_name}: {e}")
+
+
 class Agent:
 
     DATA_NAME_SUPERIOR = "_superior"
@@ -303,7 +511,15 @@ class Agent:
 
 
 
+    def streams_to_context(self) -> bool:
+        # only agents on the superior/subordinate chain become the context's streaming agent;
+        # parallel subordinates (call_subordinate fan-out) are not on it, so while they run
+        # the caller stays the streaming agent and receives interventions
+        superior = self.get_data(Agent.DATA_NAME_SUPERIOR)
+        return superior is None or superior.get_data(Agent.DATA_NAME_SUBORDINATE) is self
+
     async def monologue(self):
+        streams = self.streams_to_context()
         while True:
             try:
                 # loop data dictionary to pass to extensions
@@ -316,7 +532,8 @@ class Agent:
                 # let the agent run message loop until he stops it with a response tool
                 while True:
 
-                    self.context.streaming_agent = self  # mark self as current streamer
+                    if streams:
+                        self.context.streaming_agent = self  # mark self as current streamer
                     self.loop_data.iteration += 1
                     self.loop_data.params_temporary = {}  # clear temporary params
 
@@ -400,7 +617,8 @@ class Agent:
             except Exception as e:
                 self.handle_critical_exception(e)
             finally:
-                self.context.streaming_agent = None  # unset current streamer
+                if streams:
+                    self.context.streaming_agent = None  # unset current streamer
                 # call monologue_end extensions
                 await self.call_extensions("monologue_end", loop_data=self.loop_data)  # type: ignore
 
@@ -421,37 +639,40 @@ class Agent:
         system_text = "\n\n".join(loop_data.system)
 
         # join extras
-        extras = history.Message(
-            False,
-            content=self.read_prompt(
-                "agent.context.extras.md",
-                extras=dirty_json.stringify(
-                    {**loop_data.extras_persistent, **loop_data.extras_temporary}
-                ),
+        extras_text = self.read_prompt(
+            "agent.context.extras.md",
+            extras=dirty_json.stringify(
+                {**loop_data.extras_persistent, **loop_data.extras_temporary}
             ),
-        ).output()
+        )
         loop_data.extras_temporary.clear()
 
-        # convert history + extras to LLM format
-        history_langchain: list[BaseMessage] = history.output_langchain(
-            loop_data.history_output + extras
-        )
+        if prompt_layout.get_layout() == prompt_layout.LAYOUT_STABLE:
+            # volatile extras stay out of the cached prefix, see prompt_layout
+            full_prompt = prompt_layout.stable_prompt(
+                system_text,
+                self.history.output_langchain(loop_data.history_output),
+                extras_text,
+                cache_control=prompt_layout.supports_cache_control(
+                    self.config.chat_model
+                ),
+            )
+        else:
+            extras = history.Message(False, content=extras_text).output()
 
-        # build full prompt from system prompt, message history and extrS
-        full_prompt: list[BaseMessage] = [
-            SystemMessage(content=system_text),
-            *history_langchain,
-        ]
-        full_text = ChatPromptTemplate.from_messages(full_prompt).format()
-
-        # store as last context window content
-        self.set_data(
-            Agent.DATA_NAME_CTX_WINDOW,
-            {
-                "text": full_text,
-                "tokens": tokens.approximate_tokens(full_text),
-            },
-        )
+            # convert history + extras to LLM format (unchanged records reuse their conversion)
+            history_langchain: list[BaseMessage] = self.history.output_langchain(
+                loop_data.history_output + extras
+            )
+
+            # build full prompt from system prompt, message history and extrS
+            full_prompt: list[BaseMessage] = [
+                SystemMessage(content=system_text),
+                *history_langchain,
+            ]
+
+        # store as last context window content, text is rendered by ctx_window_get on demand
+        self.set_data(Agent.DATA_NAME_CTX_WINDOW, CtxWindow(full_prompt))
 
         return full_prompt
 
@@ -608,30 +829,38 @@ class Agent:
         callback: Callable[[str], Awaitable[None]] | None = None,
         background: bool = False,
     ):
-        model = self.get_utility_model()
-
-        # rate limiter
-        limiter = await self.rate_limiter(
-            self.config.utility_model, f"SYSTEM: {system}\nUSER: {message}", background
-        )
+        # identical requests are served from the disk cache when enabled
+        cache_key = utility_cache.make_key(self.config.utility_model, system, message)
+        cached = utility_cache.get(cache_key)
+        if cached is not None:
+            if callback:
+                await callback(cached)
+            return cached
 
-        # add output tokens to rate limiter in tokens callback
+        # check for interventions while streaming, output tokens go to the rate limiter
         async def tokens_callback(delta: str, tokens: int):
             await self.handle_intervention()
-            limiter.add(output=tokens)
 
         # propagate stream to callback if set
         async def stream_callback(chunk: str, total: str):
             if callback:
                 await callback(chunk)
 
-        response, _reasoning = await model.unified_call(
-            system_message=system,
-            user_message=message,
+        response, _reasoning, answered_by = await self._call_routed_model(
+            "utility",
+            self.config.utility_model,
+            "A0_UTILITY_MODEL_FALLBACKS",
+            limiter_input=f"SYSTEM: {system}\nUSER: {message}",
+            background=background,
             response_callback=stream_callback,
             tokens_callback=tokens_callback,
+            system_message=system,
+            user_message=message,
         )
 
+        # a fallback model's answer must not be served as the configured model's
+        if answered_by is self.config.utility_model:
+            utility_cache.put(cache_key, response)
         return response
 
     async def call_chat_model(
@@ -642,31 +871,88 @@ class Agent:
     ):
         response = ""
 
-        # model class
-        model = self.get_chat_model()
-
-        # rate limiter
-        limiter = await self.rate_limiter(
-            self.config.chat_model, ChatPromptTemplate.from_messages(messages).format()
-        )
-
-        # add output tokens to rate limiter in tokens callback
+        # check for interventions while streaming, output tokens go to the rate limiter
         async def tokens_callback(delta: str, tokens: int):
             await self.handle_intervention()
-            limiter.add(output=tokens)
 
         # call model
-        response, reasoning = await model.unified_call(
-            messages=messages,
+        response, reasoning, _answered_by = await self._call_routed_model(
+            "chat",
+            self.config.chat_model,
+            "A0_CHAT_MODEL_FALLBACKS",
+            input_tokens=sum(
+                tokens.estimate_tokens(m.content if isinstance(m.content, str) else str(m.content))
+                for m in messages
+            ),
             reasoning_callback=reasoning_callback,
             response_callback=response_callback,
             tokens_callback=tokens_callback,
+            messages=messages,
         )
 
         return response, reasoning
 
+    async def _call_routed_model(
+        self,
+        role: str,
+        config: models.ModelConfig,
+        fallbacks_env: str,
+        limiter_input: str = "",
+        input_tokens: int | None = None,
+        background: bool = False,
+        response_callback: Callable[[str, str], Awaitable[None]] | None = None,
+        reasoning_callback: Callable[[str, str], Awaitable[None]] | None = None,
+        tokens_callback: Callable[[str, int], Awaitable[None]] | None = None,
+        **kwargs,
+    ):
+        # configured model plus fallbacks, hedged on slow first token (see model_router);
+        # only the attempt that streams first passes its output to the callbacks.
+        # Every attempt, hedges included, is a real request and goes through the rate limiter.
+        # Returns (response, reasoning, config of the model that answered).
+        get_configured_model = self.get_chat_model if role == "chat" else self.get_utility_model
+
+        async def attempt(model_config: models.ModelConfig, claim: Callable[[], bool]):
+            limiter = await self.rate_limiter(
+                model_config, limiter_input, background, input_tokens=input_tokens
+            )
+            if model_config is config:
+                model = get_configured_model()
+            else:
+                model = models.get_chat_model(
+                    model_config.provider, model_config.name, **model_config.build_kwargs()
+                )
+
+            async def on_response(delta: str, total: str):
+                if claim() and response_callback:
+                    await response_callback(delta, total)
+
+            async def on_reasoning(delta: str, total: str):
+                if claim() and reasoning_callback:
+                    await reasoning_callback(delta, total)
+
+            async def on_tokens(delta: str, count: int):
+                limiter.add(output=count)
+                if claim() and tokens_callback:
+                    await tokens_callback(delta, count)
+
+            response, reasoning = await model.unified_call(
+                response_callback=on_response,
+                reasoning_callback=on_reasoning,
+                tokens_callback=on_tokens,
+                first_chunk_callback=claim,  # the router times the first token here
+                **kwargs,
+            )
+            return response, reasoning, model_config
+
+        router = model_router.get_router(role)
+        return await router.call(model_router.candidates(config, fallbacks_env), attempt)
+
     async def rate_limiter(
-        self, model_config: models.ModelConfig, input: str, background: bool = False
+        self,
+        model_config: models.ModelConfig,
+        input: str,
+        background: bool = False,
+        input_tokens: int | None = None,
     ):
         # rate limiter log
         wait_log = None
@@ -692,7 +978,9 @@ class Agent:
             model_config.limit_input,
             model_config.limit_output,
         )
-        limiter.add(input=tokens.approximate_tokens(input))
+        limiter.add(
+            input=tokens.estimate_tokens(input) if input_tokens is None else input_tokens
+        )
         limiter.add(requests=1)
         await limiter.wait(callback=wait_callback)
         return limiter
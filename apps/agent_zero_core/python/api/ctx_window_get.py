@@ -1,6 +1,6 @@
 from python.helpers.api import ApiHandler, Input, Output, Request, Response
 
-from python.helpers import tokens
+from agent import CtxWindow
 
 
 class GetCtxWindow(ApiHandler):
@@ -9,6 +9,9 @@ class GetCtxWindow(ApiHandler):
         context = self.get_context(ctxid)
         agent = context.streaming_agent or context.agent0
         window = agent.get_data(agent.DATA_NAME_CTX_WINDOW)
+        if isinstance(window, CtxWindow):
+            return {"content": window.text, "tokens": window.tokens}
+        # plain dict when restored from a chat saved before the lazy window
         if not window or not isinstance(window, dict):
             return {"content": "", "tokens": 0}
 
@@ -13,6 +13,6 @@ class OrganizeHistory(Extension):
             return
 
         # start task
-        task = asyncio.create_task(self.agent.history.compress())
+        task = asyncio.create_task(self.agent.history.compress(presummarize=True))
         # set to agent to be able to wait for it
         self.agent.set_data(DATA_NAME_TASK, task)
@@ -79,13 +79,18 @@ class ApiHandler:
 
     # get context to run agent zero in
     def get_context(self, ctxid: str):
-        with self.thread_lock:
-            if not ctxid:
-                first = AgentContext.first()
-                if first:
-                    return first
-                return AgentContext(config=initialize_agent())
-            got = AgentContext.get(ctxid)
-            if got:
-                return got
-            return AgentContext(config=initialize_agent(), id=ctxid)
+        context = self._get_or_create_context(ctxid)
+        context.touch()  # keeps it off the idle-eviction list
+        return context
+
+    def _get_or_create_context(self, ctxid: str):
+        # lookups are lock-free; only requests creating the same id wait on each other
+        if not ctxid:
+            first = AgentContext.first()
+            if first:
+                return first
+            with AgentContext.creation_guard(""):
+                return AgentContext.first() or AgentContext(config=initialize_agent())
+        return AgentContext.get_or_create(
+            ctxid, lambda: AgentContext(config=initialize_agent(), id=ctxid)
+        )
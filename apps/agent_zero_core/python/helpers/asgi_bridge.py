@@ -0,0 +1,106 @@
+import asyncio
+import io
+import sys
+from typing import Any, Awaitable, Callable
+
+from flask import Flask, Response
+
+
+# Native ASGI serving of Flask-based API handlers.
+# The request is read on the server's event loop, wrapped into a WSGI environ
+# (so flask.request/session/send_file keep working inside a request context)
+# and the async handler is awaited directly on that same loop - no worker
+# thread per request and no per-request event loop.
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+
+async def read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def build_environ(scope: Scope, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        key = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key != "CONTENT_LENGTH":
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def send_response(response: Response, send: Send) -> None:
+    headers = [
+        (k.lower().encode("latin1"), v.encode("latin1"))
+        for k, v in response.headers.items()
+    ]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    try:
+        if response.is_streamed:
+            # send_file and generators may block on disk: pull chunks off-loop
+            chunks = iter(response.iter_encoded())
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        else:
+            await send({"type": "http.response.body", "body": response.get_data()})
+    finally:
+        response.close()
+
+
+class FlaskViewApp:
+    """An async Flask view (already decorated with auth/csrf checks) as an ASGI app."""
+
+    def __init__(self, app: Flask, view: Callable[[], Awaitable[Any]]):
+        self.app = app
+        self.view = view
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        body = await read_body(receive)
+        with self.app.request_context(build_environ(scope, body)):
+            # same two levels as Flask.wsgi_app/full_dispatch_request: HTTP errors
+            # (abort(404), bad json...) keep their status, anything else is a 500
+            try:
+                try:
+                    rv = await self.view()
+                except Exception as e:
+                    rv = self.app.handle_user_exception(e)
+                response = self.app.make_response(rv)
+            except Exception as e:
+                response = self.app.make_response(self.app.handle_exception(e))
+            # after_request hooks + session cookie (csrf token lives in the session)
+            response = self.app.process_response(response)
+        await send_response(response, send)
@@ -0,0 +1,79 @@
+import time
+
+from agent import AgentContext
+from python.helpers import persist_chat
+from python.helpers.dotenv import get_dotenv_value
+from python.helpers.print_style import PrintStyle
+
+# Idle contexts are saved to tmp/chats and turned back into stubs
+# (AgentContext.unload); the next poll or message loads them again.
+# Off unless one of the budgets is set; contexts with an open terminal or
+# browser session are never unloaded.
+#   A0_CONTEXT_MAX_LOADED         - count budget of loaded contexts (0 = no limit)
+#   A0_CONTEXT_IDLE_SECONDS       - unload anything idle this long, even under budget (0 = off)
+#   A0_CONTEXT_MAX_RSS_MB         - process RSS budget; above it idle contexts are unloaded (0 = off)
+#   A0_CONTEXT_MIN_IDLE_SECONDS   - never unload a context used more recently than this
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(get_dotenv_value(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _rss_mb() -> float:
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+def evict_idle_contexts(now: float | None = None) -> list[str]:
+    max_loaded = _int_env("A0_CONTEXT_MAX_LOADED", 0)
+    idle_seconds = _int_env("A0_CONTEXT_IDLE_SECONDS", 0)
+    max_rss_mb = _int_env("A0_CONTEXT_MAX_RSS_MB", 0)
+    if max_loaded <= 0 and idle_seconds <= 0 and max_rss_mb <= 0:
+        return []
+    min_idle = _int_env("A0_CONTEXT_MIN_IDLE_SECONDS", 120)
+    now = time.monotonic() if now is None else now
+
+    loaded = [ctx for ctx in AgentContext.all() if ctx.is_loaded]
+    # least recently used first; running or paused chats and live sessions stay in memory
+    idle = sorted(
+        (
+            ctx
+            for ctx in loaded
+            if not ctx.is_busy()
+            and not ctx.paused
+            and now - ctx.last_access >= min_idle
+            and not ctx.has_live_sessions()
+        ),
+        key=lambda ctx: ctx.last_access,
+    )
+
+    to_evict = []
+    over_budget = len(loaded) - max_loaded if max_loaded > 0 else 0
+    if max_rss_mb > 0 and _rss_mb() > max_rss_mb:
+        # RSS only drops after GC/allocator release: shed a quarter of what is loaded
+        over_budget = max(over_budget, len(loaded) // 4, 1)
+    for ctx in idle:
+        if over_budget > 0:
+            to_evict.append(ctx)
+            over_budget -= 1
+        elif idle_seconds > 0 and now - ctx.last_access >= idle_seconds:
+            to_evict.append(ctx)
+
+    evicted = []
+    for ctx in to_evict:
+        try:
+            # idle state is checked again under the context's lock: a message may have arrived
+            if persist_chat.unload_chat(ctx, idle_before=now - min_idle):
+                evicted.append(ctx.id)
+        except Exception as e:
+            PrintStyle.error(f"Failed to unload context {ctx.id}: {e}")
+    if evicted:
+        PrintStyle.debug(f"Unloaded {len(evicted)} idle contexts ({len(loaded) - len(evicted)} loaded)")
+    return evicted
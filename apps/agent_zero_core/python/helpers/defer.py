@@ -38,11 +38,28 @@ class EventLoopThread:
         self.loop.run_forever()
 
     def terminate(self):
-        if self.loop and self.loop.is_running():
-            self.loop.stop()
+        loop = self.loop
+        if loop and loop.is_running():
+            # pooled model clients are bound to this loop, close them on it before it stops
+            import models
+
+            closing = asyncio.run_coroutine_threadsafe(models.aclose_clients(), loop)
+            closing.add_done_callback(lambda _: loop.call_soon_threadsafe(loop.stop))
         self.loop = None
         self.thread = None
 
+    @classmethod
+    def terminate_all(cls, timeout: float = 5.0) -> None:
+        """Terminate every event loop thread, waiting for their loops to stop."""
+        with cls._lock:
+            instances = list(cls._instances.values())
+        threads = [instance.thread for instance in instances]
+        for instance in instances:
+            instance.terminate()
+        for thread in threads:
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout)
+
     def run_coroutine(self, coro):
         self._start()
         if not self.loop:
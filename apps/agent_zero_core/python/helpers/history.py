@@ -17,6 +17,8 @@ HISTORY_BULK_RATIO = 0.2
 TOPIC_COMPRESS_RATIO = 0.65
 LARGE_MESSAGE_TO_TOPIC_RATIO = 0.25
 RAW_MESSAGE_OUTPUT_TEXT_TRIM = 100
+SUMMARIZE_CONCURRENCY = 4  # parallel utility model calls when summarizing topics
+PRESUMMARIZE_RATIO = 0.8  # share of the history limit where topics are summarized ahead, kept aside
 
 
 class RawMessage(TypedDict):
@@ -40,6 +42,11 @@ class OutputMessage(TypedDict):
 
 
 class Record:
+    # container holding this record; changes are pushed up to it
+    _parent: "Record | None" = None
+    # memoized output(), dropped by _changed
+    _output_cache: "list[OutputMessage] | None" = None
+
     def __init__(self):
         pass
 
@@ -47,6 +54,19 @@ class Record:
     def get_tokens(self) -> int:
         pass
 
+    def _adopt(self, record: "Record") -> "Record":
+        record._parent = self
+        return record
+
+    def _changed(self, before: int):
+        # drop memoized output here and up the tree, pushing the token delta into cached totals
+        self._output_cache = None
+        if self._parent is not None:
+            self._parent._child_changed(self, self.get_tokens() - before)
+
+    def _child_changed(self, child: "Record", delta: int):
+        pass
+
     @abstractmethod
     async def compress(self) -> bool:
         pass
@@ -92,14 +112,21 @@ class Message(Record):
         return tokens.approximate_tokens(text)
 
     def set_summary(self, summary: str):
+        before = self.get_tokens()
         self.summary = summary
+        self._output_cache = None
         self.tokens = self.calculate_tokens()
+        self._changed(before)
 
     async def compress(self):
         return False
 
     def output(self):
-        return [OutputMessage(ai=self.ai, content=self.summary or self.content)]
+        if self._output_cache is None:
+            self._output_cache = [
+                OutputMessage(ai=self.ai, content=self.summary or self.content)
+            ]
+        return self._output_cache
 
     def output_langchain(self):
         return output_langchain(self.output())
@@ -121,40 +148,89 @@ class Message(Record):
         content = data.get("content", "Content lost")
         msg = Message(ai=data["ai"], content=content)
         msg.summary = data.get("summary", "")
+        msg._output_cache = None  # built without the summary by the token count above
         msg.tokens = data.get("tokens", 0)
         return msg
 
 
-class Topic(Record):
+class Group(Record):
+    """Record made of other records, replaced by its summary once summarized.
+
+    Token totals are cached: the summary is counted once when set and the
+    children total is kept up to date by the mutating methods, so get_tokens
+    is O(1).
+    """
+
+    def __init__(self):
+        self._summary: str = ""
+        self._summary_tokens: int = 0
+        self._children_tokens: int = 0
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    @summary.setter
+    def summary(self, summary: str):
+        before = self.get_tokens()
+        self._summary = summary
+        self._summary_tokens = tokens.approximate_tokens(summary) if summary else 0
+        self._changed(before)
+
+    def get_tokens(self) -> int:
+        if self._summary:
+            return self._summary_tokens
+        return self._children_tokens
+
+    def _child_changed(self, child: Record, delta: int):
+        self._add_children_tokens(delta)
+
+    def _add_children_tokens(self, delta: int):
+        before = self.get_tokens()
+        self._children_tokens += delta
+        self._changed(before)
+
+
+class Topic(Group):
     def __init__(self, history: "History"):
+        super().__init__()
         self.history = history
-        self.summary: str = ""
         self.messages: list[Message] = []
+        # summary computed ahead by presummarize, applied only by summarize
+        self._pending_summary: str = ""
 
-    def get_tokens(self):
-        if self.summary:
-            return tokens.approximate_tokens(self.summary)
-        else:
-            return sum(msg.get_tokens() for msg in self.messages)
+    def _child_changed(self, child: Record, delta: int):
+        self._pending_summary = ""  # computed from the old messages
+        super()._child_changed(child, delta)
 
     def add_message(
         self, ai: bool, content: MessageContent, tokens: int = 0
     ) -> Message:
         msg = Message(ai=ai, content=content, tokens=tokens)
-        self.messages.append(msg)
+        self.messages.append(self._adopt(msg))  # type: ignore
+        self._add_children_tokens(msg.get_tokens())
         return msg
 
     def output(self) -> list[OutputMessage]:
-        if self.summary:
-            return [OutputMessage(ai=False, content=self.summary)]
-        else:
-            msgs = [m for r in self.messages for m in r.output()]
-            return msgs
+        if self._output_cache is None:
+            if self.summary:
+                self._output_cache = [OutputMessage(ai=False, content=self.summary)]
+            else:
+                self._output_cache = [m for r in self.messages for m in r.output()]
+        return self._output_cache
 
     async def summarize(self):
-        self.summary = await self.summarize_messages(self.messages)
+        self.summary = self._pending_summary or await self.summarize_messages(self.messages)
+        self._pending_summary = ""
         return self.summary
 
+    async def presummarize(self):
+        # compute the summary without applying it, the topic stays in full detail
+        messages = list(self.messages)
+        summary = await self.summarize_messages(messages)
+        if messages == self.messages and not self.summary:
+            self._pending_summary = summary
+
     async def compress_large_messages(self) -> bool:
         set = settings.get_settings()
         msg_max_size = (
@@ -210,7 +286,10 @@ class Topic(Record):
                 "fw.msg_summary.md", summary=summary
             )
             sum_msg = Message(False, sum_msg_content)
-            self.messages[1 : cnt_to_sum + 1] = [sum_msg]
+            self.messages[1 : cnt_to_sum + 1] = [self._adopt(sum_msg)]  # type: ignore
+            self._add_children_tokens(
+                sum_msg.get_tokens() - sum(m.get_tokens() for m in msg_to_sum)
+            )
             return True
         return False
 
@@ -237,31 +316,32 @@ class Topic(Record):
         topic = Topic(history=history)
         topic.summary = data.get("summary", "")
         topic.messages = [
-            Message.from_dict(m, history=history) for m in data.get("messages", [])
+            topic._adopt(Message.from_dict(m, history=history))  # type: ignore
+            for m in data.get("messages", [])
         ]
+        topic._children_tokens = sum(m.get_tokens() for m in topic.messages)
         return topic
 
 
-class Bulk(Record):
+class Bulk(Group):
     def __init__(self, history: "History"):
+        super().__init__()
         self.history = history
-        self.summary: str = ""
         self.records: list[Record] = []
 
-    def get_tokens(self):
-        if self.summary:
-            return tokens.approximate_tokens(self.summary)
-        else:
-            return sum([r.get_tokens() for r in self.records])
+    def add_record(self, record: Record):
+        self.records.append(self._adopt(record))
+        self._add_children_tokens(record.get_tokens())
 
     def output(
         self, human_label: str = "user", ai_label: str = "ai"
     ) -> list[OutputMessage]:
-        if self.summary:
-            return [OutputMessage(ai=False, content=self.summary)]
-        else:
-            msgs = [m for r in self.records for m in r.output()]
-            return msgs
+        if self._output_cache is None:
+            if self.summary:
+                self._output_cache = [OutputMessage(ai=False, content=self.summary)]
+            else:
+                self._output_cache = [m for r in self.records for m in r.output()]
+        return self._output_cache
 
     async def compress(self):
         return False
@@ -286,8 +366,8 @@ class Bulk(Record):
     def from_dict(data: dict, history: "History"):
         bulk = Bulk(history=history)
         bulk.summary = data["summary"]
-        cls = data["_cls"]
-        bulk.records = [Record.from_dict(r, history=history) for r in data["records"]]
+        for r in data["records"]:
+            bulk.add_record(Record.from_dict(r, history=history))
         return bulk
 
 
@@ -297,8 +377,13 @@ class History(Record):
 
         self.bulks: list[Bulk] = []
         self.topics: list[Topic] = []
-        self.current = Topic(history=self)
+        self.current = self._adopt(Topic(history=self))
         self.agent: Agent = agent
+        # cached level totals, kept in sync by _child_changed and the moves below
+        self._bulks_tokens = 0
+        self._topics_tokens = 0
+        # id(output message) -> (output message, langchain message) from the last conversion
+        self._langchain_cache: dict[int, tuple[OutputMessage, BaseMessage]] = {}
 
     def get_tokens(self) -> int:
         return (
@@ -313,14 +398,26 @@ class History(Record):
         return total > limit
 
     def get_bulks_tokens(self) -> int:
-        return sum(record.get_tokens() for record in self.bulks)
+        return self._bulks_tokens
 
     def get_topics_tokens(self) -> int:
-        return sum(record.get_tokens() for record in self.topics)
+        return self._topics_tokens
 
     def get_current_topic_tokens(self) -> int:
         return self.current.get_tokens()
 
+    def _child_changed(self, child: Record, delta: int):
+        if child is self.current:
+            return  # current topic keeps its own total
+        if isinstance(child, Bulk):
+            self._bulks_tokens += delta
+        else:
+            self._topics_tokens += delta
+
+    def _recount(self):
+        self._bulks_tokens = sum(b.get_tokens() for b in self.bulks)
+        self._topics_tokens = sum(t.get_tokens() for t in self.topics)
+
     def add_message(
         self, ai: bool, content: MessageContent, tokens: int = 0
     ) -> Message:
@@ -329,7 +426,8 @@ class History(Record):
     def new_topic(self):
         if self.current.messages:
             self.topics.append(self.current)
-            self.current = Topic(history=self)
+            self._topics_tokens += self.current.get_tokens()
+            self.current = self._adopt(Topic(history=self))
 
     def output(self) -> list[OutputMessage]:
         result: list[OutputMessage] = []
@@ -338,11 +436,32 @@ class History(Record):
         result += self.current.output()
         return result
 
+    def output_langchain(self, outputs: list[OutputMessage] | None = None):
+        # record outputs are memoized, so unchanged output messages keep their identity
+        # and their langchain conversion can be reused; only new/changed ones are converted
+        if outputs is None:
+            outputs = self.output()
+        cache, used = self._langchain_cache, {}
+        result = []
+        for out in outputs:
+            hit = cache.get(id(out))
+            if hit is None or hit[0] is not out:
+                hit = (out, _output_message_langchain(out))
+            used[id(out)] = hit
+            result.append(hit[1])
+        self._langchain_cache = used
+        return group_messages_abab(result)
+
     @staticmethod
     def from_dict(data: dict, history: "History"):
-        history.bulks = [Bulk.from_dict(b, history=history) for b in data["bulks"]]
-        history.topics = [Topic.from_dict(t, history=history) for t in data["topics"]]
-        history.current = Topic.from_dict(data["current"], history=history)
+        history.bulks = [
+            history._adopt(Bulk.from_dict(b, history=history)) for b in data["bulks"]  # type: ignore
+        ]
+        history.topics = [
+            history._adopt(Topic.from_dict(t, history=history)) for t in data["topics"]  # type: ignore
+        ]
+        history.current = history._adopt(Topic.from_dict(data["current"], history=history))  # type: ignore
+        history._recount()
         return history
 
     def to_dict(self):
@@ -357,7 +476,21 @@ class History(Record):
         data = self.to_dict()
         return _json_dumps(data)
 
-    async def compress(self):
+    async def compress(self, presummarize: bool = False):
+        """Compress until every part fits its share of the limit.
+
+        With presummarize (background runs), topic summaries are also computed
+        ahead of time once the history passes PRESUMMARIZE_RATIO of the limit.
+        They are kept aside and only swapped in when a later compression is
+        over budget, so the history keeps its detail until then and the
+        blocking wait at the hard limit has little left to do.
+        """
+        compressed = await self._compress_to_limit()
+        if presummarize and self.get_tokens() > _get_ctx_size_for_history() * PRESUMMARIZE_RATIO:
+            await self.presummarize_topics()
+        return compressed
+
+    async def _compress_to_limit(self):
         compressed = False
         while True:
             curr, hist, bulk = (
@@ -391,23 +524,58 @@ class History(Record):
             else:
                 return compressed
 
+    async def summarize_topics(self) -> bool:
+        # summarize all pending topics at once, SUMMARIZE_CONCURRENCY calls at a time
+        pending = [topic for topic in self.topics if not topic.summary]
+        if not pending:
+            return False
+        await self._for_topics(pending, lambda topic: topic.summary, Topic.summarize)
+        return True
+
+    async def presummarize_topics(self) -> bool:
+        # compute summaries of unsummarized topics without applying them
+        pending = [t for t in self.topics if not t.summary and not t._pending_summary]
+        if not pending:
+            return False
+        await self._for_topics(
+            pending, lambda topic: topic.summary or topic._pending_summary, Topic.presummarize
+        )
+        return True
+
+    async def _for_topics(self, topics: list["Topic"], done, action):
+        slots = asyncio.Semaphore(SUMMARIZE_CONCURRENCY)
+
+        async def run(topic: Topic):
+            async with slots:
+                if not done(topic):  # may have been handled meanwhile
+                    await action(topic)
+
+        results = await asyncio.gather(*[run(topic) for topic in topics], return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
     async def compress_topics(self) -> bool:
-        # summarize topics one by one
-        for topic in self.topics:
-            if not topic.summary:
-                await topic.summarize()
-                return True
+        # summarize pending topics first
+        if await self.summarize_topics():
+            return True
 
         # move oldest topic to bulks and summarize
         for topic in self.topics:
             bulk = Bulk(history=self)
-            bulk.records.append(topic)
+            bulk.add_record(topic)
             if topic.summary:
                 bulk.summary = topic.summary
             else:
-                await bulk.summarize()
-            self.bulks.append(bulk)
+                try:
+                    await bulk.summarize()
+                except BaseException:
+                    self._adopt(topic)  # topic stays in self.topics
+                    raise
             self.topics.remove(topic)
+            self._topics_tokens -= topic.get_tokens()
+            self.bulks.append(self._adopt(bulk))  # type: ignore
+            self._bulks_tokens += bulk.get_tokens()
             return True
         return False
 
@@ -416,7 +584,7 @@ class History(Record):
         compressed = await self.merge_bulks_by(BULK_MERGE_COUNT)
         # remove oldest bulk if necessary
         if not compressed:
-            self.bulks.pop(0)
+            self._bulks_tokens -= self.bulks.pop(0).get_tokens()
             return True
         return compressed
 
@@ -431,13 +599,20 @@ class History(Record):
                 for i in range(0, len(self.bulks), count)
             ]
         )
-        self.bulks = bulks
+        self.bulks = [self._adopt(b) for b in bulks]  # type: ignore
+        self._bulks_tokens = sum(b.get_tokens() for b in self.bulks)
         return True
 
     async def merge_bulks(self, bulks: list[Bulk]) -> Bulk:
         bulk = Bulk(history=self)
-        bulk.records = cast(list[Record], bulks)
-        await bulk.summarize()
+        for b in bulks:
+            bulk.add_record(b)
+        try:
+            await bulk.summarize()
+        except BaseException:
+            for b in bulks:
+                self._adopt(b)  # merge failed, bulks stay in self.bulks
+            raise
         return bulk
 
 
@@ -513,19 +688,18 @@ def group_messages_abab(messages: list[BaseMessage]) -> list[BaseMessage]:
 
 
 def output_langchain(messages: list[OutputMessage]):
-    result = []
-    for m in messages:
-        if m["ai"]:
-            # result.append(AIMessage(content=serialize_content(m["content"])))
-            result.append(AIMessage(_output_content_langchain(content=m["content"])))  # type: ignore
-        else:
-            # result.append(HumanMessage(content=serialize_content(m["content"])))
-            result.append(HumanMessage(_output_content_langchain(content=m["content"])))  # type: ignore
+    result = [_output_message_langchain(m) for m in messages]
     # ensure message type alternation
     result = group_messages_abab(result)
     return result
 
 
+def _output_message_langchain(m: OutputMessage) -> BaseMessage:
+    if m["ai"]:
+        return AIMessage(_output_content_langchain(content=m["content"]))  # type: ignore
+    return HumanMessage(_output_content_langchain(content=m["content"]))  # type: ignore
+
+
 def output_text(messages: list[OutputMessage], ai_label="ai", human_label="human"):
     return "\n".join(_stringify_output(o, ai_label, human_label) for o in messages)
 
@@ -5,6 +5,7 @@ from python.helpers.task_scheduler import TaskScheduler
 from python.helpers.print_style import PrintStyle
 from python.helpers import errors
 from python.helpers import runtime
+from python.helpers.context_eviction import evict_idle_contexts
 
 
 SLEEP_TIME = 60
@@ -31,6 +32,10 @@ async def run_loop():
                 await scheduler_tick()
             except Exception as e:
                 PrintStyle().error(errors.format_error(e))
+        try:
+            evict_idle_contexts()
+        except Exception as e:
+            PrintStyle().error(errors.format_error(e))
         await asyncio.sleep(SLEEP_TIME)  # TODO! - if we lower it under 1min, it can run a 5min job multiple times in it's target minute
 
 
@@ -0,0 +1,218 @@
+import asyncio
+import dataclasses
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, TypeVar
+
+from python.helpers.dotenv import get_dotenv_value
+from python.helpers.print_style import PrintStyle
+
+# Routing over an ordered list of equivalent models per role (chat, utility).
+#   A0_CHAT_MODEL_FALLBACKS / A0_UTILITY_MODEL_FALLBACKS
+#                              - comma separated "provider/model" tried after the configured model
+#   A0_MODEL_HEDGE             - send a second request when the first is slow to stream (default on)
+#   A0_MODEL_HEDGE_PERCENTILE  - time-to-first-token percentile of the model used as hedge delay (95)
+#   A0_MODEL_HEDGE_MIN_MS      - lower bound of the hedge delay (1000)
+#   A0_MODEL_HEDGE_DEFAULT_MS  - hedge delay until enough samples are collected (8000)
+# The first attempt to stream a token wins, the other one is cancelled. Failures before
+# the first token fall through to the next model. Models are ranked by their TTFT EWMA.
+# Routers are shared by all agents, whose loops may run in different threads, so the
+# stats are only read and written under the router lock.
+
+R = TypeVar("R")
+Claim = Callable[[], bool]
+
+MIN_SAMPLES = 5
+
+
+class LatencyStats:
+    """Time to first token of one model: EWMA for ranking, recent samples for the hedge delay."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 100):
+        self.alpha = alpha
+        self.ewma: float | None = None
+        self.samples: deque[float] = deque(maxlen=window)
+        self.failures = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._update(seconds)
+
+    def censor(self, seconds: float):
+        # only a lower bound (cancelled or failed before the first token): may raise the EWMA, never lower it
+        if self.ewma is None or seconds > self.ewma:
+            self._update(seconds)
+
+    def _update(self, seconds: float):
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma += self.alpha * (seconds - self.ewma)
+
+    def percentile(self, p: float) -> float | None:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(get_dotenv_value(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def model_key(config) -> str:
+    return f"{config.provider}/{config.name}"
+
+
+def candidates(config, fallbacks_env: str) -> list:
+    """The configured model followed by the fallbacks listed in `fallbacks_env`."""
+    result = [config]
+    for item in str(get_dotenv_value(fallbacks_env, "") or "").split(","):
+        provider, _, name = item.strip().partition("/")
+        if provider and name:
+            # same limits and kwargs, endpoint comes from the fallback provider
+            result.append(dataclasses.replace(config, provider=provider, name=name, api_base=""))
+    return result
+
+
+class ModelRouter:
+    def __init__(self, role: str):
+        self.role = role
+        self.stats: dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, target) -> LatencyStats:
+        # caller holds the lock
+        key = model_key(target)
+        if key not in self.stats:
+            self.stats[key] = LatencyStats()
+        return self.stats[key]
+
+    def observe(self, target, seconds: float):
+        with self._lock:
+            self._stats(target).observe(seconds)
+
+    def censor(self, target, seconds: float, failed: bool = False):
+        with self._lock:
+            stats = self._stats(target)
+            if failed:
+                stats.failures += 1
+            stats.censor(seconds)
+
+    def ranked(self, targets: list) -> list:
+        with self._lock:
+            ewmas = {
+                model_key(t): s.ewma
+                for t in targets
+                if (s := self.stats.get(model_key(t))) and s.ewma is not None
+            }
+        # models without data rank as the best known one, so the configured order holds until measured
+        default = min(ewmas.values()) if ewmas else 0.0
+        return sorted(targets, key=lambda target: ewmas.get(model_key(target), default))
+
+    def hedge_delay(self, target) -> float | None:
+        if str(get_dotenv_value("A0_MODEL_HEDGE", "1")).lower() in ("0", "false", "off", "no"):
+            return None
+        percentile = _float_env("A0_MODEL_HEDGE_PERCENTILE", 95)
+        with self._lock:
+            delay = self._stats(target).percentile(percentile)
+        if delay is None:
+            return _float_env("A0_MODEL_HEDGE_DEFAULT_MS", 8000) / 1000
+        return max(delay, _float_env("A0_MODEL_HEDGE_MIN_MS", 1000) / 1000)
+
+    async def call(
+        self, targets: list, start: Callable[[Any, Claim], Awaitable[R]]
+    ) -> R:
+        """Run `start(target, claim)` on the best model, hedging and falling back as needed.
+
+        `start` must call `claim()` before passing any output on and drop the output
+        when it returns False - that attempt lost the race and is being cancelled.
+        The first claim() of an attempt is its time to first token, so call it as soon
+        as the first chunk arrives rather than when buffered output is passed on.
+        """
+        order = self.ranked(targets)
+        if len(order) == 1:
+            return await start(order[0], lambda: True)
+
+        pending = list(order)
+        attempts: dict[asyncio.Future, dict] = {}
+        winner: list[dict] = []
+        last_error: BaseException | None = None
+        hedged = False
+
+        def launch() -> dict:
+            attempt: dict = {"target": pending.pop(0), "started": time.monotonic()}
+
+            def claim() -> bool:
+                if not winner:
+                    winner.append(attempt)
+                    now = time.monotonic()
+                    self.observe(attempt["target"], now - attempt["started"])
+                    for task, other in list(attempts.items()):
+                        if other is not attempt:
+                            self.censor(other["target"], now - other["started"])
+                            task.cancel()
+                return winner[0] is attempt
+
+            attempt["claim"] = claim
+            attempt["task"] = asyncio.ensure_future(start(attempt["target"], claim))
+            attempts[attempt["task"]] = attempt
+            return attempt
+
+        first = launch()
+        try:
+            while attempts:
+                timeout = None
+                if not winner and not hedged and pending:
+                    delay = self.hedge_delay(first["target"])
+                    if delay is not None:
+                        timeout = max(0.0, first["started"] + delay - time.monotonic())
+                done, _ = await asyncio.wait(
+                    list(attempts), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    attempt = launch()
+                    PrintStyle.debug(
+                        f"{self.role} model {model_key(first['target'])} has no first token "
+                        f"after {timeout:.1f}s, hedging with {model_key(attempt['target'])}"
+                    )
+                    continue
+                for task in done:
+                    attempt = attempts.pop(task)
+                    if task.cancelled():
+                        continue
+                    error = task.exception()
+                    if error is None and attempt["claim"]():
+                        return task.result()
+                    if error is None:
+                        continue
+                    if winner and winner[0] is attempt:
+                        raise error  # output was already passed on, nothing to fall back to
+                    last_error = error
+                    self.censor(attempt["target"], time.monotonic() - attempt["started"], failed=True)
+                    PrintStyle.warning(
+                        f"{self.role} model {model_key(attempt['target'])} failed: {error}"
+                    )
+                    if not attempts and pending and not winner:
+                        first = launch()
+                        hedged = False
+            raise last_error or RuntimeError(f"No {self.role} model attempt finished")
+        finally:
+            for task in attempts:
+                task.cancel()
+
+
+_routers: dict[str, ModelRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(role: str) -> ModelRouter:
+    with _routers_lock:
+        if role not in _routers:
+            _routers[role] = ModelRouter(role)
+        return _routers[role]
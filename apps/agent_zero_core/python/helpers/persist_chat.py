@@ -12,6 +12,7 @@ from python.helpers.log import Log, LogItem
 CHATS_FOLDER = "tmp/chats"
 LOG_SIZE = 1000
 CHAT_FILE_NAME = "chat.json"
+META_FILE_NAME = "meta.json"  # chat index entry: enough to list the chat without loading it
 
 
 def get_chat_folder_path(ctxid: str):
@@ -29,36 +30,70 @@ def get_chat_folder_path(ctxid: str):
 
 def save_tmp_chat(context: AgentContext):
     """Save context to the chats folder"""
+    if not context.is_loaded:
+        # never opened since startup: chat.json is current, only the index entry may change (e.g. rename)
+        meta = dict(
+            context._summary,
+            id=context.id,
+            name=context.name,
+            created_at=context.created_at.isoformat(),
+            last_message=context.last_message.isoformat(),
+            type=context.type.value,
+        )
+        files.write_file(_get_meta_file_path(context.id), json.dumps(meta))
+        return
+    _write_chat(context)
+
+
+def _write_chat(context: AgentContext) -> dict:
     path = _get_chat_file_path(context.id)
     files.make_dirs(path)
     data = _serialize_context(context)
     js = _safe_json_serialize(data, ensure_ascii=False)
     files.write_file(path, js)
+    meta = _chat_meta(data)
+    files.write_file(_get_meta_file_path(context.id), json.dumps(meta))
+    return meta
+
+
+def unload_chat(context: AgentContext, idle_before: float | None = None) -> bool:
+    """Save a chat and release its in-memory state; it is reloaded on next access.
+    Skipped (False) if the chat is in use or was used after `idle_before`"""
+    return context.unload(_load_stub, _save_for_unload, idle_before)
+
+
+def _save_for_unload(context: AgentContext) -> dict:
+    meta = _write_chat(context)
+    return {k: meta[k] for k in ("log_guid", "log_version", "log_length")}
 
 
 def save_tmp_chats():
     """Save all contexts to the chats folder"""
-    for _, context in AgentContext._contexts.items():
+    for context in AgentContext.all():
         save_tmp_chat(context)
 
 
 def load_tmp_chats():
-    """Load all contexts from the chats folder"""
+    """Register all saved chats as stubs; each one is fully loaded on first access"""
     _convert_v080_chats()
     folders = files.list_files(CHATS_FOLDER, "*")
-    json_files = []
-    for folder_name in folders:
-        json_files.append(_get_chat_file_path(folder_name))
 
     ctxids = []
-    for file in json_files:
+    for folder_name in folders:
         try:
-            js = files.read_file(file)
-            data = json.loads(js)
-            ctx = _deserialize_context(data)
+            meta = _read_chat_meta(folder_name)
+            ctx = AgentContext.stub(
+                id=meta["id"],
+                loader=_load_stub,
+                summary={k: meta[k] for k in ("log_guid", "log_version", "log_length")},
+                name=meta.get("name"),
+                created_at=datetime.fromisoformat(meta["created_at"]),
+                type=AgentContextType(meta.get("type", AgentContextType.USER.value)),
+                last_message=datetime.fromisoformat(meta["last_message"]),
+            )
             ctxids.append(ctx.id)
         except Exception as e:
-            print(f"Error loading chat {file}: {e}")
+            print(f"Error loading chat {folder_name}: {e}")
     return ctxids
 
 
@@ -66,6 +101,55 @@ def _get_chat_file_path(ctxid: str):
     return files.get_abs_path(CHATS_FOLDER, ctxid, CHAT_FILE_NAME)
 
 
+def _get_meta_file_path(ctxid: str):
+    return files.get_abs_path(CHATS_FOLDER, ctxid, META_FILE_NAME)
+
+
+def _chat_meta(data: dict) -> dict:
+    epoch = datetime.fromtimestamp(0).isoformat()
+    log = data.get("log") or {}
+    # a loaded log has one update per item, so version == length
+    log_length = len(log.get("logs", []))
+    return {
+        "id": data["id"],
+        "name": data.get("name"),
+        "created_at": data.get("created_at", epoch),
+        "last_message": data.get("last_message", epoch),
+        "type": data.get("type", AgentContextType.USER.value),
+        "log_guid": log.get("guid", str(uuid.uuid4())),
+        "log_version": log_length,
+        "log_length": log_length,
+    }
+
+
+def _read_chat_meta(folder_name: str) -> dict:
+    meta_path = _get_meta_file_path(folder_name)
+    if files.exists(meta_path):
+        return json.loads(files.read_file(meta_path))
+    # chats saved before the index existed: parse once and write the entry
+    data = json.loads(files.read_file(_get_chat_file_path(folder_name)))
+    data.setdefault("id", folder_name)
+    meta = _chat_meta(data)
+    files.write_file(meta_path, json.dumps(meta))
+    return meta
+
+
+def _load_stub(context: AgentContext):
+    config = initialize_agent()
+    try:
+        data = json.loads(files.read_file(_get_chat_file_path(context.id)))
+        context.config = config
+        context.log = _deserialize_log(data.get("log", None))
+        _restore_agents(context, data, config)
+    except Exception as e:
+        # keep the chat usable (empty) rather than failing every request to it
+        print(f"Error loading chat {context.id}: {e}")
+        context.config = config
+        context.log = Log()
+        context.agent0 = Agent(0, config, context)
+        context.streaming_agent = None
+
+
 def _convert_v080_chats():
     json_files = files.list_files(CHATS_FOLDER, "*.json")
     for file in json_files:
@@ -177,6 +261,11 @@ def _deserialize_context(data):
         # streaming_agent=straming_agent,
     )
 
+    _restore_agents(context, data, config)
+    return context
+
+
+def _restore_agents(context: AgentContext, data: dict, config: AgentConfig):
     agents = data.get("agents", [])
     agent0 = _deserialize_agents(agents, config, context)
     streaming_agent = agent0
@@ -186,8 +275,6 @@ def _deserialize_context(data):
     context.agent0 = agent0
     context.streaming_agent = streaming_agent
 
-    return context
-
 
 def _deserialize_agents(
     agents: list[dict[str, Any]], config: AgentConfig, context: AgentContext
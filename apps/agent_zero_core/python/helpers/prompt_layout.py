@@ -0,0 +1,122 @@
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from python.helpers.dotenv import get_dotenv_value
+
+# Prompt layout for provider-side prefix caching.
+#   A0_PROMPT_LAYOUT          - "default": extras are merged into the last history message
+#                               "stable": system prompt and history are kept byte-stable,
+#                               extras go to a separate trailing content block
+#   A0_PROMPT_CACHE_CONTROL   - "auto" (providers known to need explicit markers), "on", "off"
+# In the stable layout cache_control breakpoints are set on the system prompt and on the
+# last history block, so the next iteration reads everything before its own tail from cache.
+
+LAYOUT_DEFAULT = "default"
+LAYOUT_STABLE = "stable"
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def get_layout() -> str:
+    layout = str(get_dotenv_value("A0_PROMPT_LAYOUT", LAYOUT_DEFAULT)).strip().lower()
+    return layout if layout in (LAYOUT_DEFAULT, LAYOUT_STABLE) else LAYOUT_DEFAULT
+
+
+def supports_cache_control(model_config) -> bool:
+    mode = str(get_dotenv_value("A0_PROMPT_CACHE_CONTROL", "auto")).strip().lower()
+    if mode in ("on", "1", "true"):
+        return True
+    if mode in ("off", "0", "false"):
+        return False
+    # explicit breakpoints are only honored by anthropic models (direct or routed)
+    return model_config.provider == "anthropic" or "claude" in model_config.name.lower()
+
+
+def stable_prompt(
+    system_text: str,
+    history_messages: list[BaseMessage],
+    extras_text: str,
+    cache_control: bool = False,
+) -> list[BaseMessage]:
+    """System prompt, history and extras with nothing volatile before the tail.
+
+    History messages are taken as they are (the LangChain objects may be shared
+    with the history cache, so they are copied, never modified). Extras are added
+    as their own content block of the last human message, or as a new human
+    message, instead of being concatenated into the history text. Content stays
+    a plain string unless a block carries cache_control (or is not text).
+    """
+    system = _blocks(system_text)
+    if cache_control:
+        system = _mark(system)
+    result: list[BaseMessage] = [SystemMessage(content=_content(system))]  # type: ignore
+    history_messages = list(history_messages)
+
+    tail_blocks: list = []
+    if history_messages and isinstance(history_messages[-1], HumanMessage):
+        tail_blocks = _blocks(history_messages.pop().content)
+    elif history_messages and cache_control:
+        last = history_messages.pop()
+        history_messages.append(type(last)(content=_mark(_blocks(last.content))))  # type: ignore
+    result += history_messages
+
+    if tail_blocks and cache_control:
+        tail_blocks = _mark(tail_blocks)
+    extras = _blocks(extras_text) if extras_text else []
+    if tail_blocks or extras:
+        result.append(HumanMessage(content=_content(tail_blocks + extras)))  # type: ignore
+    return result
+
+
+def _blocks(content) -> list:
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return [
+        {"type": "text", "text": block} if isinstance(block, str) else dict(block)
+        for block in content
+    ]
+
+
+def _content(blocks: list):
+    # some providers and LiteLLM adapters reject or mangle list content on system
+    # messages: blocks are only needed to carry cache_control (or non-text parts)
+    if all(block.get("type") == "text" and "cache_control" not in block for block in blocks):
+        return "\n".join(block["text"] for block in blocks)
+    return blocks
+
+
+def _mark(blocks: list) -> list:
+    if not blocks:
+        return blocks
+    return blocks[:-1] + [{**blocks[-1], "cache_control": CACHE_CONTROL}]
+
+
+def render_blocks(messages: list[BaseMessage]) -> list[tuple[str, str, bool]]:
+    """Flatten messages into (role, text, is_breakpoint) blocks as a provider renders them."""
+    result = []
+    for m in messages:
+        for block in _blocks(m.content):
+            text = block.get("text") if block.get("type") == "text" else repr(
+                {k: v for k, v in block.items() if k != "cache_control"}
+            )
+            result.append((m.type, text or "", "cache_control" in block))
+    return result
+
+
+def prefix_hit_ratio(previous: list[BaseMessage], current: list[BaseMessage]) -> float:
+    """Share of the current prompt (in chars) a breakpoint cache would serve.
+
+    Mirrors explicit prefix caching: the longest prefix of `current` that ends at
+    a breakpoint of `previous` and matches it block for block is a cache hit.
+    """
+    prev, cur = render_blocks(previous), render_blocks(current)
+    total = sum(len(text) for _, text, _ in cur)
+    if not total:
+        return 0.0
+    hit = matched = 0
+    for (p_role, p_text, p_mark), (c_role, c_text, _) in zip(prev, cur):
+        if (p_role, p_text) != (c_role, c_text):
+            break
+        matched += len(c_text)
+        if p_mark:
+            hit = matched
+    return hit / total
@@ -1245,8 +1245,13 @@ def _apply_settings(previous: Settings | None):
         from agent import AgentContext
         from initialize import initialize_agent
 
+        # model wrappers hold resolved keys and endpoints
+        models.clear_model_cache()
+
         config = initialize_agent()
-        for ctx in AgentContext._contexts.values():
+        for ctx in AgentContext.all():
+            if not ctx.is_loaded:
+                continue  # gets a fresh config when it is first loaded
             ctx.config = config  # reinitialize context config with new settings
             # apply config to agents
             agent = ctx.agent0
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Mapping
+
+from python.helpers import dotenv
+from python.helpers.tokens import estimate_tokens
+
+
+def flush_settings() -> tuple[float, int]:
+    # A0_STREAM_FLUSH_MS / A0_STREAM_FLUSH_CHARS, both 0 = callbacks on every chunk
+    try:
+        interval = float(dotenv.get_dotenv_value("A0_STREAM_FLUSH_MS", 50)) / 1000
+        max_chars = int(dotenv.get_dotenv_value("A0_STREAM_FLUSH_CHARS", 4096))
+    except (TypeError, ValueError):
+        interval, max_chars = 0.05, 4096
+    return interval, max_chars
+
+
+class StreamCoalescer:
+    """Collects stream deltas and passes them to the callbacks in batches.
+
+    Pending text is flushed when `interval` seconds passed since the last
+    flush or `max_chars` are waiting; flush() delivers the rest, so callbacks
+    see the same text and totals as with per-chunk calls, just fewer times.
+    While text is pending a timer flushes it after `interval` too, so a model
+    that stalls mid-stream does not hold back what already arrived.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[str, str], Awaitable[None]] | None,
+        tokens_callback: Callable[[str, int], Awaitable[None]] | None,
+        interval: float = 0.05,
+        max_chars: int = 4096,
+    ):
+        self.callback = callback
+        self.tokens_callback = tokens_callback
+        self.interval = interval
+        self.max_chars = max_chars
+        self.total = ""
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._last_flush = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self._timed_flush: asyncio.Task | None = None
+        self._flushing = asyncio.Lock()
+
+    async def add(self, delta: str):
+        self.total += delta
+        self._pending.append(delta)
+        self._pending_chars += len(delta)
+        wait = self.interval - (time.monotonic() - self._last_flush)
+        if (self.max_chars and self._pending_chars >= self.max_chars) or wait <= 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._timed_flush = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # callbacks of a timed flush and of the stream never interleave
+        async with self._flushing:
+            await self._deliver()
+
+    async def close(self):
+        await self.flush()
+        if self._timed_flush is not None:
+            await self._timed_flush
+
+    def cancel(self):
+        # stream failed: nothing more is delivered
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _deliver(self):
+        if not self._pending:
+            return
+        delta = "".join(self._pending)
+        self._pending.clear()
+        self._pending_chars = 0
+        self._last_flush = time.monotonic()
+        if self.callback:
+            await self.callback(delta, self.total)
+        if self.tokens_callback:
+            await self.tokens_callback(delta, estimate_tokens(delta))
+
+
+async def coalesce(
+    chunks: AsyncIterable[Mapping[str, str]],
+    reasoning_callback: Callable[[str, str], Awaitable[None]] | None = None,
+    response_callback: Callable[[str, str], Awaitable[None]] | None = None,
+    tokens_callback: Callable[[str, int], Awaitable[None]] | None = None,
+    interval: float | None = None,
+    max_chars: int | None = None,
+    first_chunk_callback: Callable[[], Any] | None = None,
+) -> tuple[str, str]:
+    """Feed parsed chunks (reasoning_delta / response_delta) to the callbacks in batches.
+
+    `first_chunk_callback` is called as soon as the first chunk with text arrives,
+    before any batching, e.g. to measure the time to first token.
+    Returns the complete (response, reasoning) texts.
+    """
+    if interval is None or max_chars is None:
+        default_interval, default_chars = flush_settings()
+        interval = default_interval if interval is None else interval
+        max_chars = default_chars if max_chars is None else max_chars
+    reasoning = StreamCoalescer(reasoning_callback, tokens_callback, interval, max_chars)
+    response = StreamCoalescer(response_callback, tokens_callback, interval, max_chars)
+
+    try:
+        async for chunk in chunks:
+            if first_chunk_callback and (chunk["reasoning_delta"] or chunk["response_delta"]):
+                first_chunk_callback()
+                first_chunk_callback = None
+            # collect reasoning delta, keep order with response text already pending
+            if chunk["reasoning_delta"]:
+                await response.flush()
+                await reasoning.add(chunk["reasoning_delta"])
+            # collect response delta
+            if chunk["response_delta"]:
+                await reasoning.flush()
+                await response.add(chunk["response_delta"])
+    except BaseException:
+        reasoning.cancel()
+        response.cancel()
+        raise
+
+    # deliver the rest
+    await reasoning.close()
+    await response.close()
+    return response.total, reasoning.total
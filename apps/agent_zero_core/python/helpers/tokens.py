@@ -4,6 +4,13 @@ import tiktoken
 APPROX_BUFFER = 1.1
 TRIM_BUFFER = 0.8
 
+# Two tiers of counting:
+#  - count_tokens / approximate_tokens: exact tiktoken encode, for context-window decisions
+#  - estimate_tokens: calibrated length heuristic, for rate limiting and streaming stats
+# Defaults fitted against cl100k_base on mixed prose/code/JSON; refit with calibrate().
+CHARS_PER_TOKEN = 3.6
+EXTRA_BYTES_PER_TOKEN = 2.8  # utf-8 bytes beyond the first of each non-ascii char
+
 
 def count_tokens(text: str, encoding_name="cl100k_base") -> int:
     if not text:
@@ -25,6 +32,50 @@ def approximate_tokens(
     return int(count_tokens(text) * APPROX_BUFFER)
 
 
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, same scale as approximate_tokens.
+
+    O(1) for ascii text (str.isascii is a flag check), one utf-8 encode otherwise.
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    estimate = chars / CHARS_PER_TOKEN
+    if not text.isascii():
+        estimate += (len(text.encode("utf-8")) - chars) / EXTRA_BYTES_PER_TOKEN
+    return max(1, int(estimate * APPROX_BUFFER))
+
+
+def calibrate(samples: list[str], encoding_name="cl100k_base") -> tuple[float, float]:
+    """Refit the estimate_tokens ratios to exact counts of the given samples.
+
+    Least squares of tokens ~ chars / CHARS_PER_TOKEN + extra_bytes / EXTRA_BYTES_PER_TOKEN.
+    Returns the new (CHARS_PER_TOKEN, EXTRA_BYTES_PER_TOKEN).
+    """
+    global CHARS_PER_TOKEN, EXTRA_BYTES_PER_TOKEN
+    cc = ce = ee = ct = et = 0.0
+    for text in samples:
+        if not text:
+            continue
+        c = len(text)
+        e = len(text.encode("utf-8")) - c
+        t = count_tokens(text, encoding_name)
+        cc, ce, ee, ct, et = cc + c * c, ce + c * e, ee + e * e, ct + c * t, et + e * t
+    if not cc:
+        return CHARS_PER_TOKEN, EXTRA_BYTES_PER_TOKEN
+    det = cc * ee - ce * ce
+    if ee and det > 0:
+        a = (ct * ee - et * ce) / det
+        b = (et * cc - ct * ce) / det
+        if a > 0 and b > 0:
+            CHARS_PER_TOKEN, EXTRA_BYTES_PER_TOKEN = 1 / a, 1 / b
+            return CHARS_PER_TOKEN, EXTRA_BYTES_PER_TOKEN
+    # ascii-only samples (or a degenerate fit): only the char ratio is identifiable
+    if ct > 0:
+        CHARS_PER_TOKEN = cc / ct
+    return CHARS_PER_TOKEN, EXTRA_BYTES_PER_TOKEN
+
+
 def trim_to_tokens(
     text: str,
     max_tokens: int,
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from python.helpers import files
+from python.helpers.dotenv import get_dotenv_value
+from python.helpers.print_style import PrintStyle
+
+# Disk cache of utility model responses, keyed by a hash of (model, system, message).
+# Summaries, recall queries and keyword extraction are often sent with the exact
+# same input again (re-summarized bulks, reloaded chats); those are served from here.
+#   A0_UTILITY_CACHE          - enable the cache (default off)
+#   A0_UTILITY_CACHE_TTL      - seconds an entry stays valid (default 7 days)
+#   A0_UTILITY_CACHE_MAX_MB   - size budget, least recently used entries go first (default 64)
+
+DB_PATH = "tmp/cache/utility_model.db"
+LOG_EVERY = 100  # lookups between hit/miss summaries in the log
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_total_bytes = 0  # running size of all entries, summed once on open
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+
+def _enabled() -> bool:
+    return str(get_dotenv_value("A0_UTILITY_CACHE", "")).lower() in ("1", "true", "yes", "on")
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(get_dotenv_value(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _db() -> sqlite3.Connection:
+    global _conn, _total_bytes
+    if _conn is None:
+        files.make_dirs(DB_PATH)
+        _conn = sqlite3.connect(files.get_abs_path(DB_PATH), check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        _total_bytes = _conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    return _conn
+
+
+def make_key(model_config, system: str, message: str) -> str:
+    payload = json.dumps(
+        [model_config.provider, model_config.name, model_config.kwargs, system, message],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> str | None:
+    if not _enabled():
+        return None
+    ttl = _float_env("A0_UTILITY_CACHE_TTL", 7 * 24 * 3600)
+    now = time.time()
+    try:
+        with _lock:
+            db = _db()
+            row = db.execute(
+                "SELECT response, created, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > ttl:
+                _delete(db, key, row[2])
+                db.commit()
+                _stats["expired"] += 1
+                row = None
+            if row is None:
+                _count("misses")
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            _count("hits")
+            return row[0]
+    except sqlite3.Error as e:
+        PrintStyle.error(f"Utility cache read failed: {e}")
+        return None
+
+
+def put(key: str, response: str):
+    global _total_bytes
+    if not _enabled() or not response:
+        return
+    max_bytes = int(_float_env("A0_UTILITY_CACHE_MAX_MB", 64) * 1024 * 1024)
+    size = len(response.encode("utf-8"))
+    if size > max_bytes:
+        return
+    now = time.time()
+    try:
+        with _lock:
+            db = _db()
+            old = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            _total_bytes += size - (old[0] if old else 0)
+            _stats["stores"] += 1
+            _evict(db, max_bytes)
+            db.commit()
+    except sqlite3.Error as e:
+        PrintStyle.error(f"Utility cache write failed: {e}")
+
+
+def _delete(db: sqlite3.Connection, key: str, size: int):
+    global _total_bytes
+    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+    _total_bytes -= size
+
+
+def _evict(db: sqlite3.Connection, max_bytes: int):
+    # drop least recently used entries until back under budget, a few rows at a time
+    while _total_bytes > max_bytes:
+        rows = db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed LIMIT 16"
+        ).fetchall()
+        if not rows:
+            break
+        for key, size in rows:
+            if _total_bytes <= max_bytes:
+                break
+            _delete(db, key, size)
+            _stats["evictions"] += 1
+
+
+def _count(outcome: str):
+    _stats[outcome] += 1
+    if (_stats["hits"] + _stats["misses"]) % LOG_EVERY == 0:
+        s = stats()
+        PrintStyle.debug(
+            f"Utility cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.0%}), "
+            f"{s['stores']} stores, {s['evictions']} evictions, {s['expired']} expired"
+        )
+
+
+def stats() -> dict:
+    requests = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": _stats["hits"] / requests if requests else 0.0,
+        "enabled": _enabled(),
+    }
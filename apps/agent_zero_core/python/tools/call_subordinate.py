@@ -1,10 +1,25 @@
+import asyncio
+import dataclasses
+import json
+
 from agent import Agent, UserMessage
+from python.helpers.dotenv import get_dotenv_value
 from python.helpers.tool import Tool, Response
 
+# default cap of subordinates running at once in fan-out mode
+MAX_PARALLEL = 4
+
 
 class Delegation(Tool):
 
     async def execute(self, message="", reset="", **kwargs):
+        # fan-out mode: several independent subtasks at once
+        subtasks = kwargs.get("subtasks")
+        if subtasks:
+            return await self.fan_out(
+                subtasks, kwargs.get("max_parallel"), kwargs.get("timeout")
+            )
+
         # create subordinate agent using the data object on this agent and set superior agent to his data object
         if (
             self.agent.get_data(Agent.DATA_NAME_SUBORDINATE) is None
@@ -33,10 +48,72 @@ class Delegation(Tool):
         # result
         return Response(message=result, break_loop=False)
 
+    async def fan_out(self, subtasks, max_parallel=None, timeout=None) -> Response:
+        # each subtask runs in its own short-lived subordinate with an isolated history;
+        # they are not registered as DATA_NAME_SUBORDINATE, so "reset": "false" keeps
+        # addressing the regular subordinate and this agent stays the context's streaming
+        # agent: interventions sent meanwhile reach it once the subtasks are done
+        tasks = [
+            {"message": t} if isinstance(t, str) else dict(t)
+            for t in (subtasks if isinstance(subtasks, list) else [subtasks])
+        ]
+        limit = _positive_int(max_parallel) or _positive_int(
+            get_dotenv_value("A0_SUBORDINATE_MAX_PARALLEL", MAX_PARALLEL)
+        ) or MAX_PARALLEL
+        slots = asyncio.Semaphore(limit)
+
+        async def run(index: int, task: dict):
+            async with slots:
+                config = dataclasses.replace(
+                    self.agent.config, profile=task.get("profile") or ""
+                )
+                sub = Agent(self.agent.number + 1, config, self.agent.context)
+                sub.agent_name = f"{sub.agent_name}.{index + 1}"
+                sub.set_data(Agent.DATA_NAME_SUPERIOR, self.agent)
+                sub.hist_add_user_message(
+                    UserMessage(message=task.get("message", ""), attachments=[])
+                )
+                seconds = _positive_float(task.get("timeout")) or _positive_float(timeout)
+                if seconds:
+                    return await asyncio.wait_for(sub.monologue(), seconds)
+                return await sub.monologue()
+
+        results = await asyncio.gather(
+            *[run(i, task) for i, task in enumerate(tasks)], return_exceptions=True
+        )
+
+        gathered = []
+        for task, result in zip(tasks, results):
+            item = {"subtask": task.get("message", "")}
+            if isinstance(result, asyncio.TimeoutError):
+                item["error"] = "timed out"
+            elif isinstance(result, BaseException):
+                item["error"] = str(result) or type(result).__name__
+            else:
+                item["result"] = result
+            gathered.append(item)
+        return Response(
+            message=json.dumps(gathered, ensure_ascii=False, indent=2), break_loop=False
+        )
+
     def get_log_object(self):
         return self.agent.context.log.log(
             type="tool",
             heading=f"icon://communication {self.agent.agent_name}: Calling Subordinate Agent",
             content="",
             kvps=self.args,
-        )
\ No newline at end of file
+        )
+
+
+def _positive_int(value) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _positive_float(value) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
@@ -5,13 +5,19 @@ Environment toggles:
   AGENT_DAEMON_DISABLE_WEBHOOK=1   -> don't start FastAPI webhook server
   AGENT_DAEMON_DISABLE_WORKER=1    -> don't start queue worker
   AGENT_DAEMON_WEBHOOK_PORT=4000   -> override webhook port
+  AGENT_DAEMON_MODE=supervisor     -> one process per component (see supervisor.py);
+                                      requires QUEUE_BACKEND=redis or sqlite
+  AGENT_DAEMON_WEBHOOK_WORKERS=2   -> uvicorn workers for the webhook (supervisor mode)
+  AGENT_DAEMON_WORKER_PROCESSES=2  -> MessageWorker processes (supervisor mode)
+  AGENT_DAEMON_SHUTDOWN_GRACE=20   -> seconds between SIGTERM and SIGKILL (supervisor mode)
 
 Run manually:
   python az_daemon.py
+  python az_daemon.py --supervise
 """
 from __future__ import annotations
 
-import os, logging
+import os, logging, sys
 import threading
 import signal
 import time
@@ -61,18 +67,18 @@ def start_worker():
     if os.getenv("AGENT_DAEMON_DISABLE_WORKER"):
         _log("Worker disabled by env")
         return
-    if settings.queue_backend == 'redis':
-        _log("Starting Redis MessageWorker loop")
-        from queues.redis_queue import build_queue as build_redis_queue
+    if settings.durable_queue:
+        _log(f"Starting {settings.queue_backend} MessageWorker loop")
+        from queues.factory import build_queue as build_durable_queue
         from storage.processed_events_store import build_store as build_dedupe_store
         from workers.message_worker import MessageWorker
         try:
-            q = build_redis_queue(settings)
+            q = build_durable_queue(settings)
             dedupe_store = build_dedupe_store(settings)
             mw = MessageWorker(q, dedupe_store)
             asyncio.run(mw.start())
         except Exception as e:  # pragma: no cover
-            _log(f"Redis worker init failed: {e}; falling back to memory worker")
+            _log(f"{settings.queue_backend} worker init failed: {e}; falling back to memory worker")
             asyncio.run(worker.loop())
     else:
         _log("Starting memory worker loop")
@@ -107,7 +113,17 @@ def handle_signal(signum: int, frame: FrameType | None):  # noqa
     _log(f"Signal {signum} received; shutting down...")
     STOP = True
 
+def main_supervisor():
+    from supervisor import build_supervisor
+    build_supervisor().run()
+
 def main():
+    supervise = "--supervise" in sys.argv[1:] or os.getenv("AGENT_DAEMON_MODE") == "supervisor"
+    if supervise and settings.durable_queue:
+        main_supervisor()
+        return
+    if supervise:
+        _log("Supervisor mode needs QUEUE_BACKEND=redis or sqlite (memory queue is per-process); using threads")
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
 
@@ -1,34 +1,210 @@
 import asyncio
-from collections import deque
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable
+
+from config import get_settings
+
+
+class QueueFull(Exception):
+    pass
+
 
 class InMemoryQueue:
-    def __init__(self):
+    """Fila em memória segura entre threads e event loops.
+
+    O az_daemon roda webhook (uvicorn) e worker em threads distintas, cada uma com
+    seu próprio loop; um `asyncio.Condition` fica preso a um único loop. Aqui o
+    estado é protegido por `threading.Lock` e cada espera assíncrona registra um
+    future do loop chamador, acordado via `call_soon_threadsafe`.
+
+    `maxsize=0` significa sem limite.
+    """
+
+    def __init__(self, maxsize: int = 0):
         self.q = deque()
-        self.cv = asyncio.Condition()
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._getters: deque = deque()
+        self._putters: deque = deque()
+        self.rejected = 0
+
+    def qsize(self) -> int:
+        return len(self.q)
+
+    def __len__(self) -> int:
+        return len(self.q)
 
-    async def put(self, item):
-        async with self.cv:
+    def full(self) -> bool:
+        return bool(self.maxsize) and len(self.q) >= self.maxsize
+
+    def empty(self) -> bool:
+        return not self.q
+
+    # -- wakeups -------------------------------------------------------------
+    @staticmethod
+    def _wake_one(waiters: deque) -> None:
+        # chamado com o lock adquirido
+        while waiters:
+            loop, fut = waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, fut)
+                return
+            except RuntimeError:  # loop já encerrado; tenta o próximo
+                continue
+
+    async def _wait(self, waiters: deque, waiter) -> None:
+        loop, fut = waiter
+        try:
+            await fut
+        except BaseException:
+            with self._lock:
+                try:
+                    waiters.remove(waiter)
+                except ValueError:
+                    # já tínhamos sido acordados: repassa o sinal para outro
+                    self._wake_one(waiters)
+            raise
+
+    # -- produtor ------------------------------------------------------------
+    def put_nowait(self, item) -> None:
+        with self._lock:
+            if self.full():
+                self.rejected += 1
+                raise QueueFull()
             self.q.append(item)
-            self.cv.notify()
+            self._wake_one(self._getters)
+
+    async def put(self, item, timeout: float | None = None) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._lock:
+                if not self.full():
+                    self.q.append(item)
+                    self._wake_one(self._getters)
+                    return
+                waiter = (loop, loop.create_future())
+                self._putters.append(waiter)
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                with self._lock:
+                    if waiter in self._putters:
+                        self._putters.remove(waiter)
+                    self.rejected += 1
+                raise QueueFull()
+            try:
+                await asyncio.wait_for(self._wait(self._putters, waiter), remaining)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.rejected += 1
+                raise QueueFull()
+
+    # -- consumidor ----------------------------------------------------------
+    def get_nowait(self):
+        with self._lock:
+            if not self.q:
+                raise asyncio.QueueEmpty()
+            item = self.q.popleft()
+            self._wake_one(self._putters)
+            return item
 
     async def get(self):
-        async with self.cv:
-            while not self.q:
-                await self.cv.wait()
-            return self.q.popleft()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.q:
+                    item = self.q.popleft()
+                    self._wake_one(self._putters)
+                    return item
+                waiter = (loop, loop.create_future())
+                self._getters.append(waiter)
+            await self._wait(self._getters, waiter)
 
-queue = InMemoryQueue()
-processed_events = set()
+    async def get_many(self, max_items: int, timeout: float | None = None) -> list:
+        """Aguarda ao menos um item (até `timeout`) e drena até `max_items` de uma vez."""
+        try:
+            first = await asyncio.wait_for(self.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        items = [first]
+        with self._lock:
+            while self.q and len(items) < max_items:
+                items.append(self.q.popleft())
+            for _ in range(len(items) - 1):
+                if not self._putters:
+                    break
+                self._wake_one(self._putters)
+        return items
 
-def dedupe(event_id: str) -> bool:
-    if event_id in processed_events:
-        return False
-    processed_events.add(event_id)
-    # naive size control
-    if len(processed_events) > 5000:
-        for _ in range(len(processed_events)//2):
-            try:
-                processed_events.pop()
-            except KeyError:
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class DedupeCache:
+    """Cache de ids processados com TTL e capacidade, O(1) por verificação.
+
+    Equivalente em memória ao `SET NX EX` do `EventDedupeStore`: o TTL conta a
+    partir da primeira vez que o id foi visto. Como o TTL é fixo, a ordem de
+    inserção do `OrderedDict` é também a ordem de expiração, então expirar e
+    despejar por capacidade é sempre retirar do início.
+    """
+
+    def __init__(self, capacity: int = 50000, ttl: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, event_id: str) -> bool:
+        with self._lock:
+            self._expire(self.clock())
+            return event_id in self._entries
+
+    def _expire(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            expires_at = entries[next(iter(entries))]
+            if expires_at > now:
                 break
-    return True
+            entries.popitem(last=False)
+
+    def mark_if_new(self, event_id: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            if event_id in self._entries:
+                return False
+            self._entries[event_id] = now + self.ttl
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            return True
+
+    def forget(self, event_id: str) -> None:
+        with self._lock:
+            self._entries.pop(event_id, None)
+
+
+_settings = get_settings()
+queue = InMemoryQueue(maxsize=_settings.memory_queue_maxsize)
+processed_events = DedupeCache(
+    capacity=_settings.dedupe_capacity,
+    ttl=_settings.event_dedupe_ttl,
+)
+
+def dedupe(event_id: str) -> bool:
+    return processed_events.mark_if_new(event_id)
+
+def forget(event_id: str) -> None:
+    """Remove um id marcado (ex.: evento recusado por fila cheia será reenviado)."""
+    processed_events.forget(event_id)
@@ -1,20 +1,75 @@
 import os
 from functools import lru_cache
 
+def _parse_weights(raw: str) -> dict[str, int]:
+    # formato: "tenantA:3,tenantB:1" (peso padrão 1 para tenants não listados)
+    weights: dict[str, int] = {}
+    for part in raw.split(","):
+        name, _, value = part.strip().partition(":")
+        if not name:
+            continue
+        try:
+            weights[name] = max(1, int(value or 1))
+        except ValueError:
+            weights[name] = 1
+    return weights
+
 class Settings:
     def __init__(self) -> None:
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/1")
         self.queue_backend = os.getenv("QUEUE_BACKEND", "memory")
+        self.memory_queue_maxsize = int(os.getenv("MEMORY_QUEUE_MAXSIZE", "10000"))
+        self.memory_queue_batch_size = int(os.getenv("MEMORY_QUEUE_BATCH_SIZE", "32"))
+        self.sqlite_path = os.getenv("SQLITE_QUEUE_PATH", "tmp/queue.sqlite3")
+        self.sqlite_queue_ttl = int(os.getenv("SQLITE_QUEUE_TTL_SECONDS", "86400"))
+        self.sqlite_batch_size = int(os.getenv("SQLITE_BATCH_SIZE", "64"))
         self.intent_default_reply = os.getenv("INTENT_DEFAULT_REPLY", "Desculpe, pode detalhar?")
         self.event_dedupe_ttl = int(os.getenv("EVENT_DEDUPE_TTL_SECONDS", "300"))
+        self.dedupe_capacity = int(os.getenv("DEDUPE_MEMORY_CAPACITY", "50000"))
         self.worker_visibility_timeout = int(os.getenv("WORKER_VISIBILITY_TIMEOUT", "30"))
         self.worker_max_attempts = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+        self.worker_concurrency = int(os.getenv("WORKER_CONCURRENCY", "1"))
+        # admissão do webhook: 0 em ADMISSION_HIGH_WATERMARK desliga; sem valor,
+        # deriva do tamanho da fila (ver AdmissionController.from_settings)
+        high = os.getenv("ADMISSION_HIGH_WATERMARK")
+        self.admission_high_watermark = int(high) if high else None
+        low = os.getenv("ADMISSION_LOW_WATERMARK")
+        self.admission_low_watermark = int(low) if low else None
+        shed = os.getenv("ADMISSION_SHED_WATERMARK")
+        self.admission_shed_watermark = int(shed) if shed else None
+        self.admission_priority_events = [
+            e.strip() for e in os.getenv("ADMISSION_PRIORITY_EVENTS", "message_received").split(",") if e.strip()
+        ]
+        self.admission_sample_interval_ms = int(os.getenv("ADMISSION_SAMPLE_INTERVAL_MS", "250"))
+        self.admission_retry_after = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
         self.log_json = os.getenv("LOG_JSON", "0") == "1"
         self.metrics_enabled = os.getenv("METRICS_ENABLED", "1") == "1"
         self.tenant_strategy = os.getenv("TENANT_STRATEGY", "static")
         self.static_tenant_id = os.getenv("STATIC_TENANT_ID", "default")
+        self.tenant_weights = _parse_weights(os.getenv("TENANT_WEIGHTS", ""))
+        self.tenant_refresh_interval = float(os.getenv("TENANT_REFRESH_INTERVAL_SECONDS", "1.0"))
         self.whatsapp_base_url = os.getenv("WHATSAPP_BASE_URL", "")
         self.whatsapp_api_key = os.getenv("WHATSAPP_API_KEY", "")
+        self.whatsapp_timeout = float(os.getenv("WHATSAPP_TIMEOUT_SECONDS", "15"))
+        self.whatsapp_max_connections = int(os.getenv("WHATSAPP_MAX_CONNECTIONS", "20"))
+        self.whatsapp_max_keepalive = int(os.getenv("WHATSAPP_MAX_KEEPALIVE", "10"))
+        self.whatsapp_keepalive_expiry = float(os.getenv("WHATSAPP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+        self.whatsapp_http2 = os.getenv("WHATSAPP_HTTP2", "0") == "1"
+        self.whatsapp_max_concurrency = int(os.getenv("WHATSAPP_MAX_CONCURRENCY", "10"))
+        self.whatsapp_per_dest_concurrency = int(os.getenv("WHATSAPP_PER_DEST_CONCURRENCY", "1"))
+        self.whatsapp_annotate_batch = int(os.getenv("WHATSAPP_ANNOTATE_BATCH", "20"))
+        # 0 = sem limite por destino (só respeita Retry-After); opt-in
+        self.whatsapp_dest_rate = float(os.getenv("WHATSAPP_DEST_RATE_PER_SECOND", "0"))
+        self.whatsapp_dest_burst = float(os.getenv("WHATSAPP_DEST_BURST", "3"))
+        self.whatsapp_sender_rate = float(os.getenv("WHATSAPP_SENDER_RATE_PER_SECOND", "20"))
+        self.whatsapp_sender_burst = float(os.getenv("WHATSAPP_SENDER_BURST", "40"))
+        self.whatsapp_coalesce_window_ms = int(os.getenv("WHATSAPP_COALESCE_WINDOW_MS", "0"))
+        self.whatsapp_retry_after_max = float(os.getenv("WHATSAPP_RETRY_AFTER_MAX_SECONDS", "30"))
+
+    @property
+    def durable_queue(self) -> bool:
+        """Backends com fila fora da memória, consumidos pelo `MessageWorker`."""
+        return self.queue_backend in ("redis", "sqlite")
 
 @lru_cache()
 def get_settings() -> Settings:
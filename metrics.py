@@ -1,6 +1,8 @@
 from __future__ import annotations
-from typing import Optional
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from fastapi import APIRouter, Response
 from config import get_settings
 
@@ -15,6 +17,25 @@ if settings.metrics_enabled:
     events_processed_total = Counter('events_processed_total', 'Events processed', ['status'])
     events_intent_total = Counter('events_intent_total', 'Events classified by intent', ['intent'])
     processing_latency = Histogram('event_processing_latency_seconds', 'Latency processing events')
+    tenant_queue_depth = Gauge('tenant_queue_depth', 'Pending events per tenant queue', ['tenant'])
+    tenant_queue_wait = Histogram('tenant_queue_wait_seconds', 'Time events wait in the tenant queue', ['tenant'])
+    memory_queue_depth = Gauge('memory_queue_depth', 'Pending events in the in-memory queue')
+    memory_queue_capacity = Gauge('memory_queue_capacity', 'Capacity of the in-memory queue (0 = unbounded)')
+    events_rejected_total = Counter('events_rejected_total', 'Events rejected by backpressure', ['reason'])
+    tenant_processing_latency = Histogram('tenant_processing_latency_seconds', 'Latency processing events per tenant', ['tenant'])
+    stage_latency = Histogram(
+        'pipeline_stage_seconds', 'Latency of each webhook->queue->worker stage', ['stage'],
+        buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+    )
+    reply_latency = Histogram(
+        'reply_latency_seconds', 'End-to-end latency from webhook receipt to reply sent', ['tenant', 'intent'],
+        buckets=(.05, .1, .25, .5, 1, 2, 5, 10, 30, 60, 120),
+    )
+    events_in_flight = Gauge('events_in_flight', 'Events currently being processed by workers')
+
+    from az_queue import queue as _memory_queue
+    memory_queue_depth.set_function(_memory_queue.qsize)
+    memory_queue_capacity.set(_memory_queue.maxsize)
 
     @router.get('/metrics')
     async def metrics():  # type: ignore
@@ -26,3 +47,30 @@ else:  # pragma: no cover
     events_processed_total = None  # type: ignore
     events_intent_total = None  # type: ignore
     processing_latency = None  # type: ignore
+    tenant_queue_depth = None  # type: ignore
+    tenant_queue_wait = None  # type: ignore
+    tenant_processing_latency = None  # type: ignore
+    stage_latency = None  # type: ignore
+    reply_latency = None  # type: ignore
+    events_in_flight = None  # type: ignore
+    memory_queue_depth = None  # type: ignore
+    memory_queue_capacity = None  # type: ignore
+    events_rejected_total = None  # type: ignore
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Mede o bloco no histograma `pipeline_stage_seconds{stage=...}`."""
+    if stage_latency is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_latency.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if stage_latency is not None:
+        stage_latency.labels(stage=stage).observe(max(0.0, seconds))
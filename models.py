@@ -1,7 +1,11 @@
+import asyncio
 from dataclasses import dataclass, field
 from enum import Enum
+import json
 import logging
 import os
+import threading
+import weakref
 from typing import (
     Any,
     Awaitable,
@@ -17,11 +21,10 @@ from typing import (
 from litellm import completion, acompletion, embedding
 import litellm
 
-from apps.agent_zero_core.python.helpers import dotenv
+from apps.agent_zero_core.python.helpers import dotenv, stream_coalescer
 from apps.agent_zero_core.python.helpers.dotenv import load_dotenv
 from apps.agent_zero_core.python.helpers.providers import get_provider_config
 from apps.agent_zero_core.python.helpers.rate_limiter import RateLimiter
-from apps.agent_zero_core.python.helpers.tokens import approximate_tokens
 
 from langchain_core.language_models.chat_models import SimpleChatModel
 from langchain_core.outputs.chat_generation import ChatGenerationChunk
@@ -88,6 +91,88 @@ class ChatChunk(TypedDict):
 
 rate_limiters: dict[str, RateLimiter] = {}
 
+# wrapper instances per (kind, provider, name, kwargs), swapped by clear_model_cache()
+# on settings change; pooled HTTP clients per event loop and endpoint, closed by
+# aclose_clients() on their loop when the app shuts it down
+_model_cache: dict[tuple, Any] = {}
+_model_cache_lock = threading.Lock()
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_http_clients_lock = threading.Lock()
+
+# litellm providers whose chat calls go through the OpenAI SDK and accept a prebuilt
+# `client`; the others (anthropic, deepseek, groq, mistral, openrouter, ...) run on
+# litellm's own HTTP handlers, which keep their own clients
+OPENAI_SDK_PROVIDERS = ("openai", "lm_studio", "sambanova")
+
+
+def clear_model_cache():
+    # clients stay: they are keyed by endpoint and key, so changed settings get new ones
+    global _model_cache
+    with _model_cache_lock:
+        _model_cache = {}
+
+
+def _cached_model(kind: str, provider: str, name: str, kwargs: dict, build: Callable[[], Any]):
+    key = (kind, provider, name, json.dumps(kwargs, sort_keys=True, default=str))
+    model = _model_cache.get(key)
+    if model is None:
+        with _model_cache_lock:
+            model = _model_cache.get(key)
+            if model is None:
+                model = _model_cache[key] = build()
+    return model
+
+
+async def aclose_clients():
+    """Close the pooled HTTP clients of the running loop, call it before the loop stops."""
+    with _http_clients_lock:
+        clients = _http_clients.pop(asyncio.get_running_loop(), None)
+    for client in (clients or {}).values():
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+
+def _loop_clients(loop: asyncio.AbstractEventLoop) -> dict[tuple, Any]:
+    with _http_clients_lock:
+        # loops closed without aclose_clients(): open connections keep a reference to
+        # their loop, so drop them here and leave the sockets to GC
+        for stale in [lp for lp in _http_clients if lp.is_closed()]:
+            del _http_clients[stale]
+        return _http_clients.setdefault(loop, {})
+
+
+def _shared_client(provider: str, model: str, kwargs: dict):
+    # httpx clients are bound to the loop they run on, the agent runs one loop per thread
+    if provider not in OPENAI_SDK_PROVIDERS or "client" in kwargs:
+        return None
+    try:
+        import httpx
+        from openai import AsyncOpenAI
+    except ImportError:
+        return None
+    # default endpoint and key of OpenAI compatible providers, as litellm resolves them
+    _, _, default_key, default_base = litellm.get_llm_provider(
+        model=model, api_base=kwargs.get("api_base")
+    )
+    base_url = kwargs.get("api_base") or default_base
+    api_key = kwargs.get("api_key") or default_key
+    if provider != "openai" and not (base_url and api_key):
+        return None
+    clients = _loop_clients(asyncio.get_running_loop())
+    key = (base_url, api_key)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=httpx.AsyncClient(),
+        )
+    return client
+
 
 def get_api_key(service: str) -> str:
     return (
@@ -122,6 +207,14 @@ class LiteLLMChatWrapper(SimpleChatModel):
     def _llm_type(self) -> str:
         return "litellm-chat"
 
+    def _call_kwargs(self, kwargs: dict) -> dict:
+        # async calls reuse the pooled client of this loop and endpoint
+        call_kwargs = {**self.kwargs, **kwargs}
+        client = _shared_client(self.provider, self.model_name, call_kwargs)
+        if client is not None:
+            call_kwargs["client"] = client
+        return call_kwargs
+
     def _convert_messages(self, messages: List[BaseMessage]) -> List[dict]:
         result = []
         # Map LangChain message types to LiteLLM roles
@@ -219,7 +312,7 @@ class LiteLLMChatWrapper(SimpleChatModel):
             messages=msgs,
             stream=True,
             stop=stop,
-            **{**self.kwargs, **kwargs},
+            **self._call_kwargs(kwargs),
         )
         async for chunk in response:  # type: ignore
             parsed = _parse_chunk(chunk)
@@ -237,6 +330,7 @@ class LiteLLMChatWrapper(SimpleChatModel):
         response_callback: Callable[[str, str], Awaitable[None]] | None = None,
         reasoning_callback: Callable[[str, str], Awaitable[None]] | None = None,
         tokens_callback: Callable[[str, int], Awaitable[None]] | None = None,
+        first_chunk_callback: Callable[[], Any] | None = None,
         **kwargs: Any,
     ) -> Tuple[str, str]:
 
@@ -258,39 +352,17 @@ class LiteLLMChatWrapper(SimpleChatModel):
             model=self.model_name,
             messages=msgs_conv,
             stream=True,
-            **{**self.kwargs, **kwargs},
+            **self._call_kwargs(kwargs),
         )
 
-        # results
-        reasoning = ""
-        response = ""
-
-        # iterate over chunks
-        async for chunk in _completion:  # type: ignore
-            parsed = _parse_chunk(chunk)
-            # collect reasoning delta and call callbacks
-            if parsed["reasoning_delta"]:
-                reasoning += parsed["reasoning_delta"]
-                if reasoning_callback:
-                    await reasoning_callback(parsed["reasoning_delta"], reasoning)
-                if tokens_callback:
-                    await tokens_callback(
-                        parsed["reasoning_delta"],
-                        approximate_tokens(parsed["reasoning_delta"]),
-                    )
-            # collect response delta and call callbacks
-            if parsed["response_delta"]:
-                response += parsed["response_delta"]
-                if response_callback:
-                    await response_callback(parsed["response_delta"], response)
-                if tokens_callback:
-                    await tokens_callback(
-                        parsed["response_delta"],
-                        approximate_tokens(parsed["response_delta"]),
-                    )
-
-        # return complete results
-        return response, reasoning
+        # callbacks get deltas in batches, see stream_coalescer
+        return await stream_coalescer.coalesce(
+            (_parse_chunk(chunk) async for chunk in _completion),  # type: ignore
+            reasoning_callback,
+            response_callback,
+            tokens_callback,
+            first_chunk_callback=first_chunk_callback,
+        )
 
 
 class BrowserCompatibleChatWrapper(LiteLLMChatWrapper):
@@ -479,19 +551,25 @@ def _merge_provider_defaults(
 
 
 def get_chat_model(provider: str, name: str, **kwargs: Any) -> LiteLLMChatWrapper:
-    orig = provider.lower()
-    provider_name, kwargs = _merge_provider_defaults("chat", orig, kwargs)
-    return _get_litellm_chat(LiteLLMChatWrapper, name, provider_name, **kwargs)
+    def build():
+        orig = provider.lower()
+        provider_name, merged = _merge_provider_defaults("chat", orig, dict(kwargs))
+        return _get_litellm_chat(LiteLLMChatWrapper, name, provider_name, **merged)
+
+    return _cached_model("chat", provider, name, kwargs, build)
 
 
 def get_browser_model(
     provider: str, name: str, **kwargs: Any
 ) -> BrowserCompatibleChatWrapper:
-    orig = provider.lower()
-    provider_name, kwargs = _merge_provider_defaults("chat", orig, kwargs)
-    return _get_litellm_chat(
-        BrowserCompatibleChatWrapper, name, provider_name, **kwargs
-    )
+    def build():
+        orig = provider.lower()
+        provider_name, merged = _merge_provider_defaults("chat", orig, dict(kwargs))
+        return _get_litellm_chat(
+            BrowserCompatibleChatWrapper, name, provider_name, **merged
+        )
+
+    return _cached_model("browser", provider, name, kwargs, build)
 
 
 def get_embedding_model(
@@ -0,0 +1,12 @@
+from __future__ import annotations
+from typing import Any
+
+from queues.redis_queue import build_queue as build_redis_queue
+from queues.sqlite_queue import build_queue as build_sqlite_queue
+
+
+def build_queue(settings) -> Any:
+    """Fila durável conforme `QUEUE_BACKEND` (None para o backend em memória)."""
+    if settings.queue_backend == "sqlite":
+        return build_sqlite_queue(settings)
+    return build_redis_queue(settings)
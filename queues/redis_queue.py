@@ -1,12 +1,28 @@
 from __future__ import annotations
 import json
-from typing import Any, Optional
+import time
+from typing import Any, Iterable, Optional
+
+from queues.scheduler import WeightedRoundRobin
 
 try:
     import redis  # type: ignore
 except ImportError:  # pragma: no cover
     redis = None  # type: ignore
 
+QUEUE_PREFIX = "queue:inbound"
+ACTIVE_TENANTS_KEY = "queue:tenants:active"
+
+
+def _decode(raw) -> dict:
+    try:
+        return json.loads(raw)
+    except Exception:
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", "ignore")
+        return {"_raw": raw, "_error": "json_decode_failed"}
+
+
 class RedisQueue:
     def __init__(self, client, name: str) -> None:
         self.client = client
@@ -20,19 +36,129 @@ class RedisQueue:
         if not res:
             return None
         _, raw = res
-        try:
-            return json.loads(raw)
-        except Exception:
-            return {"_raw": raw.decode("utf-8", "ignore"), "_error": "json_decode_failed"}
+        return _decode(raw)
 
     def size(self) -> int:
         return int(self.client.llen(self.name))
 
 
+class TenantShardedQueue:
+    """Uma lista Redis por tenant (`queue:inbound:<tenant>`) + set de tenants ativos.
+
+    O produtor faz LPUSH na lista do tenant e SADD no set de ativos. O consumidor
+    mantém uma cópia local do set (renovada a cada `refresh_interval`) e escolhe o
+    próximo tenant via `WeightedRoundRobin`, de modo que um disparo em massa de um
+    número não atrasa as respostas dos demais.
+    """
+
+    def __init__(
+        self,
+        client,
+        prefix: str = QUEUE_PREFIX,
+        active_key: str = ACTIVE_TENANTS_KEY,
+        weights: Optional[dict[str, int]] = None,
+        default_tenant: str = "default",
+        known_tenants: Iterable[str] = (),
+        refresh_interval: float = 1.0,
+    ) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.active_key = active_key
+        self.default_tenant = default_tenant
+        self.scheduler = WeightedRoundRobin(weights)
+        # tenants consultados mesmo fora do set (ex.: fila legada queue:inbound:default)
+        self.known_tenants = {default_tenant, *known_tenants}
+        self.refresh_interval = refresh_interval
+        self.name = self.key_for(default_tenant)
+        self._next_refresh = 0.0
+        self._depths: dict[str, int] = {}
+
+    def key_for(self, tenant: str) -> str:
+        return f"{self.prefix}:{tenant}"
+
+    def put(self, item: dict) -> None:
+        tenant = item.get("tenant") or self.default_tenant
+        # retentativas mantêm o horário da primeira entrada: queue_wait mede a espera total
+        item.setdefault("enqueued_at", time.time())
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lpush(self.key_for(tenant), json.dumps(item, ensure_ascii=False))
+        pipe.sadd(self.active_key, tenant)
+        pipe.execute()
+
+    def pop(self, timeout: int = 5) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._maybe_refresh()
+            tenant = self.scheduler.next()
+            while tenant is not None:
+                raw = self.client.rpop(self.key_for(tenant))
+                if raw is not None:
+                    return _decode(raw)
+                self._deactivate(tenant)
+                tenant = self.scheduler.next()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # nenhum tenant ativo: bloqueia brevemente nas filas conhecidas
+            keys = [self.key_for(t) for t in sorted(self.known_tenants)]
+            res = self.client.brpop(keys, timeout=1)
+            if res:
+                _, raw = res
+                self._next_refresh = 0.0
+                return _decode(raw)
+
+    def _maybe_refresh(self) -> None:
+        now = time.monotonic()
+        if len(self.scheduler) and now < self._next_refresh:
+            return
+        members = self.client.smembers(self.active_key) or set()
+        tenants = [m.decode() if isinstance(m, bytes) else m for m in members]
+        self.scheduler.set_active(tenants)
+        self._depths = self._read_depths(tenants)
+        self._next_refresh = now + self.refresh_interval
+
+    def _deactivate(self, tenant: str) -> None:
+        # SREM seguido de LLEN: um put concorrente que já empurrou item é visto
+        # aqui; um put posterior refaz o SADD. Assim nenhum tenant fica órfão.
+        self.scheduler.discard(tenant)
+        self.client.srem(self.active_key, tenant)
+        if int(self.client.llen(self.key_for(tenant)) or 0) > 0:
+            self.client.sadd(self.active_key, tenant)
+            self.scheduler.add(tenant)
+        else:
+            self._depths[tenant] = 0
+
+    def _read_depths(self, tenants: Iterable[str]) -> dict[str, int]:
+        names = sorted(set(tenants) | self.known_tenants)
+        pipe = self.client.pipeline(transaction=False)
+        for t in names:
+            pipe.llen(self.key_for(t))
+        return {t: int(n or 0) for t, n in zip(names, pipe.execute())}
+
+    def depths(self) -> dict[str, int]:
+        """Profundidade por tenant da última renovação (sem round-trip)."""
+        return dict(self._depths)
+
+    def size_by_tenant(self) -> dict[str, int]:
+        members = self.client.smembers(self.active_key) or set()
+        tenants = [m.decode() if isinstance(m, bytes) else m for m in members]
+        self._depths = self._read_depths(tenants)
+        return dict(self._depths)
+
+    def size(self) -> int:
+        return sum(self.size_by_tenant().values())
+
+
 def build_queue(settings) -> Any:
     if settings.queue_backend != "redis":
         return None
     if redis is None:
         raise RuntimeError("redis package not installed")
     client = redis.from_url(settings.redis_url, decode_responses=True)
-    return RedisQueue(client, "queue:inbound:default")
+    return TenantShardedQueue(
+        client,
+        weights=settings.tenant_weights,
+        default_tenant=settings.static_tenant_id,
+        known_tenants=settings.tenant_weights.keys(),
+        refresh_interval=settings.tenant_refresh_interval,
+    )
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from typing import Iterable, Optional
+
+
+class WeightedRoundRobin:
+    """Smooth weighted round-robin (estilo nginx) entre tenants ativos.
+
+    Cada escolha soma o peso de cada tenant ao seu crédito corrente, escolhe o
+    maior crédito e desconta o peso total do escolhido. Com pesos 3:1 a sequência
+    fica A A B A (intercalada), sem rajadas de um único tenant.
+    """
+
+    def __init__(self, weights: Optional[dict[str, int]] = None, default_weight: int = 1) -> None:
+        self.weights = dict(weights or {})
+        self.default_weight = max(1, default_weight)
+        self._current: dict[str, int] = {}
+
+    def weight(self, tenant: str) -> int:
+        return self.weights.get(tenant, self.default_weight)
+
+    def set_active(self, tenants: Iterable[str]) -> None:
+        active = set(tenants)
+        # preserva crédito de quem continua ativo para não reiniciar a rodada
+        self._current = {t: self._current.get(t, 0) for t in active}
+
+    def add(self, tenant: str) -> None:
+        self._current.setdefault(tenant, 0)
+
+    def discard(self, tenant: str) -> None:
+        self._current.pop(tenant, None)
+
+    def active(self) -> list[str]:
+        return list(self._current)
+
+    def next(self) -> Optional[str]:
+        if not self._current:
+            return None
+        total = 0
+        best: Optional[str] = None
+        for tenant in self._current:
+            w = self.weight(tenant)
+            self._current[tenant] += w
+            total += w
+            if best is None or self._current[tenant] > self._current[best]:
+                best = tenant
+        assert best is not None
+        self._current[best] -= total
+        return best
+
+    def __len__(self) -> int:
+        return len(self._current)
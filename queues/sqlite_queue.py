@@ -0,0 +1,265 @@
+from __future__ import annotations
+import json
+import logging
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from queues.scheduler import WeightedRoundRobin
+from storage.sqlite_db import connect
+
+logger = logging.getLogger("sqlite_queue")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    visible_at REAL NOT NULL,
+    deliveries INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_queue_items_tenant ON queue_items (tenant, id);
+CREATE TABLE IF NOT EXISTS queue_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class SqliteQueue:
+    """Fila durável em arquivo SQLite (WAL), mesma interface da `TenantShardedQueue`.
+
+    `pop` arrenda o item por `visibility_timeout` segundos em vez de removê-lo;
+    o worker confirma com `ack(item)`. Se o processo morrer antes do ack o item
+    volta a ficar visível e é reentregue (at-least-once). Acks são acumulados e
+    gravados na mesma transação do próximo `pop` (ou a cada `batch_size`), e
+    itens mais antigos que `ttl` são descartados periodicamente (contados em
+    `stats:expired`).
+
+    Com a fila vazia o `pop` só faz uma leitura, sem o lock de escrita, e o
+    intervalo entre consultas dobra de `poll_interval` até `max_poll_interval`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        visibility_timeout: float = 30,
+        ttl: float = 0,
+        max_deliveries: int = 5,
+        batch_size: int = 64,
+        poll_interval: float = 0.05,
+        max_poll_interval: float = 1.0,
+        weights: Optional[dict[str, int]] = None,
+        default_tenant: str = "default",
+        purge_interval: float = 30,
+        refresh_interval: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.ttl = ttl
+        self.max_deliveries = max_deliveries
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(poll_interval, max_poll_interval)
+        self.default_tenant = default_tenant
+        self.purge_interval = purge_interval
+        self.refresh_interval = refresh_interval
+        self.scheduler = WeightedRoundRobin(weights)
+        self.conn = connect(path)
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._pending_acks: list[int] = []
+        self._next_purge = 0.0
+        self._next_refresh = 0.0
+        self._depths: dict[str, int] = {}
+
+    # -- produtor ------------------------------------------------------------
+    def _row(self, item: dict, now: float) -> tuple:
+        item = {k: v for k, v in item.items() if k != "_qid"}
+        # retentativas mantêm o horário da primeira entrada (métrica queue_wait);
+        # a coluna, usada pelo TTL, conta a partir da última inserção
+        item.setdefault("enqueued_at", now)
+        tenant = item.get("tenant") or self.default_tenant
+        return (tenant, json.dumps(item, ensure_ascii=False), now, now)
+
+    def put(self, item: dict) -> None:
+        self.put_many([item])
+
+    def put_many(self, items: Iterable[dict]) -> None:
+        now = time.time()
+        rows = [self._row(i, now) for i in items]
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO queue_items (tenant, payload, enqueued_at, visible_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    # -- consumidor ----------------------------------------------------------
+    def pop(self, timeout: int = 5) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        interval = self.poll_interval
+        while True:
+            item = self._claim()
+            if item is not None:
+                return item
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def _claim(self) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            if not self._pending_acks and now < self._next_purge and not self._has_visible_locked(now):
+                return None  # nada a fazer: não disputa o lock de escrita
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_acks_locked()
+                if now >= self._next_purge:
+                    self._purge_locked(now)
+                    self._next_purge = now + self.purge_interval
+                item = self._claim_locked(now)
+                self.conn.execute("COMMIT")
+                return item
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _has_visible_locked(self, now: float) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM queue_items WHERE visible_at <= ? LIMIT 1", (now,)
+        ).fetchone()
+        return row is not None
+
+    def _claim_locked(self, now: float) -> Optional[dict]:
+        if not len(self.scheduler) or now >= self._next_refresh:
+            rows = self.conn.execute(
+                "SELECT tenant, COUNT(*), MIN(visible_at) FROM queue_items GROUP BY tenant"
+            ).fetchall()
+            self._depths = {t: int(n) for t, n, _ in rows}
+            self.scheduler.set_active(t for t, _, visible_at in rows if visible_at <= now)
+            self._next_refresh = now + self.refresh_interval
+        tenant = self.scheduler.next()
+        while tenant is not None:
+            row = self.conn.execute(
+                "SELECT id, payload, deliveries FROM queue_items "
+                "WHERE tenant = ? AND visible_at <= ? ORDER BY id LIMIT 1",
+                (tenant, now),
+            ).fetchone()
+            if row is None:
+                self.scheduler.discard(tenant)
+                tenant = self.scheduler.next()
+                continue
+            qid, payload, deliveries = row
+            if self.max_deliveries and deliveries >= self.max_deliveries:
+                # item envenenado (worker caiu repetidamente): descarta
+                self.conn.execute("DELETE FROM queue_items WHERE id = ?", (qid,))
+                self._incr_locked("stats:dead_lettered")
+                continue
+            self.conn.execute(
+                "UPDATE queue_items SET visible_at = ?, deliveries = deliveries + 1 WHERE id = ?",
+                (now + self.visibility_timeout, qid),
+            )
+            try:
+                item = json.loads(payload)
+            except Exception:
+                item = {"_raw": payload, "_error": "json_decode_failed"}
+            item["_qid"] = qid
+            return item
+        return None
+
+    def ack(self, item: dict) -> None:
+        qid = item.get("_qid")
+        if qid is None:
+            return
+        with self._lock:
+            self._pending_acks.append(qid)
+            if len(self._pending_acks) < self.batch_size:
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_acks_locked()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _flush_acks_locked(self) -> None:
+        if not self._pending_acks:
+            return
+        self.conn.executemany("DELETE FROM queue_items WHERE id = ?", [(i,) for i in self._pending_acks])
+        self._pending_acks.clear()
+
+    def _purge_locked(self, now: float) -> None:
+        if not self.ttl:
+            return
+        expired = self.conn.execute(
+            "DELETE FROM queue_items WHERE enqueued_at < ?", (now - self.ttl,)
+        ).rowcount
+        if expired > 0:
+            self._incr_locked("stats:expired", expired)
+            logger.warning("Fila SQLite: %s itens não processados expiraram (TTL %ss)", expired, self.ttl)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending_acks:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self._flush_acks_locked()
+                self.conn.execute("COMMIT")
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    # -- observabilidade -----------------------------------------------------
+    def size_by_tenant(self) -> dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT tenant, COUNT(*) FROM queue_items GROUP BY tenant").fetchall()
+        return {t: int(n) for t, n in rows}
+
+    def depths(self) -> dict[str, int]:
+        """Profundidade por tenant da última renovação (sem consulta)."""
+        return dict(self._depths)
+
+    def size(self) -> int:
+        with self._lock:
+            return int(self.conn.execute("SELECT COUNT(*) FROM queue_items").fetchone()[0])
+
+    def _incr_locked(self, name: str, amount: int = 1) -> None:
+        self.conn.execute(
+            "INSERT INTO queue_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._incr_locked(name, amount)
+
+    def get_stat(self, name: str) -> int:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM queue_stats WHERE name = ?", (name,)).fetchone()
+        return int(row[0]) if row else 0
+
+
+def build_queue(settings) -> Any:
+    if settings.queue_backend != "sqlite":
+        return None
+    return SqliteQueue(
+        settings.sqlite_path,
+        visibility_timeout=settings.worker_visibility_timeout,
+        ttl=settings.sqlite_queue_ttl,
+        max_deliveries=settings.worker_max_attempts + 2,
+        batch_size=settings.sqlite_batch_size,
+        weights=settings.tenant_weights,
+        default_tenant=settings.static_tenant_id,
+        refresh_interval=settings.tenant_refresh_interval,
+    )
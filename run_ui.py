@@ -1,3 +1,4 @@
+import contextlib
 from datetime import timedelta
 import os
 import secrets
@@ -12,6 +13,7 @@ from typing import override
 from flask import Flask, request, Response, session
 from flask_basicauth import BasicAuth
 import initialize
+import models
 from apps.agent_zero_core.python.helpers import errors, files, git, mcp_server
 from apps.agent_zero_core.python.helpers.files import get_abs_path
 from apps.agent_zero_core.python.helpers import runtime, dotenv, process
@@ -182,6 +184,24 @@ async def healthz():  # type: ignore
     return jsonify({"status": "ok", "ready": AGENT_ZERO_READY})
 
 
+class _UvicornHandle:
+    # process.stop_server() expects a werkzeug-like .shutdown()
+    def __init__(self, server):
+        self.server = server
+
+    def shutdown(self):
+        self.server.should_exit = True
+
+
+def _terminate_event_loops():
+    # agent loops close their pooled model clients before stopping; the helpers are
+    # loaded both as apps.agent_zero_core.python.* and as python.*, each with its own threads
+    for name in ("apps.agent_zero_core.python.helpers.defer", "python.helpers.defer"):
+        module = sys.modules.get(name)
+        if module:
+            module.EventLoopThread.terminate_all()
+
+
 def run():
     PrintStyle().print("Initializing framework...")
 
@@ -190,11 +210,13 @@ def run():
     from werkzeug.serving import make_server
     from werkzeug.middleware.dispatcher import DispatcherMiddleware
     from a2wsgi import ASGIMiddleware, WSGIMiddleware
-    embedded_routes = {}
+    # WEB_UI_SERVER=asgi: uvicorn + one event loop, ASGI apps mounted natively
+    asgi_mode = (dotenv.get_dotenv_value("WEB_UI_SERVER") or "wsgi").lower() == "asgi"
+    asgi_mounts = {}
     if os.getenv('WEBHOOK_EMBEDDED') == '1':
         try:
             from webhook_server import app as webhook_app  # FastAPI instance
-            embedded_routes['/agent-zero'] = ASGIMiddleware(app=webhook_app)  # type: ignore
+            asgi_mounts['/agent-zero'] = webhook_app
         except Exception as e:  # pragma: no cover
             PrintStyle().print(f"Falha ao embutir webhook: {e}")
 
@@ -210,6 +232,7 @@ def run():
         runtime.get_arg("host") or dotenv.get_dotenv_value("WEB_UI_HOST") or "localhost"
     )
     server = None
+    api_routes = []
 
     def register_api_handler(app, handler: type[ApiHandler]):
         name = handler.__module__.split(".")[-1]
@@ -227,6 +250,7 @@ def run():
         if handler.requires_csrf():
             handler_wrap = csrf_protect(handler_wrap)
 
+        api_routes.append((f"/{name}", handler_wrap, handler.get_methods()))
         app.add_url_rule(
             f"/{name}",
             f"/{name}",
@@ -240,9 +264,11 @@ def run():
         register_api_handler(webapp, handler)
 
     # add the webapp and mcp to the app
-    embedded_routes['/mcp'] = ASGIMiddleware(app=mcp_server.DynamicMcpProxy.get_instance())  # type: ignore
-    app = DispatcherMiddleware(webapp, embedded_routes)
-    PrintStyle().debug("Registered middleware for MCP and MCP token")
+    asgi_mounts['/mcp'] = mcp_server.DynamicMcpProxy.get_instance()
+    if not asgi_mode:
+        embedded_routes = {path: ASGIMiddleware(app=sub) for path, sub in asgi_mounts.items()}  # type: ignore
+        app = DispatcherMiddleware(webapp, embedded_routes)
+        PrintStyle().debug("Registered middleware for MCP and MCP token")
 
     PrintStyle().debug(f"Starting server at http://{host}:{port} ...")
 
@@ -251,14 +277,14 @@ def run():
         try:
             from config import get_settings as _gs
             s = _gs()
-            if s.queue_backend == 'redis':
-                PrintStyle().print("Iniciando worker embutido (Redis)...")
+            if s.durable_queue:
+                PrintStyle().print(f"Iniciando worker embutido ({s.queue_backend})...")
                 def _start_worker_thread():
                     try:
-                        from queues.redis_queue import build_queue as build_redis_queue
+                        from queues.factory import build_queue as build_durable_queue
                         from storage.processed_events_store import build_store as build_dedupe_store
                         from workers.message_worker import MessageWorker
-                        q = build_redis_queue(s)
+                        q = build_durable_queue(s)
                         ds = build_dedupe_store(s)
                         import asyncio
                         mw = MessageWorker(q, ds)
@@ -269,6 +295,41 @@ def run():
         except Exception as e:  # pragma: no cover
             PrintStyle().print(f"Falha ao iniciar worker embutido: {e}")
 
+    if asgi_mode:
+        import uvicorn
+        from starlette.applications import Starlette
+        from starlette.routing import Mount, Route
+        from apps.agent_zero_core.python.helpers.asgi_bridge import FlaskViewApp
+
+        routes = [Mount(path, app=sub) for path, sub in asgi_mounts.items()]
+        routes += [
+            Route(path, endpoint=FlaskViewApp(webapp, view), methods=methods)
+            for path, view, methods in api_routes
+        ]
+        # index, static files and the remaining Flask routes stay on WSGI (thread pool)
+        routes.append(Mount("/", app=WSGIMiddleware(webapp)))  # type: ignore
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            yield
+            # pooled model clients used by requests on the server loop
+            await models.aclose_clients()
+
+        uv_server = uvicorn.Server(
+            uvicorn.Config(
+                Starlette(routes=routes, lifespan=lifespan),
+                host=host, port=port, log_level="warning", access_log=False,
+            )
+        )
+        process.set_server(_UvicornHandle(uv_server))
+        PrintStyle().print(f"Serving ASGI on http://{host}:{port}")
+        init_a0()
+        try:
+            uv_server.run()
+        finally:
+            _terminate_event_loops()
+        return
+
     server = make_server(
         host=host,
         port=port,
@@ -284,7 +345,10 @@ def run():
     init_a0()
 
     # run the server
-    server.serve_forever()
+    try:
+        server.serve_forever()
+    finally:
+        _terminate_event_loops()
 
 
 def init_a0():
@@ -0,0 +1,110 @@
+"""Micro-benchmark do classificador de intents sobre um corpus em português.
+
+Uso:
+  python scripts/bench_classifier.py --repeat 2000 --extra-intents 50
+
+Compara a sequência de `re.search` antiga com o `IntentEngine` (uma passada
+por mensagem) e mostra como cada um escala ao acrescentar intents sintéticas.
+"""
+from __future__ import annotations
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.classifier import INTENT_RULES  # noqa: E402
+from services.intent_engine import IntentEngine  # noqa: E402
+
+CORPUS = [
+    "oi",
+    "Olá, tudo bem?",
+    "bom dia! queria saber o status do meu pedido",
+    "Qual o status do pedido 12345?",
+    "quero cancelar minha compra",
+    "pode remover o item do carrinho por favor",
+    "quem é você?",
+    "qual é o seu nome",
+    "vocês entregam no sábado?",
+    "qual o prazo de entrega para São Paulo",
+    "o produto chegou com defeito, como faço a troca",
+    "preciso da segunda via do boleto",
+    "aceitam pix?",
+    "meu código de rastreio não funciona",
+    "obrigado pela ajuda",
+    "tem desconto para pagamento à vista?",
+    "a loja física abre que horas amanhã",
+    "não recebi o e-mail de confirmação",
+    "gostaria de falar com um atendente humano",
+    "kkkkk valeu",
+    "Boa noite, meu pedido ainda não saiu para entrega, podem verificar? "
+    "Comprei na semana passada e o site mostra apenas aguardando faturamento.",
+]
+
+# padrões anteriores (services/classifier.py antes do IntentEngine)
+_LEGACY = [
+    (re.compile(r"\b(status|pedido|tracking)\b", re.I), "order_status"),
+    (re.compile(r"\b(oi|ol[aá])\b", re.I), "greeting"),
+    (re.compile(r"\b(cancel(ar)?|remover)\b", re.I), "cancel_order"),
+    (re.compile(r"\b(seu nome|qual (é|eh) o seu nome|quem (é|eh) você|quem é voce|quem eh voce|quem é vc|quem eh vc)\b", re.I), "bot_identity"),
+]
+
+
+def legacy_classify(patterns, text: str) -> str:
+    lowered = text.strip().lower()
+    for rx, intent in patterns:
+        if rx.search(lowered):
+            return intent
+    return "unknown"
+
+
+def synthetic_rules(n: int) -> list[tuple[str, list[str]]]:
+    # intents que não casam com o corpus: pior caso para a busca sequencial
+    return [(f"extra_{i}", [f"palavra{i}", f"outra frase {i}"]) for i in range(n)]
+
+
+def timed(fn, texts) -> float:
+    t0 = time.perf_counter()
+    for t in texts:
+        fn(t)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--extra-intents", type=int, default=50)
+    args = parser.parse_args()
+    texts = CORPUS * args.repeat
+    engine = IntentEngine(INTENT_RULES)
+    mismatches = [t for t in CORPUS if engine.classify(t) != legacy_classify(_LEGACY, t)]
+    if mismatches:
+        print("divergências legacy x engine:", mismatches)
+
+    extra = synthetic_rules(args.extra_intents)
+    legacy_big = _LEGACY + [
+        (re.compile(r"\b(" + "|".join(re.escape(p) for p in phrases) + r")\b", re.I), intent)
+        for intent, phrases in extra
+    ]
+    engine_big = IntentEngine(INTENT_RULES + extra)
+
+    n = len(texts)
+    print(f"{'classificador':<28} {'msgs/s':>12}   (n={n})")
+    for name, fn in [
+        ("legacy re.search x4", lambda t: legacy_classify(_LEGACY, t)),
+        ("IntentEngine", engine.classify),
+        (f"legacy +{args.extra_intents} intents", lambda t: legacy_classify(legacy_big, t)),
+        (f"IntentEngine +{args.extra_intents} intents", engine_big.classify),
+    ]:
+        print(f"{name:<28} {n / timed(fn, texts):>12,.0f}")
+    t0 = time.perf_counter()
+    engine_big.classify_batch(texts)
+    print(f"{'classify_batch (+extra)':<28} {n / (time.perf_counter() - t0):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Teste de carga ponta a ponta: webhook -> fila -> worker -> gateway falso.
+
+Uso:
+  python scripts/bench_e2e.py --events 2000 --rate 200 --backends memory,sqlite,redis
+  python scripts/bench_e2e.py --gw-latency-ms 80 --gw-error-rate 0.02 --dup-ratio 0.1
+  python scripts/bench_e2e.py --backends sqlite --supervise --min-replies-per-sec 150
+
+Sobe um gateway WhatsApp falso neste processo (`/v1/messages` e anotações,
+com latência e taxas de erro/429 configuráveis) e, para cada backend, um
+az_daemon novo (sem UI) apontando para ele. Envia eventos assinados na taxa
+pedida, reenvia uma fração como duplicados e mede: aceitos/s, respostas/s,
+latência p50/p95/p99 do recebimento no webhook até a resposta chegar ao
+gateway, e a precisão do dedupe (duplicados barrados, falsos positivos,
+respostas em dobro). Redis é pulado se REDIS_URL não responder.
+
+Gerador e gateway falso rodam neste processo e disputam CPU com o daemon:
+compare números da mesma máquina, não entre máquinas.
+
+Com --max-p95-ms / --min-replies-per-sec sai com código 1 se algum backend
+ficar fora do limite (uso em CI antes de deploy).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SECRET = "bench-secret"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class FakeGateway:
+    """Gateway WhatsApp em processo: registra quando cada destino recebeu resposta."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float,
+                 throttle_rate: float, seed: int = 0) -> None:
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.port = _free_port()
+        self.reset()
+        self.app = FastAPI()
+        self.app.post("/v1/messages")(self._message)
+        self.app.post("/v1/messages/{message_id}/annotations")(self._annotation)
+        self._server: uvicorn.Server | None = None
+
+    def reset(self) -> None:
+        self.replies: dict[str, list[float]] = {}
+        self.annotations = 0
+        self.errors = 0
+        self.throttled = 0
+
+    async def _delay(self) -> None:
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _message(self, request: Request):
+        payload = await request.json()
+        await self._delay()
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self.throttled += 1
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        if roll < self.throttle_rate + self.error_rate:
+            self.errors += 1
+            return JSONResponse({"error": "injected"}, status_code=500)
+        # MessageWorker manda "to" e "number"; o worker em memória só "number"
+        dest = payload.get("to") or payload.get("number") or ""
+        self.replies.setdefault(dest, []).append(time.time())
+        return {"ok": True}
+
+    async def _annotation(self, message_id: str):
+        await self._delay()
+        self.annotations += 1
+        return {"ok": True}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> None:
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        threading.Thread(target=self._server.run, name="fake-gateway", daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.should_exit = True
+
+
+def _redis_available() -> bool:
+    try:
+        import redis  # type: ignore
+        from config import get_settings
+        redis.from_url(get_settings().redis_url).ping()
+        return True
+    except Exception as e:
+        print(f"redis: indisponível ({e}); pulando")
+        return False
+
+
+def start_daemon(backend: str, gateway: FakeGateway, workdir: str, args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = dict(
+        os.environ,
+        QUEUE_BACKEND=backend,
+        AGENT_ZERO_PORT=str(port),
+        AGENT_DAEMON_WEBHOOK_PORT=str(port),
+        AGENT_DAEMON_DISABLE_UI="1",
+        WHATSAPP_BASE_URL=gateway.url,
+        WHATSAPP_WEBHOOK_SECRET=SECRET,
+        DISABLE_WEBHOOK_API_KEY="1",
+        TENANT_STRATEGY="static",
+        SQLITE_QUEUE_PATH=os.path.join(workdir, f"{backend}.sqlite3"),
+        AGENT_LOG_DIR=os.path.join(workdir, f"logs-{backend}"),
+        # o limite por número remetente mediria o token bucket, não o pipeline
+        WHATSAPP_SENDER_RATE_PER_SECOND=str(args.sender_rate),
+        WHATSAPP_SENDER_BURST=str(args.sender_rate),
+        WORKER_CONCURRENCY=str(args.worker_concurrency),
+    )
+    if args.supervise and backend != "memory":
+        env["AGENT_DAEMON_MODE"] = "supervisor"
+        env["AGENT_DAEMON_WORKER_PROCESSES"] = str(args.worker_processes)
+        env["AGENT_DAEMON_WEBHOOK_WORKERS"] = str(args.webhook_workers)
+    proc = subprocess.Popen(
+        [sys.executable, "az_daemon.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"daemon {backend} saiu com código {proc.returncode}")
+        try:
+            if httpx.get(f"{base}/health", timeout=0.5).status_code == 200:
+                return proc, base
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"daemon {backend} não respondeu /health em 60s")
+
+
+def stop_daemon(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def build_events(n: int, dup_ratio: float, run_id: str, rng: random.Random) -> list[tuple[int, bytes, bool]]:
+    """(índice do evento único, corpo, é_duplicado) na ordem de envio."""
+    plan: list[tuple[int, bytes, bool]] = []
+    bodies: list[bytes] = []
+    for i in range(n):
+        body = json.dumps({
+            "event": "message_received",
+            "id": f"{run_id}-{i}",
+            "timestamp": int(time.time()),
+            "message": {"id": f"{run_id}-m{i}", "from": f"{run_id}{i}@c.us",
+                        "body": "oi, qual o status do meu pedido?", "fromMe": False, "direction": "inbound"},
+        }).encode()
+        bodies.append(body)
+        plan.append((i, body, False))
+        if rng.random() < dup_ratio:
+            # reentrega do gateway: mesmo corpo e mesma assinatura
+            j = rng.randrange(i + 1)
+            plan.append((j, bodies[j], True))
+    return plan
+
+
+async def drive(base: str, plan, rate: float, concurrency: int) -> dict:
+    url = f"{base}/agent-zero/webhooks/whatsapp"
+    sent_at: dict[int, float] = {}
+    # original e reenvio podem chegar juntos e o reenvio ser o aceito: a conta é
+    # por evento (exatamente um aceite por id), não por qual cópia foi aceita
+    res = {"accepts": {}, "flagged": {}, "rejected": {}}
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def send(idx: int, body: bytes, is_dup: bool) -> None:
+            sig = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+            try:
+                if not is_dup:
+                    sent_at[idx] = time.time()
+                r = await client.post(url, content=body, headers={"X-Signature": sig, "Content-Type": "application/json"})
+            except httpx.HTTPError as e:
+                res["rejected"][type(e).__name__] = res["rejected"].get(type(e).__name__, 0) + 1
+                return
+            finally:
+                slots.release()
+            if r.status_code != 200:
+                res["rejected"][r.status_code] = res["rejected"].get(r.status_code, 0) + 1
+                return
+            data = r.json()
+            if data.get("duplicate"):
+                res["flagged"][idx] = res["flagged"].get(idx, 0) + 1
+            elif data.get("accepted"):
+                res["accepts"][idx] = res["accepts"].get(idx, 0) + 1
+
+        t0 = time.perf_counter()
+        tasks = []
+        for k, (idx, body, is_dup) in enumerate(plan):
+            wait = t0 + k / rate - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(idx, body, is_dup)))
+        await asyncio.gather(*tasks)
+        res["send_seconds"] = time.perf_counter() - t0
+    res["sent_at"] = sent_at
+    res["accepted"] = set(res["accepts"])
+    res["dup_flagged"] = sum(res["flagged"].values())
+    res["dup_missed"] = sum(n - 1 for n in res["accepts"].values())
+    # falso positivo: evento barrado como duplicado sem nenhuma cópia aceita
+    res["false_dup"] = sum(1 for idx in res["flagged"] if idx not in res["accepts"])
+    return res
+
+
+def run_backend(backend: str, gateway: FakeGateway, workdir: str, args) -> dict | None:
+    if backend == "redis" and not _redis_available():
+        return None
+    gateway.reset()
+    run_id = f"b{uuid.uuid4().hex[:8]}"
+    plan = build_events(args.events, args.dup_ratio, run_id, random.Random(args.seed))
+    proc, base = start_daemon(backend, gateway, workdir, args)
+    try:
+        res = asyncio.run(drive(base, plan, args.rate, args.concurrency))
+        sent_at = res["sent_at"]
+        dests = {idx: f"{run_id}{idx}@c.us" for idx in res["accepted"]}
+        deadline = time.monotonic() + args.drain_timeout
+        while time.monotonic() < deadline:
+            if all(d in gateway.replies for d in dests.values()):
+                break
+            time.sleep(0.05)
+    finally:
+        stop_daemon(proc)
+    replied = {idx: gateway.replies[d] for idx, d in dests.items() if d in gateway.replies}
+    latencies = [(times[0] - sent_at[idx]) * 1000 for idx, times in replied.items()]
+    first = min(sent_at.values()) if sent_at else time.time()
+    last = max((times[0] for times in replied.values()), default=first)
+    dups_sent = sum(1 for _, _, is_dup in plan if is_dup)
+    return {
+        "backend": backend,
+        "accepted": len(res["accepted"]),
+        "accepted_per_sec": len(res["accepted"]) / res["send_seconds"],
+        "replies": len(replied),
+        "replies_per_sec": len(replied) / (last - first) if last > first else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "missing_replies": len(dests) - len(replied),
+        "double_replies": sum(1 for times in replied.values() if len(times) > 1),
+        "dups_sent": dups_sent,
+        "dup_flagged": res["dup_flagged"],
+        "dup_missed": res["dup_missed"],
+        "false_dup": res["false_dup"],
+        "rejected": res["rejected"],
+        "gw_errors": gateway.errors,
+        "gw_throttled": gateway.throttled,
+        "gw_annotations": gateway.annotations,
+    }
+
+
+def report(r: dict) -> None:
+    accuracy = r["dup_flagged"] / r["dups_sent"] if r["dups_sent"] else 1.0
+    print(
+        f"{r['backend']:<8} {r['accepted_per_sec']:>10,.0f} {r['replies_per_sec']:>10,.0f} "
+        f"{r['p50']:>9,.1f} {r['p95']:>9,.1f} {r['p99']:>9,.1f} {accuracy:>8.1%}"
+    )
+    print(
+        f"         aceitos={r['accepted']} respostas={r['replies']} sem_resposta={r['missing_replies']} "
+        f"respostas_em_dobro={r['double_replies']} dups={r['dups_sent']} dups_aceitos={r['dup_missed']} "
+        f"falsos_dups={r['false_dup']} recusados={r['rejected'] or 0} "
+        f"gw_erros={r['gw_errors']} gw_429={r['gw_throttled']} anotações={r['gw_annotations']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000, help="eventos únicos por backend")
+    parser.add_argument("--rate", type=float, default=200, help="eventos enviados por segundo")
+    parser.add_argument("--concurrency", type=int, default=64, help="requisições simultâneas ao webhook")
+    parser.add_argument("--dup-ratio", type=float, default=0.1, help="fração de eventos reenviados")
+    parser.add_argument("--backends", default="memory,sqlite,redis")
+    parser.add_argument("--gw-latency-ms", type=float, default=20)
+    parser.add_argument("--gw-jitter-ms", type=float, default=5)
+    parser.add_argument("--gw-error-rate", type=float, default=0.0, help="fração de 500 no /v1/messages")
+    parser.add_argument("--gw-throttle-rate", type=float, default=0.0, help="fração de 429 no /v1/messages")
+    parser.add_argument("--worker-concurrency", type=int, default=16)
+    parser.add_argument("--sender-rate", type=float, default=100000)
+    parser.add_argument("--supervise", action="store_true", help="daemon em modo supervisor (backends duráveis)")
+    parser.add_argument("--worker-processes", type=int, default=2)
+    parser.add_argument("--webhook-workers", type=int, default=2)
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--min-replies-per-sec", type=float, default=None)
+    args = parser.parse_args()
+
+    gateway = FakeGateway(args.gw_latency_ms, args.gw_jitter_ms, args.gw_error_rate,
+                          args.gw_throttle_rate, seed=args.seed)
+    gateway.start()
+    failed = []
+    print(f"{'backend':<8} {'aceitos/s':>10} {'resp/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'dedupe':>8}"
+          f"   (n={args.events}, rate={args.rate:g}/s)")
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for backend in args.backends.split(","):
+                backend = backend.strip()
+                try:
+                    r = run_backend(backend, gateway, workdir, args)
+                except RuntimeError as e:
+                    print(f"{backend}: {e}")
+                    failed.append(backend)
+                    continue
+                if r is None:
+                    continue
+                report(r)
+                if args.max_p95_ms is not None and not r["p95"] <= args.max_p95_ms:
+                    failed.append(backend)
+                elif args.min_replies_per_sec is not None and r["replies_per_sec"] < args.min_replies_per_sec:
+                    failed.append(backend)
+                elif r["dup_missed"] or r["false_dup"] or r["double_replies"]:
+                    failed.append(backend)
+    finally:
+        gateway.stop()
+    if failed:
+        print("fora do limite:", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
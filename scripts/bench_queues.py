@@ -0,0 +1,138 @@
+"""Benchmark de vazão dos backends de fila e dedupe (memory, sqlite, redis).
+
+Uso:
+  python scripts/bench_queues.py --n 20000 --backends memory,sqlite,redis
+
+Para cada backend mede put/s, pop+ack/s e mark_if_new/s com payloads do
+tamanho de um evento real do webhook. Redis é pulado se REDIS_URL não responder.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from az_queue import InMemoryQueue  # noqa: E402
+from config import get_settings  # noqa: E402
+
+
+def _event(i: int) -> dict:
+    return {
+        "payload": {
+            "event": "message_received",
+            "timestamp": int(time.time()),
+            "message": {"id": f"bench-{i}", "from": "5511999999999@c.us", "body": "oi, qual o status do pedido?"},
+        },
+        "attempt": 0,
+        "tenant": f"t{i % 4}",
+        "event_type": "message_received",
+    }
+
+
+def _rate(n: int, seconds: float) -> str:
+    return f"{n / seconds:>10,.0f}/s" if seconds > 0 else "       inf/s"
+
+
+def bench_memory(n: int) -> dict:
+    async def run():
+        q = InMemoryQueue()
+        items = [_event(i) for i in range(n)]
+        t0 = time.perf_counter()
+        for it in items:
+            q.put_nowait(it)
+        t1 = time.perf_counter()
+        got = 0
+        while got < n:
+            got += len(await q.get_many(256, timeout=1))
+        t2 = time.perf_counter()
+        return {"put": t1 - t0, "pop": t2 - t1}
+
+    res = asyncio.run(run())
+    from az_queue import dedupe
+    t0 = time.perf_counter()
+    for i in range(n):
+        dedupe(f"bench-mem-{i}")
+    res["dedupe"] = time.perf_counter() - t0
+    return res
+
+
+def bench_sqlite(n: int, batch: int) -> dict:
+    from queues.sqlite_queue import SqliteQueue
+    from storage.processed_events_store import SqliteEventDedupeStore
+    with tempfile.TemporaryDirectory() as d:
+        q = SqliteQueue(os.path.join(d, "q.sqlite3"), batch_size=batch)
+        items = [_event(i) for i in range(n)]
+        t0 = time.perf_counter()
+        for start in range(0, n, batch):
+            q.put_many(items[start:start + batch])
+        t1 = time.perf_counter()
+        for _ in range(n):
+            q.ack(q.pop(timeout=0))
+        q.flush()
+        t2 = time.perf_counter()
+        store = SqliteEventDedupeStore(os.path.join(d, "d.sqlite3"), ttl=300)
+        t3 = time.perf_counter()
+        for i in range(n):
+            store.mark_if_new("t", f"bench-{i}")
+        t4 = time.perf_counter()
+        q.close()
+        return {"put": t1 - t0, "pop": t2 - t1, "dedupe": t4 - t3}
+
+
+def bench_redis(n: int) -> dict | None:
+    try:
+        import redis  # type: ignore
+        from queues.redis_queue import TenantShardedQueue
+        from storage.processed_events_store import EventDedupeStore
+        client = redis.from_url(get_settings().redis_url, decode_responses=True)
+        client.ping()
+    except Exception as e:
+        print(f"redis: indisponível ({e}); pulando")
+        return None
+    prefix = f"bench:{os.getpid()}"
+    q = TenantShardedQueue(client, prefix=f"{prefix}:q", active_key=f"{prefix}:active")
+    items = [_event(i) for i in range(n)]
+    t0 = time.perf_counter()
+    for it in items:
+        q.put(it)
+    t1 = time.perf_counter()
+    for _ in range(n):
+        q.pop(timeout=1)
+    t2 = time.perf_counter()
+    store = EventDedupeStore(client, ttl=60)
+    for i in range(n):
+        store.mark_if_new(prefix, f"bench-{i}")
+    t3 = time.perf_counter()
+    return {"put": t1 - t0, "pop": t2 - t1, "dedupe": t3 - t2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=64, help="tamanho do lote de commit no sqlite")
+    parser.add_argument("--backends", default="memory,sqlite,redis")
+    args = parser.parse_args()
+    print(f"{'backend':<8} {'put':>12} {'pop+ack':>12} {'dedupe':>12}   (n={args.n})")
+    for backend in args.backends.split(","):
+        backend = backend.strip()
+        if backend == "memory":
+            res = bench_memory(args.n)
+        elif backend == "sqlite":
+            res = bench_sqlite(args.n, args.batch)
+        elif backend == "redis":
+            res = bench_redis(args.n)
+        else:
+            print(f"{backend}: backend desconhecido")
+            continue
+        if res:
+            print(f"{backend:<8} {_rate(args.n, res['put'])} {_rate(args.n, res['pop'])} {_rate(args.n, res['dedupe'])}")
+
+
+if __name__ == "__main__":
+    main()
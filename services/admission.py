@@ -0,0 +1,128 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger("admission")
+
+OVERLOADED = "overloaded"
+SHED_LOW_PRIORITY = "shed_low_priority"
+
+# sem ADMISSION_HIGH_WATERMARK e com fila sem limite (Redis, SQLite)
+DEFAULT_HIGH_WATERMARK = 50000
+
+
+class AdmissionController:
+    """Admissão do webhook pela profundidade da fila, com histerese.
+
+    A profundidade é amostrada por uma thread em segundo plano a cada
+    `sample_interval`; o caminho quente só lê o último valor. Acima de
+    `shed_at` só entram eventos prioritários (`message_received`); ao passar
+    de `high` tudo é recusado até a fila voltar a `low`.
+    """
+
+    def __init__(self, depth_fn: Callable[[], int], high: int, low: int,
+                 shed_at: Optional[int] = None, priority_events: Iterable[str] = ("message_received",),
+                 sample_interval: float = 0.25, retry_after: int = 5) -> None:
+        self.depth_fn = depth_fn
+        self.high = high
+        self.low = low if 0 <= low < high else int(high * 0.8)
+        self.shed_at = self.low if shed_at is None else shed_at
+        self.priority_events = frozenset(priority_events)
+        self.sample_interval = sample_interval
+        self.retry_after = retry_after
+        self.depth = 0
+        self.overloaded = False
+        self.shed: dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings, depth_fn: Callable[[], int],
+                      capacity: int = 0) -> "AdmissionController":
+        """`capacity` é o maxsize da fila ativa (0 = sem limite).
+
+        Os watermarks precisam ficar abaixo dele: com a fila cheia o enqueue
+        já recusa sozinho e o descarte por prioridade nunca chegaria a agir.
+        """
+        high = settings.admission_high_watermark
+        if high is None:
+            high = int(capacity * 0.9) if capacity else DEFAULT_HIGH_WATERMARK
+        elif capacity and high > capacity:
+            logger.warning("ADMISSION_HIGH_WATERMARK=%s acima do tamanho da fila (%s): usando %s",
+                           high, capacity, int(capacity * 0.9))
+            high = int(capacity * 0.9)
+        low = settings.admission_low_watermark
+        shed_at = settings.admission_shed_watermark
+        if shed_at is not None and shed_at >= high:
+            shed_at = None
+        return cls(
+            depth_fn,
+            high=high,
+            # fora de [0, high) o construtor usa 80% de high
+            low=-1 if low is None else low,
+            shed_at=shed_at,
+            priority_events=settings.admission_priority_events,
+            sample_interval=settings.admission_sample_interval_ms / 1000,
+            retry_after=settings.admission_retry_after,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.high > 0
+
+    def start(self) -> None:
+        if self._thread is not None or not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None:
+                self.sample()
+                self._thread = threading.Thread(target=self._run, name="admission-sampler", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.sample_interval)
+            self.sample()
+
+    def sample(self) -> int:
+        try:
+            depth = int(self.depth_fn())
+        except Exception as e:
+            # backend fora: mantém a última leitura, o enqueue vai falhar de qualquer forma
+            logger.debug("Falha ao medir profundidade da fila: %s", e)
+            return self.depth
+        self.depth = depth
+        if depth >= self.high:
+            if not self.overloaded:
+                logger.warning("Fila em %s (>= %s): recusando eventos até baixar a %s", depth, self.high, self.low)
+            self.overloaded = True
+        elif depth <= self.low and self.overloaded:
+            logger.info("Fila em %s (<= %s): admissão normal", depth, self.low)
+            self.overloaded = False
+        return depth
+
+    def check(self, event_type: str) -> Optional[str]:
+        """Motivo da recusa (`overloaded`/`shed_low_priority`) ou None para aceitar."""
+        if not self.enabled:
+            return None
+        self.start()
+        if self.overloaded:
+            reason = OVERLOADED
+        elif event_type not in self.priority_events and self.depth >= self.shed_at:
+            reason = SHED_LOW_PRIORITY
+        else:
+            return None
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        return reason
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "overloaded": self.overloaded,
+            "high": self.high,
+            "low": self.low,
+            "shed_at": self.shed_at,
+            "shed": dict(self.shed),
+        }
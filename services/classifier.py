@@ -1,21 +1,30 @@
 from __future__ import annotations
-import re
-from typing import Dict
+from typing import Dict, Iterable, List
 
-_PATTERNS = [
-    (re.compile(r"\b(status|pedido|tracking)\b", re.I), "order_status"),
-    (re.compile(r"\b(oi|ol[aá])\b", re.I), "greeting"),
-    (re.compile(r"\b(cancel(ar)?|remover)\b", re.I), "cancel_order"),
+from services.intent_engine import IntentEngine
+
+# Em ordem de prioridade; frases comparadas por palavra inteira, sem caixa/acento
+INTENT_RULES = [
+    ("order_status", ["status", "pedido", "tracking"]),
+    ("greeting", ["oi", "olá"]),
+    ("cancel_order", ["cancel", "cancelar", "remover"]),
     # Identidade do bot
-    (re.compile(r"\b(seu nome|qual (é|eh) o seu nome|quem (é|eh) você|quem é voce|quem eh voce|quem é vc|quem eh vc)\b", re.I), "bot_identity"),
+    ("bot_identity", ["seu nome", "quem é você", "quem eh voce", "quem é vc", "quem eh vc"]),
 ]
 
 class Classifier:
+    def __init__(self, rules=INTENT_RULES) -> None:
+        self.engine = IntentEngine(rules, default="unknown")
+
+    def _result(self, intent: str) -> Dict:
+        if intent == "unknown":
+            return {"intent": intent, "confidence": 0.40}
+        return {"intent": intent, "confidence": 0.85}
+
     def classify(self, text: str) -> Dict:
-        lowered = text.strip().lower()
-        for rx, intent in _PATTERNS:
-            if rx.search(lowered):
-                return {"intent": intent, "confidence": 0.85}
-        return {"intent": "unknown", "confidence": 0.40}
+        return self._result(self.engine.classify(text))
+
+    def classify_batch(self, texts: Iterable[str]) -> List[Dict]:
+        return [self._result(i) for i in self.engine.classify_batch(texts)]
 
 classifier = Classifier()
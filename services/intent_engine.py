@@ -0,0 +1,87 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Iterable, Sequence
+
+_WORD = re.compile(r"\w+")
+# acentos comuns do português -> letra base ("olá" == "ola", "você" == "voce")
+_FOLD = str.maketrans("áàâãäéèêëíìîïóòôõöúùûüç", "aaaaaeeeeiiiiooooouuuuc")
+_END = ""  # chave de fim de frase no trie (nenhum token \w+ é vazio)
+
+
+def normalize(text: str) -> list[str]:
+    return _WORD.findall(text.lower().translate(_FOLD))
+
+
+@lru_cache(maxsize=65536)
+def _fold(token: str) -> str:
+    return token.translate(_FOLD)
+
+
+def _child(node: dict, token: str):
+    # str.translate é caro: só dobra acentos de tokens não-ASCII que não casaram
+    found = node.get(token)
+    if found is None and not token.isascii():
+        found = node.get(_fold(token))
+    return found
+
+
+class IntentEngine:
+    """Classificador por palavras-chave em uma única passada.
+
+    As regras são `(intent, frases)` em ordem de prioridade; cada frase é
+    comparada por palavras inteiras, sem caixa nem acento (equivalente a
+    `\\b...\\b` com re.I). Todas as frases vão para um trie de palavras, então o
+    custo por mensagem depende do número de palavras do texto e do tamanho da
+    maior frase, não de quantas intents existem. Vence a intent de maior
+    prioridade encontrada em qualquer posição do texto.
+    """
+
+    def __init__(self, rules: Sequence[tuple[str, Iterable[str]]], default: str = "unknown") -> None:
+        self.default = default
+        self.intents = [intent for intent, _ in rules]
+        self._trie: dict = {}
+        for priority, (_, phrases) in enumerate(rules):
+            for phrase in phrases:
+                node = self._trie
+                for token in normalize(phrase):
+                    node = node.setdefault(token, {})
+                # mesma frase em duas intents: fica a de maior prioridade
+                node[_END] = min(node.get(_END, priority), priority)
+
+    def match(self, text: str) -> int:
+        """Índice de prioridade da intent vencedora, ou -1 se nenhuma casou."""
+        if not text:
+            return -1
+        tokens = _WORD.findall(text.lower())
+        trie = self._trie
+        best = len(self.intents)
+        for start in range(len(tokens)):
+            node = _child(trie, tokens[start])
+            pos = start + 1
+            while node is not None:
+                priority = node.get(_END)
+                if priority is not None and priority < best:
+                    if priority == 0:
+                        return 0
+                    best = priority
+                if pos >= len(tokens):
+                    break
+                node = _child(node, tokens[pos])
+                pos += 1
+        return best if best < len(self.intents) else -1
+
+    def classify(self, text: str) -> str:
+        idx = self.match(text)
+        return self.intents[idx] if idx >= 0 else self.default
+
+    def classify_batch(self, texts: Iterable[str]) -> list[str]:
+        # rajadas costumam repetir textos ("oi", "oi", ...): classifica cada um uma vez
+        seen: dict[str, str] = {}
+        out = []
+        for t in texts:
+            intent = seen.get(t)
+            if intent is None:
+                intent = seen[t] = self.classify(t)
+            out.append(intent)
+        return out
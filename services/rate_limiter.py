@@ -0,0 +1,100 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """Token bucket por reserva: cada chamada consome um token e devolve a espera.
+
+    O saldo pode ficar negativo; a espera é o tempo até ele voltar a zero. Não
+    usa primitivas de asyncio, então funciona em qualquer thread/event loop.
+    `block_until` aplica um Retry-After do gateway por cima da taxa normal.
+    Com `rate <= 0` não há limite de taxa, só o bloqueio do Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = self.clock()
+            if self.rate <= 0:
+                return max(0.0, self.blocked_until - now)
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def idle(self, now: float) -> bool:
+        with self._lock:
+            if self.rate <= 0:
+                return self.blocked_until <= now
+            self._refill(now)
+            return self.tokens >= self.burst and self.blocked_until <= now
+
+
+class KeyedTokenBuckets:
+    """Um `TokenBucket` por chave (destino, número remetente), com poda de ociosos."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune()
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+            return bucket
+
+    def _prune(self) -> None:
+        # bucket cheio e sem bloqueio equivale a um recém-criado: pode sair
+        now = self.clock()
+        for key in [k for k, b in self._buckets.items() if b.idle(now)]:
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Retry-After em segundos ou data HTTP -> segundos a esperar."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return default
@@ -1,29 +1,188 @@
 from __future__ import annotations
+import asyncio
 import httpx
 import logging
+import weakref
 from typing import Optional
 from config import get_settings
+from metrics import stage_timer
+from services.rate_limiter import KeyedTokenBuckets, parse_retry_after
 
 logger = logging.getLogger("whatsapp_client")
 
+
+class _LoopState:
+    """Cliente HTTP, semáforos e fila de anotações de um event loop.
+
+    httpx e asyncio.Semaphore ficam presos ao loop em que são usados; o daemon
+    pode rodar workers em loops diferentes, então cada loop ganha o seu estado.
+    """
+
+    def __init__(self, owner: "WhatsappClient") -> None:
+        self.client = owner._build_http_client()
+        self.send_slots = asyncio.Semaphore(owner.max_concurrency)
+        self.dest_slots: dict[str, asyncio.Semaphore] = {}
+        self.dest_users: dict[str, int] = {}
+        self.annotations: asyncio.Queue = asyncio.Queue(maxsize=owner.annotate_queue_size)
+        self.annotator: Optional[asyncio.Task] = None
+        self.pending: dict[str, "_Coalesced"] = {}
+        self.flushes: set[asyncio.Task] = set()
+
+
+class _Coalesced:
+    """Respostas ainda não enviadas para um destino, aguardando a janela fechar."""
+
+    def __init__(self, sender: Optional[str]) -> None:
+        self.sender = sender
+        self.bodies: list[str] = []
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
 class WhatsappClient:
-    def __init__(self) -> None:
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None) -> None:
         self.settings = get_settings()
-        self.base = self.settings.whatsapp_base_url.rstrip("/") if self.settings.whatsapp_base_url else ""
-        self.api_key = self.settings.whatsapp_api_key
-        self._client = httpx.AsyncClient(timeout=15)
+        base = self.settings.whatsapp_base_url if base_url is None else base_url
+        self.base = base.rstrip("/") if base else ""
+        self.api_key = self.settings.whatsapp_api_key if api_key is None else api_key
+        self.max_concurrency = max(1, self.settings.whatsapp_max_concurrency)
+        self.per_dest_concurrency = max(1, self.settings.whatsapp_per_dest_concurrency)
+        self.annotate_batch = max(1, self.settings.whatsapp_annotate_batch)
+        self.annotate_queue_size = 10_000
+        self.coalesce_window = self.settings.whatsapp_coalesce_window_ms / 1000
+        self.retry_after_max = self.settings.whatsapp_retry_after_max
+        self.max_throttle_retries = 2
+        # buckets não dependem do loop: compartilhados entre threads do daemon
+        self.dest_buckets = KeyedTokenBuckets(self.settings.whatsapp_dest_rate, self.settings.whatsapp_dest_burst)
+        self.sender_buckets = KeyedTokenBuckets(self.settings.whatsapp_sender_rate, self.settings.whatsapp_sender_burst)
+        self.throttled = 0
+        self.coalesced = 0
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        s = self.settings
+        limits = httpx.Limits(
+            max_connections=s.whatsapp_max_connections,
+            max_keepalive_connections=s.whatsapp_max_keepalive,
+            keepalive_expiry=s.whatsapp_keepalive_expiry,
+        )
+        http2 = s.whatsapp_http2
+        if http2:
+            try:
+                import h2  # type: ignore  # noqa: F401
+            except ImportError:
+                logger.warning("WHATSAPP_HTTP2=1 mas pacote h2 ausente; usando HTTP/1.1")
+                http2 = False
+        return httpx.AsyncClient(timeout=s.whatsapp_timeout, limits=limits, http2=http2)
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(self)
+        return state
+
+    def _headers(self) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if self.api_key:
+            headers["X-API-Key"] = self.api_key
+        return headers
+
+    async def post(self, path: str, payload: dict, dest: Optional[str] = None,
+                   sender: Optional[str] = None) -> httpx.Response:
+        """POST no gateway pelo pool compartilhado.
+
+        Com `dest`, respeita o token bucket do destino e do número remetente e,
+        em 429, bloqueia ambos pelo Retry-After antes de tentar de novo.
+        """
+        if dest is None:
+            return await self._post_once(path, payload, None)
+        dest_bucket = self.dest_buckets.get(dest)
+        sender_bucket = self.sender_buckets.get(sender or self.settings.static_tenant_id)
+        for attempt in range(self.max_throttle_retries + 1):
+            await dest_bucket.acquire()
+            await sender_bucket.acquire()
+            r = await self._post_once(path, payload, dest)
+            if r.status_code != 429:
+                return r
+            self.throttled += 1
+            delay = parse_retry_after(r.headers.get("Retry-After"))
+            logger.warning("Gateway 429 dest=%s retry_after=%.1fs attempt=%s", dest, delay, attempt)
+            if delay > self.retry_after_max:
+                # desiste deste envio; bloqueia só pelo teto, não pelo valor do servidor
+                dest_bucket.block_for(self.retry_after_max)
+                sender_bucket.block_for(self.retry_after_max)
+                break
+            dest_bucket.block_for(delay)
+            sender_bucket.block_for(delay)
+        return r
+
+    async def _post_once(self, path: str, payload: dict, dest: Optional[str]) -> httpx.Response:
+        state = self._state()
+        if dest is None:
+            async with state.send_slots:
+                return await state.client.post(f"{self.base}{path}", json=payload, headers=self._headers())
+        slot = state.dest_slots.get(dest)
+        if slot is None:
+            slot = state.dest_slots[dest] = asyncio.Semaphore(self.per_dest_concurrency)
+        state.dest_users[dest] = state.dest_users.get(dest, 0) + 1
+        try:
+            async with slot, state.send_slots:
+                with stage_timer('gateway_http'):
+                    return await state.client.post(f"{self.base}{path}", json=payload, headers=self._headers())
+        finally:
+            state.dest_users[dest] -= 1
+            if not state.dest_users[dest]:
+                # ninguém mais esperando por este destino: libera o semáforo
+                del state.dest_users[dest]
+                state.dest_slots.pop(dest, None)
+
+    async def send_message(self, to: str, body: str, sender: Optional[str] = None,
+                           coalesce: bool = True) -> bool:
+        """Envia `body` para `to`.
 
-    async def send_message(self, to: str, body: str) -> bool:
+        Com WHATSAPP_COALESCE_WINDOW_MS > 0 e `coalesce`, respostas ao mesmo
+        destino dentro da janela viram uma só mensagem. Quem envia uma resposta
+        por vez (worker com WORKER_CONCURRENCY=1) passa `coalesce=False`: nada
+        chegaria a ser agrupado e cada envio só esperaria a janela.
+        """
         if not self.base:
             logger.warning("WHATSAPP_BASE_URL não configurado; simulando envio.")
             return True
+        if self.coalesce_window <= 0 or not coalesce:
+            return await self._deliver(to, body, sender)
+        state = self._state()
+        pending = state.pending.get(to)
+        if pending is None:
+            pending = state.pending[to] = _Coalesced(sender)
+            asyncio.get_running_loop().call_later(self.coalesce_window, self._spawn_flush, state, to)
+        else:
+            self.coalesced += 1
+        if not pending.bodies or pending.bodies[-1] != body:
+            pending.bodies.append(body)
+        return await asyncio.shield(pending.result)
+
+    def _spawn_flush(self, state: _LoopState, to: str) -> None:
+        task = asyncio.ensure_future(self._flush_coalesced(state, to))
+        state.flushes.add(task)
+        task.add_done_callback(state.flushes.discard)
+
+    async def _flush_coalesced(self, state: _LoopState, to: str) -> None:
+        pending = state.pending.pop(to, None)
+        if pending is None:
+            return
+        try:
+            ok = await self._deliver(to, "\n\n".join(pending.bodies), pending.sender)
+        except Exception as e:  # pragma: no cover
+            logger.error("Erro envio mensagem agrupada: %s", e)
+            ok = False
+        if not pending.result.done():
+            pending.result.set_result(ok)
+
+    async def _deliver(self, to: str, body: str, sender: Optional[str]) -> bool:
         # Gateway espera: number (ou to), message, type='text'
         payload = {"to": to, "number": to, "message": body, "type": "text"}
-        headers: dict[str, str] = {}
-        if self.api_key:
-            headers["X-API-Key"] = self.api_key
         try:
-            r = await self._client.post(f"{self.base}/v1/messages", json=payload, headers=headers)
+            r = await self.post("/v1/messages", payload, dest=to, sender=sender)
             if r.status_code // 100 == 2:
                 return True
             logger.warning("Falha envio mensagem status=%s body=%s", r.status_code, r.text[:200])
@@ -32,14 +191,50 @@ class WhatsappClient:
         return False
 
     async def annotate(self, message_id: str, data: dict) -> None:
-        if not self.base:
+        """Agenda a anotação sem esperar a resposta do gateway (fire-and-forget)."""
+        self.annotate_nowait(message_id, data)
+
+    def annotate_nowait(self, message_id: str, data: dict) -> None:
+        if not self.base or not message_id:
             return
-        headers = {}
-        if self.api_key:
-            headers["X-API-Key"] = self.api_key
+        state = self._state()
         try:
-            await self._client.post(f"{self.base}/v1/messages/{message_id}/annotations", json=data, headers=headers)
+            state.annotations.put_nowait((message_id, data))
+        except asyncio.QueueFull:
+            logger.debug("Fila de anotações cheia; descartando id=%s", message_id)
+            return
+        if state.annotator is None or state.annotator.done():
+            state.annotator = asyncio.create_task(self._annotation_loop(state))
+
+    async def _annotation_loop(self, state: _LoopState) -> None:
+        # drena em lotes e envia o lote em paralelo pelo mesmo pool de conexões
+        while not state.annotations.empty():
+            batch = [state.annotations.get_nowait()]
+            while len(batch) < self.annotate_batch and not state.annotations.empty():
+                batch.append(state.annotations.get_nowait())
+            await asyncio.gather(*(self._send_annotation(state, mid, data) for mid, data in batch))
+
+    async def _send_annotation(self, state: _LoopState, message_id: str, data: dict) -> None:
+        try:
+            async with state.send_slots:
+                with stage_timer('annotate'):
+                    await state.client.post(
+                        f"{self.base}/v1/messages/{message_id}/annotations", json=data, headers=self._headers()
+                    )
         except Exception as e:
             logger.debug("Falha anotação: %s", e)
 
+    async def flush_annotations(self) -> None:
+        state = self._states.get(asyncio.get_running_loop())
+        if state and state.annotator and not state.annotator.done():
+            await state.annotator
+
+    async def aclose(self) -> None:
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        if state.annotator and not state.annotator.done():
+            await state.annotator
+        await state.client.aclose()
+
 client = WhatsappClient()
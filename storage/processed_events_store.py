@@ -1,10 +1,14 @@
 from __future__ import annotations
+import threading
+import time
 from typing import Optional
 try:
     import redis  # type: ignore
 except ImportError:  # pragma: no cover
     redis = None  # type: ignore
 
+from storage.sqlite_db import connect
+
 class EventDedupeStore:
     def __init__(self, client, ttl: int) -> None:
         self.client = client
@@ -16,8 +20,50 @@ class EventDedupeStore:
         res = self.client.set(key, "1", nx=True, ex=self.ttl)
         return bool(res)
 
+    def forget(self, tenant: str, event_id: str) -> None:
+        self.client.delete(f"{tenant}:evt:{event_id}")
+
+
+class SqliteEventDedupeStore:
+    """Equivalente ao `EventDedupeStore` em SQLite: chave com expiração (TTL).
+
+    Um UPSERT condicional insere a chave ou renova uma já expirada; `rowcount`
+    diz se o evento é novo. Linhas expiradas são apagadas a cada `purge_interval`.
+    """
+
+    def __init__(self, path: str, ttl: int, purge_interval: float = 60) -> None:
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.conn = connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_events (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def mark_if_new(self, tenant: str, event_id: str) -> bool:
+        key = f"{tenant}:evt:{event_id}"
+        now = time.time()
+        with self._lock:
+            if now >= self._next_purge:
+                self.conn.execute("DELETE FROM processed_events WHERE expires_at <= ?", (now,))
+                self._next_purge = now + self.purge_interval
+            cur = self.conn.execute(
+                "INSERT INTO processed_events (key, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE processed_events.expires_at <= ?",
+                (key, now + self.ttl, now),
+            )
+            return cur.rowcount == 1
+
+    def forget(self, tenant: str, event_id: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM processed_events WHERE key = ?", (f"{tenant}:evt:{event_id}",))
+
 
-def build_store(settings) -> Optional[EventDedupeStore]:
+def build_store(settings) -> Optional[EventDedupeStore | SqliteEventDedupeStore]:
+    if settings.queue_backend == "sqlite":
+        return SqliteEventDedupeStore(settings.sqlite_path, settings.event_dedupe_ttl)
     if settings.queue_backend != "redis":
         return None
     if redis is None:
@@ -0,0 +1,21 @@
+from __future__ import annotations
+import os
+import sqlite3
+
+
+def connect(path: str, busy_timeout_ms: int = 5000) -> sqlite3.Connection:
+    """Abre conexão SQLite em modo WAL, compartilhável entre threads.
+
+    `isolation_level=None` deixa a conexão em autocommit; quem precisa agrupar
+    escritas abre `BEGIN IMMEDIATE` explicitamente. `synchronous=NORMAL` em WAL
+    só faz fsync no checkpoint: sobrevive a crash do processo, e uma queda de
+    energia pode perder apenas as últimas transações.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout_ms / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    return conn
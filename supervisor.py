@@ -0,0 +1,217 @@
+"""Supervisor de processos do az_daemon (modo `AGENT_DAEMON_MODE=supervisor`).
+
+Cada componente roda em um processo próprio (subprocess + exec, sem herdar
+conexões Redis/SQLite do pai):
+  - webhook: uvicorn com `--workers N`, checado via GET /health
+  - worker-i: `python -m workers.message_worker`, checado por arquivo de heartbeat
+  - ui (opcional): run_ui.py, checado só por estar vivo
+
+Processo que morre ou falha no health check é reiniciado com backoff
+exponencial (zerado depois de rodar estável por `stable_after` segundos).
+SIGTERM/SIGINT no supervisor repassa SIGTERM para todos e espera `grace`
+segundos antes de SIGKILL.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Callable, Optional, Sequence
+
+logger = logging.getLogger("supervisor")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HealthCheck = Callable[["ManagedProcess"], bool]
+
+
+def http_health(url: str, timeout: float = 1.0) -> HealthCheck:
+    def check(_proc: "ManagedProcess") -> bool:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as r:
+                return r.status // 100 == 2
+        except Exception:
+            return False
+    return check
+
+
+def heartbeat_health(path: str, max_age: float) -> HealthCheck:
+    def check(_proc: "ManagedProcess") -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) <= max_age
+        except OSError:
+            return False
+    return check
+
+
+class ManagedProcess:
+    """Um processo filho com política de restart e health check."""
+
+    def __init__(self, name: str, argv: Sequence[str], env: Optional[dict] = None,
+                 health: Optional[HealthCheck] = None, startup_grace: float = 15.0,
+                 max_health_failures: int = 3, backoff_base: float = 1.0,
+                 backoff_max: float = 60.0, stable_after: float = 60.0) -> None:
+        self.name = name
+        self.argv = list(argv)
+        self.env = env
+        self.health = health
+        self.startup_grace = startup_grace
+        self.max_health_failures = max_health_failures
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.next_start = 0.0
+        self.failures = 0  # falhas seguidas -> expoente do backoff
+        self.health_failures = 0
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> None:
+        env = dict(os.environ)
+        if self.env:
+            env.update(self.env)
+        self.proc = subprocess.Popen(self.argv, cwd=ROOT, env=env)
+        self.started_at = time.monotonic()
+        self.health_failures = 0
+        logger.info("Processo %s iniciado pid=%s", self.name, self.proc.pid)
+
+    def _schedule_restart(self, reason: str) -> None:
+        now = time.monotonic()
+        if self.started_at and now - self.started_at >= self.stable_after:
+            self.failures = 0
+        delay = min(self.backoff_max, self.backoff_base * (2 ** self.failures))
+        self.failures += 1
+        self.restarts += 1
+        self.next_start = now + delay
+        self.proc = None
+        logger.warning("Processo %s %s; reiniciando em %.1fs (restart #%s)", self.name, reason, delay, self.restarts)
+
+    def tick(self) -> None:
+        """Um passo de supervisão: inicia, detecta saída ou health check falho."""
+        now = time.monotonic()
+        if self.proc is None:
+            if now >= self.next_start:
+                self.start()
+            return
+        code = self.proc.poll()
+        if code is not None:
+            self._schedule_restart(f"saiu com código {code}")
+            return
+        if self.health is None or now - self.started_at < self.startup_grace:
+            return
+        if self.health(self):
+            self.health_failures = 0
+            return
+        self.health_failures += 1
+        if self.health_failures >= self.max_health_failures:
+            logger.error("Processo %s falhou %s health checks; matando pid=%s",
+                         self.name, self.health_failures, self.proc.pid)
+            self.proc.kill()
+            self.proc.wait()
+            self._schedule_restart("sem saúde")
+
+    def terminate(self) -> None:
+        if self.running:
+            self.proc.terminate()  # type: ignore[union-attr]
+
+    def wait(self, deadline: float) -> None:
+        if self.proc is None:
+            return
+        try:
+            self.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning("Processo %s não encerrou no prazo; SIGKILL pid=%s", self.name, self.proc.pid)
+            self.proc.kill()
+            self.proc.wait()
+
+
+class Supervisor:
+    def __init__(self, processes: Sequence[ManagedProcess], check_interval: float = 2.0,
+                 grace: float = 20.0) -> None:
+        self.processes = list(processes)
+        self.check_interval = check_interval
+        self.grace = grace
+        self._stopping = False
+
+    def stop(self, *_args) -> None:
+        self._stopping = True
+
+    def tick(self) -> None:
+        for p in self.processes:
+            try:
+                p.tick()
+            except Exception as e:  # pragma: no cover
+                logger.exception("Erro supervisionando %s: %s", p.name, e)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info("Supervisor iniciado: %s", ", ".join(p.name for p in self.processes))
+        try:
+            while not self._stopping:
+                self.tick()
+                time.sleep(self.check_interval)
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        # todos recebem SIGTERM juntos e compartilham o mesmo prazo
+        logger.info("Encerrando %s processos (grace=%ss)", len(self.processes), self.grace)
+        for p in self.processes:
+            p.terminate()
+        deadline = time.monotonic() + self.grace
+        for p in self.processes:
+            p.wait(deadline)
+
+
+def build_supervisor() -> Supervisor:
+    """Monta os processos a partir das mesmas variáveis AGENT_DAEMON_* do modo threads."""
+    python = sys.executable
+    processes: list[ManagedProcess] = []
+    # tmp/ é ignorado pelo git: arquivos de heartbeat são estado de execução
+    heartbeat_dir = os.getenv("AGENT_DAEMON_HEARTBEAT_DIR") or os.path.join(ROOT, "tmp", "heartbeat")
+    os.makedirs(heartbeat_dir, exist_ok=True)
+    heartbeat_timeout = float(os.getenv("AGENT_DAEMON_HEARTBEAT_TIMEOUT", "30"))
+
+    if not os.getenv("AGENT_DAEMON_DISABLE_WEBHOOK"):
+        port = int(os.getenv("AGENT_DAEMON_WEBHOOK_PORT") or os.getenv("AGENT_ZERO_PORT", "4000"))
+        workers = max(1, int(os.getenv("AGENT_DAEMON_WEBHOOK_WORKERS", "2")))
+        processes.append(ManagedProcess(
+            "webhook",
+            [python, "-m", "uvicorn", "webhook_server:app", "--host", "0.0.0.0",
+             "--port", str(port), "--workers", str(workers)],
+            env={"AGENT_LOG_FILE": "webhook.log"},
+            health=http_health(f"http://127.0.0.1:{port}/health"),
+        ))
+
+    if not os.getenv("AGENT_DAEMON_DISABLE_WORKER"):
+        for i in range(max(1, int(os.getenv("AGENT_DAEMON_WORKER_PROCESSES", "2")))):
+            heartbeat = os.path.join(heartbeat_dir, f"worker-{i}")
+            processes.append(ManagedProcess(
+                f"worker-{i}",
+                [python, "-m", "workers.message_worker"],
+                # arquivo de log por processo: RotatingFileHandler não é seguro entre processos
+                env={"AGENT_WORKER_HEARTBEAT_FILE": heartbeat, "AGENT_LOG_FILE": f"worker-{i}.log"},
+                health=heartbeat_health(heartbeat, heartbeat_timeout),
+            ))
+
+    if not os.getenv("AGENT_DAEMON_DISABLE_UI"):
+        processes.append(ManagedProcess(
+            "ui",
+            [python, "run_ui.py"],
+            env={"WEB_UI_PORT": os.getenv("WEB_UI_PORT") or "8080", "AGENT_LOG_FILE": "ui.log"},
+        ))
+
+    return Supervisor(
+        processes,
+        check_interval=float(os.getenv("AGENT_DAEMON_CHECK_INTERVAL", "2")),
+        grace=float(os.getenv("AGENT_DAEMON_SHUTDOWN_GRACE", "20")),
+    )
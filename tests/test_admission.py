@@ -0,0 +1,75 @@
+from services.admission import AdmissionController, OVERLOADED, SHED_LOW_PRIORITY
+
+
+def make(depth):
+    return AdmissionController(lambda: depth[0], high=100, low=50, sample_interval=3600)
+
+
+def test_sheds_low_priority_between_watermarks():
+    depth = [10]
+    ac = make(depth)
+    assert ac.check("message_ack") is None
+    depth[0] = 60
+    ac.sample()
+    assert ac.check("message_received") is None
+    assert ac.check("message_ack") == SHED_LOW_PRIORITY
+    assert ac.shed == {SHED_LOW_PRIORITY: 1}
+
+
+def test_overload_has_hysteresis():
+    depth = [120]
+    ac = make(depth)
+    assert ac.check("message_received") == OVERLOADED
+    depth[0] = 70  # abaixo de high mas acima de low: continua recusando
+    ac.sample()
+    assert ac.check("message_received") == OVERLOADED
+    depth[0] = 50
+    ac.sample()
+    assert ac.check("message_received") is None
+    assert ac.shed[OVERLOADED] == 2
+
+
+def test_keeps_last_depth_when_backend_fails():
+    def boom():
+        raise ConnectionError("redis down")
+    ac = AdmissionController(boom, high=100, low=50, sample_interval=3600)
+    ac.depth = 120
+    assert ac.sample() == 120
+    assert ac.enabled and not AdmissionController(boom, high=0, low=0).enabled
+
+
+def test_watermarks_follow_queue_capacity():
+    from types import SimpleNamespace
+    settings = SimpleNamespace(
+        admission_high_watermark=None, admission_low_watermark=None, admission_shed_watermark=None,
+        admission_priority_events=["message_received"], admission_sample_interval_ms=250,
+        admission_retry_after=5,
+    )
+    ac = AdmissionController.from_settings(settings, lambda: 0, capacity=10000)
+    assert (ac.high, ac.low, ac.shed_at) == (9000, 7200, 7200)
+    assert AdmissionController.from_settings(settings, lambda: 0).high == 50000
+    # valor explícito acima da capacidade: limitado para o descarte agir antes da fila encher
+    settings.admission_high_watermark, settings.admission_low_watermark = 50000, 40000
+    ac = AdmissionController.from_settings(settings, lambda: 0, capacity=10000)
+    assert ac.high == 9000 and ac.low == 7200
+    settings.admission_high_watermark = 0
+    assert not AdmissionController.from_settings(settings, lambda: 0, capacity=10000).enabled
+
+
+def test_webhook_returns_retry_after_when_overloaded(monkeypatch):
+    import hashlib, hmac, json, time
+    from fastapi.testclient import TestClient
+    import webhook_server as ws
+
+    ac = AdmissionController(lambda: 500, high=100, low=50, sample_interval=3600)
+    monkeypatch.setattr(ws, "_admission", ac)
+    monkeypatch.setattr(ws, "_configured_api_key", "")
+    monkeypatch.setattr(ws, "_load_api_key", lambda: "")
+    body = json.dumps({"event": "message_received", "id": "adm-1", "timestamp": int(time.time()),
+                       "message": {"id": "m1", "from": "5511@c.us", "body": "oi"}}).encode()
+    sig = hmac.new(ws.WHATSAPP_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    r = TestClient(ws.app).post(f"{ws.BASE_PREFIX}/webhooks/whatsapp", content=body, headers={"X-Signature": sig})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "5"
+    # recusado antes do dedupe: o reenvio do gateway não vira duplicado
+    from az_queue import processed_events
+    assert "adm-1" not in processed_events
@@ -0,0 +1,202 @@
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("nest_asyncio")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+from agent import AgentContext, UserMessage  # noqa: E402
+from initialize import initialize_agent  # noqa: E402
+from python.helpers import context_eviction, persist_chat  # noqa: E402
+
+
+@pytest.fixture
+def chats(tmp_path, monkeypatch):
+    # caminho absoluto: files.get_abs_path ignora a base do agent-core
+    monkeypatch.setattr(persist_chat, "CHATS_FOLDER", str(tmp_path / "chats"))
+    monkeypatch.setenv("A0_CONTEXT_MAX_LOADED", "0")
+    monkeypatch.setenv("A0_CONTEXT_IDLE_SECONDS", "60")
+    monkeypatch.setenv("A0_CONTEXT_MIN_IDLE_SECONDS", "10")
+    created = []
+    yield created
+    for ctx in created:
+        AgentContext.remove(ctx.id)
+
+
+def new_context(chats, id: str | None = None) -> AgentContext:
+    ctx = AgentContext(config=initialize_agent(), id=id)
+    chats.append(ctx)
+    return ctx
+
+
+class FakeTask:
+    def __init__(self):
+        self.started = []
+
+    def is_alive(self):
+        return bool(self.started)
+
+    def kill(self, terminate_thread=False):
+        self.started.clear()
+
+
+def test_evicts_idle_context_and_reloads_on_access(chats):
+    ctx = new_context(chats)
+    ctx.agent0.hist_add_user_message(UserMessage(message="olá", attachments=[]))
+    now = ctx.last_access + 61
+    assert context_eviction.evict_idle_contexts(now) == [ctx.id]
+    assert not ctx.is_loaded
+    # o próximo acesso carrega de volta do disco
+    assert "olá" in ctx.agent0.history.output_text()
+    assert ctx.is_loaded
+
+
+def test_busy_or_recently_used_context_is_kept(chats):
+    busy, used = new_context(chats), new_context(chats)
+    busy.task = FakeTask()
+    busy.task.started.append(True)
+    busy.last_access = time.monotonic() - 100
+    used.touch()
+    assert context_eviction.evict_idle_contexts() == []
+    assert busy.is_loaded and used.is_loaded
+    assert persist_chat.unload_chat(busy) is False
+
+
+def test_eviction_is_off_unless_a_budget_is_set(chats, monkeypatch):
+    ctx = new_context(chats)
+    for name in ("A0_CONTEXT_MAX_LOADED", "A0_CONTEXT_IDLE_SECONDS", "A0_CONTEXT_MAX_RSS_MB"):
+        monkeypatch.delenv(name, raising=False)
+    assert context_eviction.evict_idle_contexts(ctx.last_access + 86400) == []
+    assert ctx.is_loaded
+
+
+def test_context_with_live_session_is_kept(chats):
+    shell, browser, idle = new_context(chats), new_context(chats), new_context(chats)
+    shell.agent0.set_data("_cet_state", SimpleNamespace(shells={0: object()}, docker=None))
+    browser.agent0.set_data("_browser_agent_state", SimpleNamespace(browser_session=object()))
+    now = max(c.last_access for c in (shell, browser, idle)) + 61
+    assert context_eviction.evict_idle_contexts(now) == [idle.id]
+    assert shell.is_loaded and browser.is_loaded
+    # sessões fechadas não seguram o chat
+    shell.agent0.set_data("_cet_state", SimpleNamespace(shells={}, docker=None))
+    assert context_eviction.evict_idle_contexts(now) == [shell.id]
+
+
+def test_request_between_idle_check_and_unload_keeps_context(chats, monkeypatch):
+    ctx = new_context(chats)
+    ctx.last_access = time.monotonic() - 100
+    unload_chat = persist_chat.unload_chat
+
+    def racing_unload(context, idle_before=None):
+        # a mensagem chega depois da checagem de ociosidade, antes do unload
+        context.touch()
+        return unload_chat(context, idle_before)
+
+    monkeypatch.setattr(persist_chat, "unload_chat", racing_unload)
+    assert context_eviction.evict_idle_contexts() == []
+    assert ctx.is_loaded
+
+
+def test_communicate_waits_for_unload_in_progress(chats, monkeypatch):
+    ctx = new_context(chats)
+    released = ctx.agent0
+    saving, resume = threading.Event(), threading.Event()
+    save = persist_chat._save_for_unload
+
+    def slow_save(context):
+        summary = save(context)
+        saving.set()
+        resume.wait(5)
+        return summary
+
+    monkeypatch.setattr(persist_chat, "_save_for_unload", slow_save)
+    started = []
+    monkeypatch.setattr(ctx, "run_task", lambda func, agent, msg: started.append(agent) or FakeTask())
+
+    unloader = threading.Thread(target=persist_chat.unload_chat, args=(ctx,))
+    unloader.start()
+    assert saving.wait(5)
+    sender = threading.Thread(target=ctx.communicate, args=(UserMessage(message="oi", attachments=[]),))
+    sender.start()
+    time.sleep(0.05)
+    assert started == []  # communicate espera o unload em andamento
+    resume.set()
+    unloader.join(5)
+    sender.join(5)
+    # a mensagem roda num agente recarregado, não no que teve os recursos liberados
+    assert len(started) == 1 and started[0] is not released
+    assert ctx.is_loaded
+
+
+def test_get_or_create_builds_each_id_once(chats):
+    calls = []
+    gate = threading.Event()
+
+    def factory():
+        calls.append(1)
+        gate.wait(5)  # segura a criação enquanto os outros pedidos chegam
+        return new_context(chats, "ctx-concorrente")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(AgentContext.get_or_create("ctx-concorrente", factory)))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    # outro id não espera pela criação em andamento
+    other = AgentContext.get_or_create("ctx-outro", lambda: new_context(chats, "ctx-outro"))
+    assert other is not None and calls == [1]
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [1] and len(results) == 4 and len({id(r) for r in results}) == 1
+    assert AgentContext._creation_guards == {}
+
+
+def test_saved_chats_register_as_stubs_and_load_once(chats, monkeypatch):
+    ctx = new_context(chats)
+    ctx.name = "pedidos"
+    ctx.agent0.hist_add_user_message(UserMessage(message="status do pedido", attachments=[]))
+    ctx.log.log(type="user", heading="status do pedido")
+    persist_chat.save_tmp_chat(ctx)
+    expected = ctx.serialize()
+    AgentContext.remove(ctx.id)
+    # chat salvo antes do índice: meta.json é gerado na primeira carga
+    os.remove(persist_chat._get_meta_file_path(ctx.id))
+
+    loads = []
+    load_stub = persist_chat._load_stub
+
+    def counting_load(context):
+        loads.append(context.id)
+        time.sleep(0.05)  # outros acessos chegam durante a carga
+        load_stub(context)
+
+    monkeypatch.setattr(persist_chat, "_load_stub", counting_load)
+    assert ctx.id in persist_chat.load_tmp_chats()
+    stub = AgentContext.get(ctx.id)
+    chats.append(stub)
+    assert stub is not ctx and not stub.is_loaded
+    # listagem (/poll) sem carregar o chat
+    assert {k: v for k, v in stub.serialize().items() if k != "no"} == {
+        k: v for k, v in expected.items() if k != "no"
+    }
+    persist_chat.save_tmp_chat(stub)  # stub intocado: só o índice é reescrito
+    assert loads == [] and not stub.is_loaded
+
+    agents = []
+    threads = [threading.Thread(target=lambda: agents.append(stub.agent0)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert loads == [ctx.id] and len({id(a) for a in agents}) == 1
+    assert "status do pedido" in stub.agent0.history.output_text()
+    assert stub.log.logs[-1].heading == "status do pedido"
@@ -0,0 +1,70 @@
+import pytest
+
+flask = pytest.importorskip("flask")
+httpx = pytest.importorskip("httpx")
+from starlette.applications import Starlette  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from apps.agent_zero_core.python.helpers.asgi_bridge import FlaskViewApp  # noqa: E402
+
+
+def make_app(tmp_path):
+    app = flask.Flask("t")
+    app.secret_key = "test"
+    target = tmp_path / "f.bin"
+    target.write_bytes(b"z" * 70000)
+
+    async def echo():
+        req = flask.request
+        flask.session["n"] = flask.session.get("n", 0) + 1
+        return {"json": req.get_json(silent=True), "args": dict(req.args), "n": flask.session["n"],
+                "addr": req.remote_addr}
+
+    async def upload():
+        f = flask.request.files["file"]
+        return {"name": f.filename, "size": len(f.read()), "form": dict(flask.request.form)}
+
+    async def download():
+        return flask.send_file(target, as_attachment=True, download_name="f.bin")
+
+    async def missing():
+        flask.abort(404)
+
+    async def strict_json():
+        return {"json": flask.request.json}
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    return Starlette(routes=[
+        Route("/missing", FlaskViewApp(app, missing), methods=["GET"]),
+        Route("/strict", FlaskViewApp(app, strict_json), methods=["POST"]),
+        Route("/broken", FlaskViewApp(app, broken), methods=["GET"]),
+        Route("/echo", FlaskViewApp(app, echo), methods=["POST"]),
+        Route("/upload", FlaskViewApp(app, upload), methods=["POST"]),
+        Route("/download", FlaskViewApp(app, download), methods=["GET"]),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_flask_views_served_natively(tmp_path):
+    transport = httpx.ASGITransport(app=make_app(tmp_path), client=("127.0.0.1", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://ui") as c:
+        r = await c.post("/echo?a=1", json={"x": 1})
+        assert r.json() == {"json": {"x": 1}, "args": {"a": "1"}, "n": 1, "addr": "127.0.0.1"}
+        # cookie de sessão volta no próximo request (csrf depende disso)
+        assert (await c.post("/echo", json={})).json()["n"] == 2
+        r = await c.post("/upload", files={"file": ("a.txt", b"hello")}, data={"k": "v"})
+        assert r.json() == {"name": "a.txt", "size": 5, "form": {"k": "v"}}
+        r = await c.get("/download")
+        assert r.status_code == 200 and len(r.content) == 70000
+
+
+@pytest.mark.asyncio
+async def test_http_errors_keep_their_status(tmp_path):
+    transport = httpx.ASGITransport(app=make_app(tmp_path), raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://ui") as c:
+        # mesmo status do Flask puro: abort() e request.json sem content-type json
+        assert (await c.get("/missing")).status_code == 404
+        assert (await c.post("/strict", content=b"x", headers={"content-type": "text/plain"})).status_code == 415
+        assert (await c.get("/broken")).status_code == 500
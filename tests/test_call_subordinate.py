@@ -0,0 +1,135 @@
+import asyncio
+import dataclasses
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("nest_asyncio")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+from agent import Agent  # noqa: E402
+from python.tools import call_subordinate  # noqa: E402
+
+
+@dataclasses.dataclass
+class Config:
+    profile: str = ""
+
+
+class FakeSubordinate:
+    """Subordinado cujo monologue responde conforme a mensagem recebida.
+
+    Marca e limpa context.streaming_agent como o monologue de verdade.
+    """
+
+    DATA_NAME_SUPERIOR = Agent.DATA_NAME_SUPERIOR
+    DATA_NAME_SUBORDINATE = Agent.DATA_NAME_SUBORDINATE
+    created: list["FakeSubordinate"] = []
+    running = 0
+    peak = 0
+
+    def __init__(self, number, config, context):
+        self.number = number
+        self.agent_name = f"A{number}"
+        self.config = config
+        self.context = context
+        self.data = {}
+        self.message = ""
+        self.streaming_seen = []
+        FakeSubordinate.created.append(self)
+
+    def get_data(self, key):
+        return self.data.get(key)
+
+    def set_data(self, key, value):
+        self.data[key] = value
+
+    streams_to_context = Agent.streams_to_context
+
+    def hist_add_user_message(self, message):
+        self.message = message.message
+
+    async def monologue(self):
+        cls = FakeSubordinate
+        cls.running += 1
+        cls.peak = max(cls.peak, cls.running)
+        streams = self.streams_to_context()
+        try:
+            if streams:
+                self.context.streaming_agent = self
+            await asyncio.sleep(0.01)
+            self.streaming_seen.append(self.context.streaming_agent)
+            await asyncio.sleep(5 if self.message == "lento" else 0.01)
+            if self.message == "falha":
+                raise ValueError("sem acesso ao CRM")
+            if self.message == "vazio":
+                raise RuntimeError()
+            return f"feito: {self.message}"
+        finally:
+            cls.running -= 1
+            if streams:
+                self.context.streaming_agent = None
+
+
+@pytest.fixture
+def delegation(monkeypatch):
+    monkeypatch.setattr(call_subordinate, "Agent", FakeSubordinate)
+    monkeypatch.setattr(FakeSubordinate, "created", [])
+    monkeypatch.setattr(FakeSubordinate, "peak", 0)
+    superior = FakeSubordinate(0, Config(profile="vendas"), SimpleNamespace(streaming_agent=None))
+    superior.context.streaming_agent = superior
+    FakeSubordinate.created.clear()
+    return call_subordinate.Delegation(
+        agent=superior, name="call_subordinate", method=None, args={}, message="", loop_data=None
+    )
+
+
+def test_fan_out_collects_results_errors_and_timeouts(delegation):
+    subtasks = ["a", {"message": "lento", "timeout": 0.05}, "falha", "vazio", {"message": "b", "profile": "suporte"}]
+    response = asyncio.run(delegation.execute(subtasks=subtasks, max_parallel=2))
+    assert not response.break_loop
+    # uma entrada por subtarefa, na ordem pedida, mesmo com falhas no meio
+    assert json.loads(response.message) == [
+        {"subtask": "a", "result": "feito: a"},
+        {"subtask": "lento", "error": "timed out"},
+        {"subtask": "falha", "error": "sem acesso ao CRM"},
+        {"subtask": "vazio", "error": "RuntimeError"},
+        {"subtask": "b", "result": "feito: b"},
+    ]
+    assert FakeSubordinate.peak == 2 and FakeSubordinate.running == 0
+    subs = FakeSubordinate.created
+    assert [s.agent_name for s in subs] == ["A1.1", "A1.2", "A1.3", "A1.4", "A1.5"]
+    assert [s.config.profile for s in subs] == ["", "", "", "", "suporte"]
+    assert all(s.data["_superior"] is delegation.agent for s in subs)
+    assert delegation.agent.config.profile == "vendas"  # config do superior intocada
+
+
+def test_fan_out_default_timeout_and_parallelism(delegation, monkeypatch):
+    monkeypatch.setenv("A0_SUBORDINATE_MAX_PARALLEL", "3")
+    subtasks = ["lento", {"message": "lento", "timeout": "x"}] + ["a"] * 4
+    response = asyncio.run(delegation.execute(subtasks=subtasks, timeout="0.05"))
+    results = json.loads(response.message)
+    assert [r.get("error") for r in results[:2]] == ["timed out", "timed out"]
+    assert all(r["result"] == "feito: a" for r in results[2:])
+    assert FakeSubordinate.peak == 3
+
+
+def test_fan_out_keeps_the_caller_as_streaming_agent(delegation):
+    superior = delegation.agent
+    subtasks = ["a", "b", {"message": "lento", "timeout": 0.1}]
+    asyncio.run(delegation.execute(subtasks=subtasks, max_parallel=3))
+    # irmãos em paralelo não tomam o streaming: intervenções continuam indo ao chamador
+    assert [s.streaming_seen for s in FakeSubordinate.created] == [[superior]] * 3
+    assert superior.context.streaming_agent is superior
+
+
+def test_regular_subordinate_still_streams(delegation):
+    superior = delegation.agent
+    asyncio.run(delegation.execute(message="a"))
+    sub = superior.get_data(Agent.DATA_NAME_SUBORDINATE)
+    assert sub.streaming_seen == [sub]
+    assert superior.context.streaming_agent is None  # o superior volta a se marcar no próximo loop
@@ -4,3 +4,31 @@ def test_classify():
     assert classify("oi") == "saudacao"
     assert classify("quero status do pedido") == "pedido_status"
     assert classify("") == "fallback"
+
+
+def test_classify_keeps_substring_matching():
+    # variações comuns de saudação continuam reconhecidas
+    for body in ["oii", "oie", "olaa", "Oiiii tudo bem", "OLA", "bom diaaa"]:
+        assert classify(body) == "saudacao", body
+    # comportamento legado: "oi" dentro de "noite" também conta
+    assert classify("boa noite") == "saudacao"
+    assert classify("obrigado") == "fallback"
+
+
+def test_classify_pedido_plural():
+    assert classify("meus pedidos") == "pedido_status"
+    assert classify("Pedidos atrasados") == "pedido_status"
+    # pedido tem prioridade sobre saudação
+    assert classify("oi, e meu pedido?") == "pedido_status"
+
+
+def test_service_classifier_priority_and_accents():
+    from services.classifier import classifier
+    assert classifier.classify("Olá, qual o status?")["intent"] == "order_status"
+    assert classifier.classify("OLA")["intent"] == "greeting"
+    assert classifier.classify("quem é você")["intent"] == "bot_identity"
+    assert classifier.classify("quem eh voce")["intent"] == "bot_identity"
+    assert classifier.classify("cancelamento")["intent"] == "unknown"
+    assert [r["intent"] for r in classifier.classify_batch(["oi", "remover", "oi", ""])] == [
+        "greeting", "cancel_order", "greeting", "unknown"
+    ]
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("nest_asyncio")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+from python.helpers import history  # noqa: E402
+
+
+class FakeAgent:
+    """Só o que History usa do agente: prompts e o modelo utilitário."""
+
+    def __init__(self, fail_on: str = "", delay: float = 0.0):
+        self.fail_on = fail_on
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    def read_prompt(self, name, **kwargs):
+        return f"{name} {kwargs.get('content', '')}"
+
+    def parse_prompt(self, name, **kwargs):
+        return f"resumo: {kwargs.get('summary', '')}"
+
+    async def call_utility_model(self, system, message, callback=None, background=False):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_on and self.fail_on in message:
+                raise RuntimeError("utility model down")
+            return f"resumo {self.calls}"
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    # tiktoken não baixa a codificação aqui: um token por caractere
+    monkeypatch.setattr(history.tokens, "approximate_tokens", lambda text: len(text))
+    monkeypatch.setattr(history.settings, "get_settings",
+                        lambda: {"chat_model_ctx_length": 100_000, "chat_model_ctx_history": 1.0})
+
+
+def ctx_limit(monkeypatch, tokens: int):
+    monkeypatch.setattr(history.settings, "get_settings",
+                        lambda: {"chat_model_ctx_length": tokens, "chat_model_ctx_history": 1.0})
+
+
+def recount(record) -> int:
+    """Total recalculado do zero, sem nenhum cache."""
+    if isinstance(record, history.Message):
+        return len(record.output_text())
+    if isinstance(record, history.History):
+        return sum(recount(r) for r in record.bulks + record.topics + [record.current])
+    if record.summary:
+        return len(record.summary)
+    children = record.messages if isinstance(record, history.Topic) else record.records
+    return sum(recount(r) for r in children)
+
+
+def assert_totals(h: history.History):
+    assert h.get_bulks_tokens() == sum(recount(b) for b in h.bulks)
+    assert h.get_topics_tokens() == sum(recount(t) for t in h.topics)
+    assert h.get_current_topic_tokens() == recount(h.current)
+    assert h.get_tokens() == recount(h)
+
+
+def build(agent, topics: int, per_topic: int = 2, size: int = 200) -> history.History:
+    h = history.History(agent=agent)
+    for t in range(topics):
+        for m in range(per_topic):
+            h.add_message(m % 2 == 1, f"tópico {t} mensagem {m} " + "x" * size)
+        h.new_topic()
+    h.add_message(False, "pergunta atual")
+    return h
+
+
+def test_cached_totals_follow_add_and_summaries():
+    h = build(FakeAgent(), topics=3)
+    assert_totals(h)
+    # resumo de uma mensagem dentro de um tópico antigo sobe até o total do histórico
+    h.topics[0].messages[0].set_summary("curto")
+    assert_totals(h)
+    asyncio.run(h.topics[1].summarize())
+    assert h.topics[1].summary and h.get_topics_tokens() == sum(recount(t) for t in h.topics)
+    assert_totals(h)
+    h.add_message(True, "resposta " * 30)
+    assert_totals(h)
+
+
+def test_cached_totals_after_compress_and_reload(monkeypatch):
+    agent = FakeAgent()
+    h = build(agent, topics=12)
+    before = h.get_tokens()
+    ctx_limit(monkeypatch, 200)
+    assert asyncio.run(h.compress())
+    assert h.get_tokens() < before and not h.is_over_limit()
+    assert h.bulks and all(t.summary for t in h.topics)  # resumidos e movidos para bulks
+    assert_totals(h)
+    restored = history.deserialize_history(h.serialize(), agent=agent)
+    assert_totals(restored)
+    assert restored.get_tokens() == h.get_tokens()
+
+
+def test_failed_merge_keeps_bulks_and_totals():
+    h = build(FakeAgent(fail_on="resumo"), topics=4)
+    for topic in h.topics:
+        topic.summary = "resumo"
+    for _ in range(4):
+        assert asyncio.run(h.compress_topics())  # já resumidos: vão direto para bulks
+    assert len(h.bulks) == 4 and not h.topics
+    assert_totals(h)
+    with pytest.raises(RuntimeError):
+        asyncio.run(h.merge_bulks_by(3))
+    assert len(h.bulks) == 4 and all(b._parent is h for b in h.bulks)
+    assert_totals(h)
+
+
+def test_output_langchain_converts_only_changed_messages():
+    h = build(FakeAgent(), topics=2)
+    first = h.output_langchain()
+    assert len(first) == 5
+    assert all(a is b for a, b in zip(h.output_langchain(), first))
+    h.topics[0].messages[1].set_summary("resposta resumida")
+    second = h.output_langchain()
+    assert second[1] is not first[1] and "resposta resumida" in str(second[1].content)
+    assert all(second[i] is first[i] for i in (0, 2, 3, 4))
+    h.add_message(True, "resposta nova")
+    third = h.output_langchain()
+    assert len(third) == 6 and "resposta nova" in str(third[5].content)
+    assert all(a is b for a, b in zip(third, second))
+    # conversões de mensagens que saíram do histórico não ficam no cache
+    h.topics[0].messages[0].set_summary("pergunta resumida")
+    h.output_langchain()
+    assert len(h._langchain_cache) == 6
+
+
+def test_ctx_window_renders_text_on_first_read(monkeypatch):
+    import agent
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    calls = []
+    from_messages = agent.ChatPromptTemplate.from_messages
+
+    def counting(messages):
+        calls.append(messages)
+        return from_messages(messages)
+
+    monkeypatch.setattr(agent.ChatPromptTemplate, "from_messages", counting)
+    prompt = [SystemMessage(content="sistema"), HumanMessage(content="olá")]
+    window = agent.CtxWindow(prompt)
+    assert calls == []  # nada é renderizado só por guardar o prompt
+    text = window.text
+    assert "sistema" in text and "olá" in text
+    assert window.text is text and window.tokens > 0
+    assert len(calls) == 1
+
+
+def test_summarize_topics_caps_concurrent_calls():
+    agent = FakeAgent(delay=0.01)
+    h = build(agent, topics=10)
+    assert asyncio.run(h.summarize_topics())
+    assert agent.calls == 10 and agent.peak == history.SUMMARIZE_CONCURRENCY
+    assert all(t.summary for t in h.topics)
+    assert_totals(h)
+    assert not asyncio.run(h.summarize_topics())  # nada pendente
+    assert agent.calls == 10
+
+
+def test_summarize_topics_raises_after_summarizing_the_rest():
+    agent = FakeAgent(fail_on="tópico 3 ", delay=0.01)
+    h = build(agent, topics=6)
+    with pytest.raises(RuntimeError, match="utility model down"):
+        asyncio.run(h.summarize_topics())
+    assert agent.calls == 6
+    assert [bool(t.summary) for t in h.topics] == [True, True, True, False, True, True]
+    assert_totals(h)
+
+
+def test_presummarize_keeps_detail_until_over_budget(monkeypatch):
+    agent = FakeAgent()
+    h = build(agent, topics=3)
+    # cada parte dentro da sua fatia, o total acima de PRESUMMARIZE_RATIO
+    limit = int(h.get_topics_tokens() / 0.28)
+    h.add_message(True, "y" * int(limit * 0.45 - h.get_current_topic_tokens()))
+    bulk = history.Bulk(history=h)
+    bulk.summary = "b" * int(limit * 0.18)
+    h.bulks.append(h._adopt(bulk))
+    h._recount()
+    ctx_limit(monkeypatch, limit)
+    size, output = h.get_tokens(), h.output()
+    assert size > limit * history.PRESUMMARIZE_RATIO and not h.is_over_limit()
+
+    assert not asyncio.run(h.compress(presummarize=True))
+    # resumos calculados em segundo plano, mas o histórico continua completo
+    assert agent.calls == 3 and h.get_tokens() == size and h.output() == output
+    assert all(t._pending_summary and not t.summary for t in h.topics)
+    topics, pending = list(h.topics), [t._pending_summary for t in h.topics]
+    assert not asyncio.run(h.compress(presummarize=True))
+    assert agent.calls == 3  # já calculados: nada repetido
+
+    # tópico atual encerrado estoura a fatia dos tópicos: os resumos guardados entram
+    h.new_topic()
+    assert asyncio.run(h.compress())
+    assert agent.calls == 4  # só o tópico novo precisou do modelo
+    assert [t.summary for t in topics] == pending
+    assert not h.is_over_limit()
+    assert_totals(h)
+
+
+def test_stale_presummary_is_not_applied():
+    agent = FakeAgent()
+    h = build(agent, topics=1)
+    topic = h.topics[0]
+    asyncio.run(topic.presummarize())
+    assert topic._pending_summary == "resumo 1"
+    topic.messages[0].set_summary("curto")  # tópico mudou depois do resumo
+    assert topic._pending_summary == ""
+    asyncio.run(topic.summarize())
+    assert topic.summary == "resumo 2"
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+import workers.message_worker as message_worker
+from services.rate_limiter import KeyedTokenBuckets
+from services.whatsapp_client import WhatsappClient
+from workers.message_worker import MessageWorker
+
+
+class SlowEmptyQueue:
+    """Fila sempre vazia cujo pop bloqueia como um brpop/claim de verdade."""
+
+    def __init__(self, worker_box):
+        self.worker_box = worker_box
+        self.pops = 0
+
+    def pop(self, timeout=5):
+        self.pops += 1
+        time.sleep(0.1)
+        if self.pops >= 3:
+            self.worker_box[0].stop()
+        return None
+
+
+@pytest.fixture
+def durable(monkeypatch):
+    monkeypatch.setattr(message_worker.settings, "queue_backend", "sqlite")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency", [1, 4])
+async def test_blocking_pop_does_not_stall_the_loop(durable, concurrency):
+    box = []
+    worker = MessageWorker(SlowEmptyQueue(box), concurrency=concurrency)
+    box.append(worker)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.wait_for(worker.start(), 5)
+    task.cancel()
+    # ~0.3s de pop bloqueante: o loop continuou girando durante a espera
+    assert ticks >= 15
+
+
+class ListQueue:
+    """Entrega os itens em ordem e para o worker quando esvazia."""
+
+    def __init__(self, items, worker_box):
+        self.items = list(items)
+        self.worker_box = worker_box
+
+    def pop(self, timeout=5):
+        if self.items:
+            return self.items.pop(0)
+        self.worker_box[0].stop()
+        return None
+
+
+def inbound(msg_id, body, sender="5511999990000"):
+    return {
+        "event_type": "message_received",
+        "tenant": "t1",
+        "payload": {"message": {"id": msg_id, "from": sender, "body": body}},
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency,expected", [
+    (1, ["Olá! Como posso ajudar?", "Seu pedido está em processamento ✅"]),
+    (2, ["Olá! Como posso ajudar?\n\nSeu pedido está em processamento ✅"]),
+])
+async def test_worker_coalesces_replies_only_when_sends_overlap(durable, monkeypatch, concurrency, expected):
+    sent = []
+
+    async def handler(request):
+        if request.url.path == "/v1/messages":
+            sent.append(json.loads(request.content)["message"])
+        return httpx.Response(200)
+
+    wa = WhatsappClient(base_url="http://gw.test", api_key="k")
+    wa.dest_buckets = KeyedTokenBuckets(rate=1000, burst=1000)
+    wa._build_http_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    wa.coalesce_window = 0.2
+    monkeypatch.setattr(message_worker, "waclient", wa)
+
+    box = []
+    worker = MessageWorker(ListQueue([inbound("m1", "oi"), inbound("m2", "status do pedido")], box),
+                           concurrency=concurrency)
+    box.append(worker)
+    started = time.monotonic()
+    await asyncio.wait_for(worker.start(), 5)
+    elapsed = time.monotonic() - started
+    await wa.aclose()
+    assert sent == expected
+    if concurrency == 1:
+        # envios em sequência não esperam pela janela de agrupamento
+        assert elapsed < 0.2
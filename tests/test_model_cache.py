@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("openai")
+pytest.importorskip("sentence_transformers")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+import models  # noqa: E402
+
+
+@pytest.fixture
+def merges(monkeypatch):
+    calls = []
+
+    def merge(provider_type, original_provider, kwargs):
+        calls.append((original_provider, dict(kwargs)))
+        return original_provider, kwargs
+
+    monkeypatch.setattr(models, "_merge_provider_defaults", merge)
+    models.clear_model_cache()
+    yield calls
+    models.clear_model_cache()
+
+
+def test_wrapper_cached_per_kind_provider_name_and_kwargs(merges):
+    chat = models.get_chat_model("openai", "gpt-4.1", temperature=0)
+    assert models.get_chat_model("openai", "gpt-4.1", temperature=0) is chat
+    assert len(merges) == 1
+    # qualquer parte da chave diferente gera outro wrapper
+    assert models.get_chat_model("openai", "gpt-4.1", temperature=1) is not chat
+    assert models.get_chat_model("openai", "gpt-4.1-mini", temperature=0) is not chat
+    browser = models.get_browser_model("openai", "gpt-4.1", temperature=0)
+    assert browser is not chat and isinstance(browser, models.BrowserCompatibleChatWrapper)
+    assert len(merges) == 4
+
+
+def test_clear_model_cache_rebuilds_wrappers(merges):
+    chat = models.get_chat_model("openai", "gpt-4.1", temperature=0)
+    models.clear_model_cache()
+    assert models.get_chat_model("openai", "gpt-4.1", temperature=0) is not chat
+    assert len(merges) == 2
+
+
+def test_shared_client_per_loop_closed_by_aclose_clients():
+    kwargs = {"api_key": "k", "api_base": "http://127.0.0.1:9/v1"}
+
+    async def use():
+        client = models._shared_client("openai", "openai/gpt-4.1", kwargs)
+        assert models._shared_client("openai", "openai/gpt-4.1", dict(kwargs)) is client
+        assert models._shared_client("openai", "openai/gpt-4.1", {**kwargs, "api_key": "outra"}) is not client
+        assert models._shared_client("anthropic", "anthropic/claude", kwargs) is None
+        # troca de configurações não derruba os clientes em uso
+        models.clear_model_cache()
+        assert models._shared_client("openai", "openai/gpt-4.1", kwargs) is client
+        await models.aclose_clients()
+        return client
+
+    first = asyncio.run(use())
+    assert first.is_closed()
+    assert not models._http_clients
+    second = asyncio.run(use())
+    assert second is not first and second.is_closed()
+
+
+def test_openai_compatible_providers_use_their_default_endpoint(monkeypatch):
+    monkeypatch.delenv("LM_STUDIO_API_BASE", raising=False)
+
+    async def use():
+        try:
+            sambanova = models._shared_client("sambanova", "sambanova/llama", {"api_key": "k"})
+            # sem endpoint conhecido o litellm cairia na OpenAI: fica com o cliente do litellm
+            lm_studio = models._shared_client("lm_studio", "lm_studio/qwen", {"api_key": "k"})
+            local = models._shared_client("lm_studio", "lm_studio/qwen",
+                                          {"api_key": "k", "api_base": "http://127.0.0.1:1234/v1"})
+            return str(sambanova.base_url), lm_studio, str(local.base_url)
+        finally:
+            await models.aclose_clients()
+
+    sambanova, lm_studio, local = asyncio.run(use())
+    assert sambanova.startswith("https://api.sambanova.ai/v1")
+    assert lm_studio is None
+    assert local.startswith("http://127.0.0.1:1234/v1")
+
+
+def test_closed_loop_without_aclose_is_pruned():
+    loop = asyncio.new_event_loop()
+
+    async def use():
+        return models._shared_client("openai", "openai/gpt-4.1", {"api_key": "k"})
+
+    loop.run_until_complete(use())
+    loop.close()  # sem aclose_clients: o cliente fica registrado
+    assert loop in models._http_clients
+
+    async def use_and_close():
+        await use()
+        await models.aclose_clients()
+
+    asyncio.run(use_and_close())
+    assert loop not in models._http_clients and not models._http_clients
+
+
+def test_terminated_loop_thread_closes_its_clients():
+    from python.helpers.defer import EventLoopThread
+
+    thread = EventLoopThread("test-model-clients")
+    loop, worker = thread.loop, thread.thread
+
+    async def use():
+        return models._shared_client("openai", "openai/gpt-4.1", {"api_key": "k"})
+
+    client = asyncio.run_coroutine_threadsafe(use(), loop).result(5)
+    thread.terminate()
+    worker.join(5)
+    assert not worker.is_alive() and client.is_closed()
+    assert loop not in models._http_clients
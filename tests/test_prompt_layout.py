@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("langchain_core")
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+from python.helpers import prompt_layout  # noqa: E402
+
+SYSTEM = "Você é o agente de atendimento. " * 200
+
+
+def conversation(turns):
+    # cada iteração acrescenta resposta da IA + resultado da ferramenta ao fim
+    msgs = [HumanMessage(content="tarefa inicial")]
+    for i in range(turns):
+        msgs.append(AIMessage(content=f'{{"tool_name": "t{i}", "tool_args": {{}}}}'))
+        msgs.append(HumanMessage(content=f"resultado da ferramenta {i}: " + "x" * 300))
+    return msgs
+
+
+def extras(i):
+    return f"[EXTRAS]\n{{\"current_datetime\": \"2026-10-19 12:00:{i:02d}\"}}"
+
+
+def test_stable_layout_keeps_prefix_cached():
+    prompts = [
+        prompt_layout.stable_prompt(SYSTEM, conversation(t), extras(t), cache_control=True)
+        for t in range(1, 8)
+    ]
+    ratios = [prompt_layout.prefix_hit_ratio(a, b) for a, b in zip(prompts, prompts[1:])]
+    assert min(ratios) >= 0.8, ratios
+    for prompt in prompts:
+        blocks = prompt_layout.render_blocks(prompt)
+        assert sum(mark for _, _, mark in blocks) == 2  # system + última mensagem do histórico
+        assert "[EXTRAS]" in blocks[-1][1] and not blocks[-1][2]
+        assert all("[EXTRAS]" not in text for _, text, _ in blocks[:-1])
+
+
+def test_merged_extras_break_the_prefix():
+    # layout antigo: extras concatenados na última mensagem humana do histórico
+    def merged(t):
+        msgs = conversation(t)
+        msgs[-1] = HumanMessage(content=msgs[-1].content + "\n" + extras(t))
+        return prompt_layout.stable_prompt(SYSTEM, msgs, "", cache_control=True)
+
+    stable = prompt_layout.stable_prompt(SYSTEM, conversation(3), extras(3), cache_control=True)
+    stable_next = prompt_layout.stable_prompt(SYSTEM, conversation(4), extras(4), cache_control=True)
+    assert prompt_layout.prefix_hit_ratio(merged(3), merged(4)) < prompt_layout.prefix_hit_ratio(stable, stable_next)
+
+
+def test_history_messages_are_not_modified():
+    history = conversation(2)
+    before = [m.content for m in history]
+    prompt_layout.stable_prompt(SYSTEM, history, extras(0), cache_control=True)
+    prompt_layout.stable_prompt(SYSTEM, history[:-1], extras(0), cache_control=True)  # termina em AIMessage
+    assert [m.content for m in history] == before
+
+
+def test_no_markers_without_cache_control(monkeypatch):
+    prompt = prompt_layout.stable_prompt(SYSTEM, conversation(2), extras(0))
+    assert not any(mark for _, _, mark in prompt_layout.render_blocks(prompt))
+    assert prompt_layout.prefix_hit_ratio(prompt, prompt) == 0.0
+    # sem cache_control o conteúdo volta a ser texto simples
+    assert prompt[0].content == SYSTEM
+    assert prompt[-1].content == conversation(2)[-1].content + "\n" + extras(0)
+    marked = prompt_layout.stable_prompt(SYSTEM, conversation(2), extras(0), cache_control=True)
+    assert isinstance(marked[0].content, list) and isinstance(marked[-1].content, list)
+
+    class Model:
+        provider, name = "openrouter", "anthropic/claude-sonnet"
+
+    monkeypatch.setenv("A0_PROMPT_CACHE_CONTROL", "auto")
+    assert prompt_layout.supports_cache_control(Model)
+    monkeypatch.setenv("A0_PROMPT_CACHE_CONTROL", "off")
+    assert not prompt_layout.supports_cache_control(Model)
@@ -8,8 +8,69 @@ def test_dedupe():
     assert dedupe("a") is False
 
 
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_dedupe_cache_ttl_and_capacity():
+    from az_queue import DedupeCache
+    clock = FakeClock()
+    cache = DedupeCache(capacity=3, ttl=10, clock=clock)
+    for i in range(3):
+        assert cache.mark_if_new(f"e{i}") is True
+    assert cache.mark_if_new("e2") is False
+    # capacidade: o mais antigo sai, os recentes continuam deduplicados
+    assert cache.mark_if_new("e3") is True
+    assert "e0" not in cache and cache.mark_if_new("e3") is False
+    clock.now = 11
+    assert len(cache) == 3 and "e1" not in cache
+    assert cache.mark_if_new("e1") is True
+    clock.now = 25
+    assert cache.mark_if_new("e1") is True
+
+
 @pytest.mark.asyncio
 async def test_queue_put_get():
     await queue.put({"x": 1})
     v = await asyncio.wait_for(queue.get(), 1)
     assert v["x"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_cross_thread_loops():
+    import threading
+    from az_queue import InMemoryQueue
+    q = InMemoryQueue(maxsize=10)
+
+    def producer():
+        async def run():
+            await asyncio.sleep(0.05)
+            for i in range(5):
+                await q.put({"i": i})
+        asyncio.run(run())
+
+    t = threading.Thread(target=producer)
+    t.start()
+    first = await asyncio.wait_for(q.get(), 2)
+    t.join()
+    rest = await q.get_many(10, timeout=1)
+    assert [first["i"]] + [x["i"] for x in rest] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_queue_bounded_backpressure():
+    from az_queue import InMemoryQueue, QueueFull
+    q = InMemoryQueue(maxsize=2)
+    q.put_nowait(1)
+    q.put_nowait(2)
+    with pytest.raises(QueueFull):
+        q.put_nowait(3)
+    with pytest.raises(QueueFull):
+        await q.put(3, timeout=0.05)
+    assert q.rejected == 2
+    assert await q.get_many(5, timeout=0.1) == [1, 2]
+    assert await q.get_many(5, timeout=0.05) == []
@@ -0,0 +1,110 @@
+import time
+
+from queues.sqlite_queue import SqliteQueue
+from storage.processed_events_store import SqliteEventDedupeStore
+
+
+def test_sqlite_queue_survives_reopen(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    q = SqliteQueue(path)
+    q.put_many([{"tenant": "a", "n": 1}, {"tenant": "a", "n": 2}])
+    q.close()
+    q = SqliteQueue(path)
+    assert q.size() == 2
+    first = q.pop(timeout=0)
+    assert first["n"] == 1
+    q.ack(first)
+    q.flush()
+    assert q.size() == 1
+
+
+def test_sqlite_queue_redelivers_after_visibility_timeout(tmp_path):
+    q = SqliteQueue(str(tmp_path / "q.sqlite3"), visibility_timeout=0.05)
+    q.put({"tenant": "a", "n": 1})
+    item = q.pop(timeout=0)
+    assert q.pop(timeout=0) is None  # arrendado
+    time.sleep(0.06)
+    again = q.pop(timeout=0)
+    assert again["_qid"] == item["_qid"]
+
+
+def test_sqlite_queue_round_robins_tenants(tmp_path):
+    q = SqliteQueue(str(tmp_path / "q.sqlite3"))
+    q.put_many([{"tenant": "blast"} for _ in range(50)] + [{"tenant": "support"}])
+    tenants = [q.pop(timeout=0)["tenant"] for _ in range(2)]
+    assert sorted(tenants) == ["blast", "support"]
+
+
+class RecordingConn:
+    def __init__(self, conn):
+        self.conn = conn
+        self.statements = []
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_idle_pop_backs_off_without_write_lock(tmp_path):
+    q = SqliteQueue(str(tmp_path / "q.sqlite3"), poll_interval=0.01, max_poll_interval=0.08)
+    assert q.pop(timeout=0) is None  # primeira chamada faz o purge
+    q.conn = RecordingConn(q.conn)
+    assert q.pop(timeout=0.3) is None
+    assert not [s for s in q.conn.statements if s.startswith("BEGIN")]
+    # 0.01, 0.02, 0.04, 0.08, 0.08, 0.08 ... em vez de 30 consultas a cada 10 ms
+    assert len(q.conn.statements) <= 8
+    q.put({"tenant": "a"})
+    assert q.pop(timeout=0)["tenant"] == "a"
+
+
+def test_ttl_purge_counts_expired_items(tmp_path):
+    q = SqliteQueue(str(tmp_path / "q.sqlite3"), ttl=0.05)
+    q.put_many([{"tenant": "a"}, {"tenant": "b"}])
+    time.sleep(0.06)
+    assert q.pop(timeout=0) is None
+    assert q.size() == 0 and q.get_stat("stats:expired") == 2
+
+
+def test_requeued_item_keeps_first_enqueue_time(tmp_path):
+    q = SqliteQueue(str(tmp_path / "q.sqlite3"))
+    q.put({"tenant": "a"})
+    item = q.pop(timeout=0)
+    q.ack(item)
+    q.put(item)  # retentativa do worker
+    assert q.pop(timeout=0)["enqueued_at"] == item["enqueued_at"]
+
+
+def test_sqlite_dedupe_ttl(tmp_path):
+    store = SqliteEventDedupeStore(str(tmp_path / "d.sqlite3"), ttl=0.05)
+    assert store.mark_if_new("t", "e1") is True
+    assert store.mark_if_new("t", "e1") is False
+    assert store.mark_if_new("other", "e1") is True
+    time.sleep(0.06)
+    assert store.mark_if_new("t", "e1") is True
+
+
+def test_webhook_forgets_event_when_enqueue_fails(tmp_path, monkeypatch):
+    import hashlib, hmac, json
+    from fastapi.testclient import TestClient
+    import webhook_server as ws
+
+    class BrokenQueue:
+        def put(self, item):
+            raise OSError("disk full")
+
+    store = SqliteEventDedupeStore(str(tmp_path / "d.sqlite3"), ttl=300)
+    monkeypatch.setattr(ws, "_durable_queue", BrokenQueue())
+    monkeypatch.setattr(ws, "_dedupe_store", store)
+    monkeypatch.setattr(ws, "_load_api_key", lambda: "")
+    monkeypatch.setattr(ws._admission, "high", 0)
+    body = json.dumps({"event": "message_received", "id": "enq-1", "timestamp": int(time.time()),
+                       "message": {"id": "m1", "from": "5511@c.us", "body": "oi"}}).encode()
+    sig = hmac.new(ws.WHATSAPP_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    client = TestClient(ws.app, raise_server_exceptions=False)
+    r = client.post(f"{ws.BASE_PREFIX}/webhooks/whatsapp", content=body, headers={"X-Signature": sig})
+    assert r.status_code == 500
+    # o reenvio do gateway não pode ser tratado como duplicado
+    assert store.conn.execute("SELECT COUNT(*) FROM processed_events").fetchone()[0] == 0
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("tiktoken")
+pytest.importorskip("dotenv")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+from python.helpers import stream_coalescer  # noqa: E402
+from python.helpers.tokens import estimate_tokens  # noqa: E402
+
+
+def chunks(*pairs, pause: float = 0.0):
+    async def gen():
+        for reasoning, response in pairs:
+            if pause:
+                await asyncio.sleep(pause)
+            yield {"reasoning_delta": reasoning, "response_delta": response}
+
+    return gen()
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def callback(self, kind):
+        async def record(delta, total):
+            self.events.append((kind, delta, total))
+
+        return record
+
+    async def tokens(self, delta, count):
+        self.events.append(("tokens", delta, count))
+
+    def deltas(self, kind):
+        return [e[1] for e in self.events if e[0] == kind]
+
+
+def run(pairs, interval, max_chars, pause=0.0):
+    rec = Recorder()
+    result = asyncio.run(
+        stream_coalescer.coalesce(
+            chunks(*pairs, pause=pause),
+            rec.callback("reasoning"),
+            rec.callback("response"),
+            rec.tokens,
+            interval=interval,
+            max_chars=max_chars,
+        )
+    )
+    return result, rec
+
+
+PAIRS = [("pen", ""), ("sando", ""), ("", "Olá"), ("", ", "), ("", "mundo"), ("mais", ""), ("", "!")]
+
+
+@pytest.mark.parametrize("interval,max_chars", [(0, 0), (60, 0), (60, 4), (60, 4096)])
+def test_same_text_and_totals_as_per_chunk(interval, max_chars):
+    (response, reasoning), rec = run(PAIRS, interval, max_chars)
+    assert response == "Olá, mundo!" and reasoning == "pensandomais"
+    assert "".join(rec.deltas("response")) == response
+    assert "".join(rec.deltas("reasoning")) == reasoning
+    # o total passado a cada callback é o texto acumulado até aquele lote
+    for kind, full in (("response", response), ("reasoning", reasoning)):
+        seen = ""
+        for _, delta, total in (e for e in rec.events if e[0] == kind):
+            seen += delta
+            assert total == seen
+        assert seen == full
+    # tokens: um callback por lote, estimado sobre o próprio lote
+    batches = [e for e in rec.events if e[0] != "tokens"]
+    counts = [e for e in rec.events if e[0] == "tokens"]
+    assert [(d, estimate_tokens(d)) for _, d, _ in batches] == [(d, c) for _, d, c in counts]
+
+
+def test_reasoning_and_response_keep_stream_order():
+    # intervalo longo: só mudança de tipo ou o fim do stream liberam texto
+    _, rec = run(PAIRS, interval=60, max_chars=0)
+    order = [(k, d) for k, d, _ in rec.events if k != "tokens"]
+    assert order == [
+        ("reasoning", "pen"),  # primeiro delta sai logo
+        ("reasoning", "sando"),
+        ("response", "Olá"),
+        ("response", ", mundo"),
+        ("reasoning", "mais"),
+        ("response", "!"),
+    ]
+
+
+def test_flushes_on_max_chars():
+    pairs = [("", "abc")] * 5
+    _, rec = run(pairs, interval=60, max_chars=6)
+    assert rec.deltas("response") == ["abc", "abcabc", "abcabc"]
+
+
+def test_flushes_after_interval():
+    pairs = [("", "a")] * 4
+    _, rec = run(pairs, interval=60, max_chars=0)
+    assert rec.deltas("response") == ["a", "aaa"]  # o resto só no fim
+    _, rec = run(pairs, interval=0.01, max_chars=0, pause=0.02)
+    assert rec.deltas("response") == ["a"] * 4
+
+
+def test_stalled_stream_flushes_pending_text_on_timer():
+    rec = Recorder()
+    seen_during_stall = []
+
+    async def stalling():
+        yield {"reasoning_delta": "", "response_delta": "a"}  # sai na hora
+        yield {"reasoning_delta": "", "response_delta": "b"}  # fica pendente
+        await asyncio.sleep(0.1)  # modelo parado bem além do intervalo
+        seen_during_stall.extend(rec.deltas("response"))
+        yield {"reasoning_delta": "", "response_delta": "c"}
+
+    result = asyncio.run(
+        stream_coalescer.coalesce(stalling(), None, rec.callback("response"), interval=0.02, max_chars=0)
+    )
+    assert result == ("abc", "")
+    assert seen_during_stall == ["a", "b"]
+    assert rec.deltas("response") == ["a", "b", "c"]
+
+
+def test_failed_stream_cancels_pending_timer():
+    rec = Recorder()
+
+    async def failing():
+        yield {"reasoning_delta": "", "response_delta": "a"}
+        yield {"reasoning_delta": "", "response_delta": "b"}
+        raise RuntimeError("conexão caiu")
+
+    async def run_failing():
+        with pytest.raises(RuntimeError):
+            await stream_coalescer.coalesce(failing(), None, rec.callback("response"), interval=0.02, max_chars=0)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run_failing())
+    assert rec.deltas("response") == ["a"]
+
+
+def test_first_chunk_callback_fires_once_before_batching():
+    rec = Recorder()
+    pairs = [("", ""), ("", "a"), ("", "b")]
+    result = asyncio.run(
+        stream_coalescer.coalesce(
+            chunks(*pairs),
+            None,
+            rec.callback("response"),
+            interval=60,
+            max_chars=0,
+            first_chunk_callback=lambda: rec.events.append(("first", "", "")),
+        )
+    )
+    assert result == ("ab", "")
+    # chunk vazio não conta como primeiro token
+    assert [e[0] for e in rec.events] == ["first", "response", "response"]
+
+
+def test_flush_settings_from_env(monkeypatch):
+    monkeypatch.setenv("A0_STREAM_FLUSH_MS", "0")
+    monkeypatch.setenv("A0_STREAM_FLUSH_CHARS", "0")
+    assert stream_coalescer.flush_settings() == (0.0, 0)
+    monkeypatch.setenv("A0_STREAM_FLUSH_MS", "rápido")
+    assert stream_coalescer.flush_settings() == (0.05, 4096)
@@ -0,0 +1,46 @@
+import sys
+import time
+
+from supervisor import ManagedProcess, Supervisor, heartbeat_health
+
+
+def test_crashed_process_restarts_with_backoff():
+    p = ManagedProcess("crash", [sys.executable, "-c", "raise SystemExit(3)"],
+                       backoff_base=0.05, backoff_max=0.2)
+    starts = []
+    deadline = time.monotonic() + 3
+    while len(starts) < 3 and time.monotonic() < deadline:
+        before = p.proc
+        p.tick()
+        if p.proc is not None and p.proc is not before:
+            starts.append(time.monotonic())
+        time.sleep(0.01)
+    assert len(starts) == 3
+    # backoff dobra a cada falha seguida: 0.05s, depois 0.1s
+    assert starts[2] - starts[1] > starts[1] - starts[0] >= 0.05
+    p.terminate()
+
+
+def test_shutdown_terminates_children_gracefully(tmp_path):
+    marker = tmp_path / "stopped"
+    code = (
+        "import signal, sys, time\n"
+        f"def bye(*_):\n    open({str(marker)!r}, 'w').close(); sys.exit(0)\n"
+        "signal.signal(signal.SIGTERM, bye)\n"
+        "print('ready', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    p = ManagedProcess("sleeper", [sys.executable, "-c", code])
+    sup = Supervisor([p], grace=5)
+    sup.tick()
+    time.sleep(0.5)  # tempo para o filho instalar o handler
+    sup.shutdown()
+    assert p.proc.returncode == 0 and marker.exists()
+
+
+def test_stale_heartbeat_is_unhealthy(tmp_path):
+    hb = tmp_path / "hb"
+    check = heartbeat_health(str(hb), max_age=60)
+    assert check(None) is False
+    hb.touch()
+    assert check(None) is True
@@ -0,0 +1,95 @@
+from collections import Counter
+
+from queues.redis_queue import TenantShardedQueue
+from queues.scheduler import WeightedRoundRobin
+
+
+class FakeRedis:
+    """Subconjunto mínimo de comandos usados pela TenantShardedQueue."""
+
+    def __init__(self):
+        self.lists = {}
+        self.sets = {}
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def rpop(self, key):
+        lst = self.lists.get(key)
+        return lst.pop() if lst else None
+
+    def brpop(self, keys, timeout=0):
+        for key in keys:
+            value = self.rpop(key)
+            if value is not None:
+                return key, value
+        return None
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def srem(self, key, member):
+        self.sets.get(key, set()).discard(member)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def pipeline(self, transaction=False):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        return [getattr(self.client, n)(*a, **kw) for n, a, kw in self.calls]
+
+
+def test_weighted_round_robin_interleaves():
+    rr = WeightedRoundRobin({"a": 3, "b": 1})
+    rr.set_active(["a", "b"])
+    picks = [rr.next() for _ in range(8)]
+    assert Counter(picks) == {"a": 6, "b": 2}
+    # smooth: nunca mais que 3 seguidos do tenant pesado
+    assert "aaaa" not in "".join(picks)
+
+
+def test_noisy_tenant_does_not_starve_others():
+    q = TenantShardedQueue(FakeRedis(), refresh_interval=0)
+    for i in range(100):
+        q.put({"tenant": "blast", "n": i})
+    q.put({"tenant": "support", "n": 0})
+    first = [q.pop(timeout=0)["tenant"] for _ in range(4)]
+    assert "support" in first
+    assert q.size_by_tenant()["blast"] == 97
+
+
+def test_drained_tenant_leaves_active_set():
+    client = FakeRedis()
+    q = TenantShardedQueue(client, refresh_interval=0)
+    q.put({"tenant": "t1"})
+    item = q.pop(timeout=0)
+    assert item["tenant"] == "t1" and "enqueued_at" in item
+    assert q.pop(timeout=0) is None
+    assert client.smembers(q.active_key) == set()
+
+
+def test_requeued_item_keeps_first_enqueue_time():
+    q = TenantShardedQueue(FakeRedis(), refresh_interval=0)
+    q.put({"tenant": "t1"})
+    item = q.pop(timeout=0)
+    first = item["enqueued_at"]
+    item["attempt"] = 1
+    q.put(item)  # retentativa do worker
+    assert q.pop(timeout=0)["enqueued_at"] == first
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+tiktoken = pytest.importorskip("tiktoken")
+try:
+    tiktoken.get_encoding("cl100k_base")
+except Exception as e:  # encoding is downloaded on first use
+    pytest.skip(f"cl100k_base indisponível: {e}", allow_module_level=True)
+
+from apps.agent_zero_core.python.helpers import tokens  # noqa: E402
+
+SAMPLES = {
+    "prosa": "The agent reads the message, plans the next step and calls a tool. " * 40,
+    "portugues": "Olá! Recebemos sua mensagem e em breve um atendente responderá. Obrigado pela paciência. " * 30,
+    "codigo": "def handle(event):\n    if event['type'] == 'message':\n        return process(event['body'])\n" * 30,
+    "json": json.dumps([{"tool_name": "code_execution", "tool_args": {"runtime": "python", "code": "print(1)"}}] * 40),
+    "cjk": "我们收到了您的消息，稍后会有客服回复您。" * 30,
+}
+
+# erro relativo máximo aceito contra approximate_tokens (tiktoken exato)
+MAX_REL_ERROR = 0.35
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+def test_estimate_within_error_bound(name):
+    text = SAMPLES[name]
+    exact = tokens.approximate_tokens(text)
+    est = tokens.estimate_tokens(text)
+    assert abs(est - exact) / exact <= MAX_REL_ERROR, (name, est, exact)
+
+
+def test_short_chunks_and_empty():
+    assert tokens.estimate_tokens("") == 0
+    assert tokens.estimate_tokens("a") == 1
+    for chunk in ("Hello", " world", "ção", "```json\n{"):
+        assert abs(tokens.estimate_tokens(chunk) - tokens.approximate_tokens(chunk)) <= 2
+
+
+def test_calibrate_does_not_increase_error(monkeypatch):
+    monkeypatch.setattr(tokens, "CHARS_PER_TOKEN", tokens.CHARS_PER_TOKEN)
+    monkeypatch.setattr(tokens, "EXTRA_BYTES_PER_TOKEN", tokens.EXTRA_BYTES_PER_TOKEN)
+
+    def squared_error():
+        return sum((tokens.estimate_tokens(t) - tokens.approximate_tokens(t)) ** 2 for t in SAMPLES.values())
+
+    before = squared_error()
+    cpt, ebpt = tokens.calibrate(list(SAMPLES.values()))
+    assert cpt > 0 and ebpt > 0
+    # calibrate minimiza o erro quadrático; folga só para o arredondamento
+    assert squared_error() <= before * 1.01 + len(SAMPLES)
@@ -0,0 +1,131 @@
+import sys
+import os
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("webcolors")
+
+# helpers do agent-core importam `python.helpers...` a partir de apps/agent_zero_core
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps", "agent_zero_core"))
+from python.helpers import utility_cache  # noqa: E402
+
+
+class Model:
+    provider = "openai"
+    name = "gpt-4.1-mini"
+    kwargs = {"temperature": 0}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("A0_UTILITY_CACHE", "1")
+    monkeypatch.setattr(utility_cache, "DB_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(utility_cache, "_conn", None)
+    monkeypatch.setattr(utility_cache, "_stats", dict.fromkeys(utility_cache._stats, 0))
+    yield utility_cache
+    if utility_cache._conn is not None:
+        utility_cache._conn.close()
+
+
+def test_hit_miss_and_key(cache):
+    key = cache.make_key(Model, "sys", "msg")
+    assert key == cache.make_key(Model, "sys", "msg")
+    assert key != cache.make_key(Model, "sys", "msg2")
+    assert cache.get(key) is None
+    cache.put(key, "resumo")
+    assert cache.get(key) == "resumo"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+
+
+def test_ttl_expires(cache, monkeypatch):
+    key = cache.make_key(Model, "sys", "msg")
+    cache.put(key, "resumo")
+    monkeypatch.setenv("A0_UTILITY_CACHE_TTL", "0")
+    monkeypatch.setattr(cache.time, "time", lambda: 10**10)
+    assert cache.get(key) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_lru_eviction_by_size(cache, monkeypatch):
+    monkeypatch.setenv("A0_UTILITY_CACHE_MAX_MB", str(2.5 * 1000 / (1024 * 1024)))  # ~2500 bytes
+    clock = iter(range(1, 100))
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(clock)))
+    keys = [cache.make_key(Model, "sys", str(i)) for i in range(3)]
+    cache.put(keys[0], "a" * 1000)
+    cache.put(keys[1], "b" * 1000)
+    assert cache.get(keys[0])  # keys[1] passa a ser o menos usado
+    cache.put(keys[2], "c" * 1000)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) and cache.get(keys[2])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_running_size_total_without_full_scans(cache, monkeypatch):
+    monkeypatch.setenv("A0_UTILITY_CACHE_MAX_MB", str(3000 / (1024 * 1024)))
+    keys = [cache.make_key(Model, "sys", str(i)) for i in range(5)]
+    cache.put(keys[0], "a" * 1000)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    cache.put(keys[0], "a" * 500)  # substituição desconta o tamanho antigo
+    for key in keys[1:]:
+        cache.put(key, "b" * 1000)
+    cache._conn.set_trace_callback(None)
+    assert not [s for s in statements if "SUM(" in s]
+    real = cache._conn.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+    assert cache._total_bytes == real <= 3000
+    # total recalculado uma vez ao reabrir o arquivo
+    cache._conn.close()
+    monkeypatch.setattr(cache, "_conn", None)
+    monkeypatch.setattr(cache, "_total_bytes", 0)
+    cache.get(keys[4])
+    assert cache._total_bytes == real
+
+
+def test_disabled_is_noop(cache, monkeypatch):
+    monkeypatch.setenv("A0_UTILITY_CACHE", "0")
+    key = cache.make_key(Model, "sys", "msg")
+    cache.put(key, "resumo")
+    assert cache.get(key) is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_logs_summary_every_n_lookups(cache, monkeypatch):
+    logged = []
+    monkeypatch.setattr(cache, "LOG_EVERY", 2)
+    monkeypatch.setattr(cache.PrintStyle, "debug", staticmethod(logged.append))
+    key = cache.make_key(Model, "sys", "msg")
+    cache.get(key)
+    cache.put(key, "resumo")
+    assert logged == []
+    cache.get(key)
+    assert logged == ["Utility cache: 1 hits, 1 misses (50%), 1 stores, 0 evictions, 0 expired"]
+
+
+@pytest.mark.parametrize("fallback_won, stored", [(False, True), (True, False)])
+def test_agent_stores_only_configured_model_answers(tmp_path, monkeypatch, fallback_won, stored):
+    pytest.importorskip("litellm")
+    pytest.importorskip("nest_asyncio")
+    import asyncio
+    from types import SimpleNamespace
+    from agent import Agent
+    # agent.py importa o helper pelo caminho do pacote apps.*
+    from apps.agent_zero_core.python.helpers import utility_cache as agent_cache
+
+    monkeypatch.setenv("A0_UTILITY_CACHE", "1")
+    monkeypatch.setattr(agent_cache, "DB_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(agent_cache, "_conn", None)
+    configured, fallback = Model(), Model()
+
+    async def rate_limiter(*args, **kwargs):
+        return SimpleNamespace(add=lambda **kw: None)
+
+    async def routed(role, config, fallbacks_env, **kwargs):
+        return "resumo", "", fallback if fallback_won else config
+
+    agent = SimpleNamespace(config=SimpleNamespace(utility_model=configured),
+                            rate_limiter=rate_limiter, _call_routed_model=routed)
+    assert asyncio.run(Agent.call_utility_model(agent, "sys", "msg")) == "resumo"
+    assert (agent_cache.get(agent_cache.make_key(configured, "sys", "msg")) == "resumo") is stored
+    agent_cache._conn.close()
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services.rate_limiter import KeyedTokenBuckets
+from services.whatsapp_client import WhatsappClient
+
+
+def make_client(handler):
+    wa = WhatsappClient(base_url="http://gw.test", api_key="k")
+    wa.dest_buckets = KeyedTokenBuckets(rate=1000, burst=1000)
+    wa._build_http_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return wa
+
+
+@pytest.mark.asyncio
+async def test_send_is_serialized_per_destination():
+    in_flight = {}
+    peak = {}
+
+    async def handler(request):
+        dest = json.loads(request.content)["to"]
+        in_flight[dest] = in_flight.get(dest, 0) + 1
+        peak[dest] = max(peak.get(dest, 0), in_flight[dest])
+        await asyncio.sleep(0.01)
+        in_flight[dest] -= 1
+        assert request.headers["X-API-Key"] == "k" and request.url.path == "/v1/messages"
+        return httpx.Response(200)
+
+    wa = make_client(handler)
+    results = await asyncio.gather(*(wa.send_message(d, "oi") for d in "aaab" * 2))
+    assert all(results)
+    assert peak == {"a": 1, "b": 1}
+    await wa.aclose()
+
+
+@pytest.mark.asyncio
+async def test_annotate_does_not_wait_for_gateway():
+    seen = []
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        seen.append(request.url.path)
+        return httpx.Response(200)
+
+    wa = make_client(handler)
+    await asyncio.wait_for(wa.annotate("m1", {"intent": "greeting"}), 0.1)
+    await wa.annotate("m2", {"intent": "greeting"})
+    release.set()
+    await wa.flush_annotations()
+    assert sorted(seen) == ["/v1/messages/m1/annotations", "/v1/messages/m2/annotations"]
+    await wa.aclose()
+
+
+def test_token_bucket_burst_then_rate():
+    from services.rate_limiter import TokenBucket
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.5]
+    now[0] = 1.0
+    assert bucket.reserve() == 0.0
+    bucket.block_for(3)
+    assert bucket.reserve() == 3.0
+
+
+def test_token_bucket_without_rate_only_honours_block():
+    from services.rate_limiter import TokenBucket
+    now = [0.0]
+    bucket = TokenBucket(rate=0, burst=1, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
+    bucket.block_for(2)
+    assert bucket.reserve() == 2.0
+
+
+@pytest.mark.asyncio
+async def test_honours_retry_after_on_429():
+    calls = []
+
+    async def handler(request):
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.05"})
+        return httpx.Response(200)
+
+    wa = make_client(handler)
+    assert await wa.send_message("a", "oi") is True
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.05
+    assert wa.throttled == 1
+    await wa.aclose()
+
+
+@pytest.mark.asyncio
+async def test_huge_retry_after_is_clamped():
+    async def handler(request):
+        return httpx.Response(429, headers={"Retry-After": "3600"})
+
+    wa = make_client(handler)
+    wa.retry_after_max = 0.5
+    r = await wa.post("/v1/messages", {"to": "a"}, dest="a")
+    assert r.status_code == 429 and wa.throttled == 1
+    # envio abandonado: buckets bloqueados no máximo pelo teto, não por 1h
+    now = wa.dest_buckets.clock()
+    assert wa.dest_buckets.get("a").blocked_until - now <= 0.5
+    assert wa.sender_buckets.get(wa.settings.static_tenant_id).blocked_until - now <= 0.5
+    await wa.aclose()
+
+
+@pytest.mark.asyncio
+async def test_coalesces_replies_to_same_destination():
+    bodies = []
+
+    async def handler(request):
+        bodies.append(json.loads(request.content)["message"])
+        return httpx.Response(200)
+
+    wa = make_client(handler)
+    wa.coalesce_window = 0.02
+    results = await asyncio.gather(
+        wa.send_message("a", "Olá!"), wa.send_message("a", "Olá!"), wa.send_message("a", "Pedido ok")
+    )
+    assert results == [True, True, True]
+    assert bodies == ["Olá!\n\nPedido ok"]
+    await wa.aclose()
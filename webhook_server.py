@@ -5,13 +5,14 @@ from fastapi import FastAPI, Request, HTTPException, Header
 from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 
-from az_queue import queue, dedupe  # fallback in-memory
+from az_queue import queue, dedupe, QueueFull  # fallback in-memory
 from config import get_settings
 from middleware.log_correlation import CorrelationIdMiddleware
 from multi_tenant import resolve_tenant
-from queues.redis_queue import build_queue as build_redis_queue
+from queues.factory import build_queue as build_durable_queue
 from storage.processed_events_store import build_store as build_dedupe_store
-from metrics import router as metrics_router, events_received_total, events_duplicate_total, requests_total
+from services.admission import AdmissionController, OVERLOADED
+from metrics import router as metrics_router, events_received_total, events_duplicate_total, requests_total, events_rejected_total, stage_timer
 from debug_state import get_replies
 
 WHATSAPP_WEBHOOK_SECRET = os.getenv("WHATSAPP_WEBHOOK_SECRET", "CHANGE_ME")
@@ -50,15 +51,48 @@ def verify_signature(secret: str, body: bytes, signature: str | None):
     except Exception:
         return False
 
-_redis_queue = None
+def _reject_queue_full(event_id: str | None, tenant: str):
+    if events_rejected_total:
+        events_rejected_total.labels(reason='queue_full').inc()
+    _last_errors.append({
+        "ts": int(time.time()),
+        "type": "queue_full",
+        "event_id": event_id,
+        "tenant": tenant
+    })
+    raise HTTPException(status_code=429, detail="queue full", headers={"Retry-After": "1"})
+
+_durable_queue = None
 _dedupe_store = None
 try:
-    if settings.queue_backend == 'redis':
-        _redis_queue = build_redis_queue(settings)
+    if settings.durable_queue:
+        _durable_queue = build_durable_queue(settings)
         _dedupe_store = build_dedupe_store(settings)
-        logging.getLogger('webhook').info('Redis backend habilitado')
+        logging.getLogger('webhook').info('%s backend habilitado', settings.queue_backend)
 except Exception as e:  # pragma: no cover
-    logging.getLogger('webhook').error('Falha init Redis backend: %s', e)
+    logging.getLogger('webhook').error('Falha init %s backend: %s', settings.queue_backend, e)
+
+def _queue_depth() -> int:
+    return _durable_queue.size() if _durable_queue else queue.qsize()
+
+# profundidade amostrada em background: o webhook não consulta o Redis por evento
+_admission = AdmissionController.from_settings(
+    settings, _queue_depth, capacity=0 if _durable_queue else queue.maxsize
+)
+
+def _reject_overload(event_id: str | None, tenant: str, event_type: str, reason: str):
+    if events_rejected_total:
+        events_rejected_total.labels(reason=reason).inc()
+    _last_errors.append({
+        "ts": int(time.time()),
+        "type": reason,
+        "event_id": event_id,
+        "event_type": event_type,
+        "tenant": tenant,
+        "queue_depth": _admission.depth,
+    })
+    status = 503 if reason == OVERLOADED else 429
+    raise HTTPException(status_code=status, detail=reason, headers={"Retry-After": str(_admission.retry_after)})
 
 @app.post(f"{BASE_PREFIX}/webhooks/whatsapp")
 async def whatsapp_webhook(
@@ -67,9 +101,12 @@ async def whatsapp_webhook(
     x_event_id: str | None = Header(default=None, alias="X-Event-Id"),
     x_event_type: str | None = Header(default=None, alias="X-Event-Type"),
 ):
+    received_at = time.time()
     raw = await req.body()
     sig = req.headers.get("X-Signature")
-    if not verify_signature(WHATSAPP_WEBHOOK_SECRET, raw, sig):
+    with stage_timer('hmac_verify'):
+        signature_ok = verify_signature(WHATSAPP_WEBHOOK_SECRET, raw, sig)
+    if not signature_ok:
         _last_errors.append({
             "ts": int(time.time()),
             "type": "invalid_signature",
@@ -109,8 +146,17 @@ async def whatsapp_webhook(
     event_id = x_event_id or event.get("id") or f"{event.get('event')}::{event.get('message',{}).get('id')}::{event.get('timestamp')}"
     if requests_total:
         requests_total.labels(path='/agent-zero/webhooks/whatsapp', method='POST', status='pending').inc()
+    # Backpressure da fila em memória: recusa antes de marcar o id, para que o
+    # reenvio do gateway não seja tratado como duplicado.
+    if not _durable_queue and queue.full():
+        _reject_queue_full(event_id, tenant)
+    shed_reason = _admission.check(event_type)
+    if shed_reason:
+        _reject_overload(event_id, tenant, event_type, shed_reason)
     if _dedupe_store and event_id:
-        if not _dedupe_store.mark_if_new(tenant, event_id):
+        with stage_timer('dedupe'):
+            is_new = _dedupe_store.mark_if_new(tenant, event_id)
+        if not is_new:
             if events_duplicate_total:
                 events_duplicate_total.labels(event_type=event_type).inc()
             _last_errors.append({
@@ -122,7 +168,9 @@ async def whatsapp_webhook(
             return {"accepted": False, "duplicate": True}
     else:
         from az_queue import dedupe as _dedupe
-        if not _dedupe(event_id):
+        with stage_timer('dedupe'):
+            is_new = _dedupe(event_id)
+        if not is_new:
             logger.debug("duplicate event %s", event_id)
             _last_errors.append({
                 "ts": int(time.time()),
@@ -142,12 +190,26 @@ async def whatsapp_webhook(
             return {"accepted": False, "ignored": True, "reason": "echo_default"}
     except Exception:
         pass
-    enriched = {"payload": event, "attempt": 0, "tenant": tenant, "event_type": event_type}
-    if _redis_queue:
-        _redis_queue.put(enriched)
-    else:
-        from az_queue import queue as _queue
-        await _queue.put(enriched)
+    enriched = {
+        "payload": event, "attempt": 0, "tenant": tenant, "event_type": event_type,
+        "received_at": received_at, "enqueued_at": time.time(),
+    }
+    with stage_timer('enqueue'):
+        if _durable_queue:
+            try:
+                _durable_queue.put(enriched)
+            except Exception:
+                # id já marcado: desfaz para o reenvio do gateway não ser descartado como duplicado
+                if _dedupe_store and event_id:
+                    _dedupe_store.forget(tenant, event_id)
+                raise
+        else:
+            try:
+                queue.put_nowait(enriched)
+            except QueueFull:
+                from az_queue import forget as _forget
+                _forget(event_id)
+                _reject_queue_full(event_id, tenant)
     if events_received_total:
         events_received_total.labels(event_type=event_type).inc()
     logger.info("accepted event %s tenant=%s", event_id, tenant)
@@ -183,19 +245,31 @@ async def debug_stats(raw: bool = False):  # type: ignore
         "queue_backend": settings.queue_backend,
         "events_buffer_size": len(_last_events),
         "errors_buffer_size": len(_last_errors),
-        "dedupe_backend": "redis" if _dedupe_store else "memory"
+        "dedupe_backend": settings.queue_backend if _dedupe_store else "memory"
     }
-    # Queue size (redis only for now)
-    if _redis_queue:
+    # Queue size
+    if not _durable_queue:
+        stats["queue_size"] = queue.qsize()
+        stats["queue_capacity"] = queue.maxsize
+        stats["queue_rejected"] = queue.rejected
+    if _durable_queue:
         try:
-            stats["queue_size"] = _redis_queue.size()
+            by_tenant = getattr(_durable_queue, 'size_by_tenant', None)
+            if by_tenant:
+                stats["queue_size_by_tenant"] = by_tenant()
+                stats["queue_size"] = sum(stats["queue_size_by_tenant"].values())
+            else:
+                stats["queue_size"] = _durable_queue.size()
         except Exception:
             stats["queue_size"] = None
-    # Redis counters
-    if _redis_queue:
+    if _admission.enabled:
+        stats["admission"] = _admission.stats()
+    # Contadores persistidos pelo worker
+    if _durable_queue:
         try:
-            stats["processed_success"] = int(_redis_queue.client.get('stats:processed_success') or 0)
-            stats["processed_failed"] = int(_redis_queue.client.get('stats:processed_failed') or 0)
+            get_stat = getattr(_durable_queue, 'get_stat', None) or _durable_queue.client.get
+            stats["processed_success"] = int(get_stat('stats:processed_success') or 0)
+            stats["processed_failed"] = int(get_stat('stats:processed_failed') or 0)
         except Exception:
             pass
     # Prometheus counters snapshot
@@ -242,11 +316,13 @@ async def debug_inject(payload: dict):  # type: ignore
             "fromMe": False
         }
     }
-    if _redis_queue:
-        _redis_queue.put({"payload": event, "attempt": 0, "tenant": 'default', "event_type": 'message_received'})
+    if _durable_queue:
+        _durable_queue.put({"payload": event, "attempt": 0, "tenant": 'default', "event_type": 'message_received'})
     else:
-        from az_queue import queue as _queue
-        await _queue.put(event)
+        try:
+            queue.put_nowait(event)
+        except QueueFull:
+            raise HTTPException(status_code=429, detail="queue full", headers={"Retry-After": "1"})
     return {"accepted": True, "injected": True, "id": msg_id}
 
 @app.get("/")
@@ -1,29 +1,40 @@
-import os, asyncio, httpx, time, logging, random
+import os, asyncio, time, logging, random, re
 from logging_config import setup_logging
+from metrics import events_in_flight, reply_latency, stage_timer, observe_stage
+from services.whatsapp_client import WhatsappClient
 
 setup_logging()
 logger = logging.getLogger("worker")
 
 WHATSAPP_BASE_URL = os.getenv("WHATSAPP_BASE_URL", "http://whatsapp-api:3001")
 WHATSAPP_API_KEY = os.getenv("WHATSAPP_API_KEY")
+# cliente compartilhado: pool com keep-alive em vez de uma conexão TCP/TLS por mensagem
+_wa = WhatsappClient(base_url=WHATSAPP_BASE_URL, api_key=WHATSAPP_API_KEY or "")
 DEFAULT_INTENT_REPLY = {
     "saudacao": "Olá! Como posso ajudar?",
     "pedido_status": "Informe o número do pedido para eu consultar.",
     "fallback": "Poderia detalhar melhor sua solicitação?",
 }
 
+# worker legado: casa por substring, como sempre fez ("oii", "olaa", "pedidos"...);
+# a classificação por palavra inteira fica no services.classifier do MessageWorker
+_INTENT_PATTERNS = [
+    ("pedido_status", re.compile("pedido")),
+    ("saudacao", re.compile("oi|olá|ola|bom dia|boa tarde")),
+]
+
 def classify(body: str):
     if not body:
         return "fallback"
     b = body.lower()
-    if "pedido" in b:
-        return "pedido_status"
-    if any(k in b for k in ["oi", "olá", "ola", "bom dia", "boa tarde"]):
-        return "saudacao"
+    for intent, pattern in _INTENT_PATTERNS:
+        if pattern.search(b):
+            return intent
     return "fallback"
 
-async def respond(message):
-    intent = classify(message.get("body", ""))
+async def respond(message, received_at=None, tenant="default"):
+    with stage_timer('classify'):
+        intent = classify(message.get("body", ""))
     reply = DEFAULT_INTENT_REPLY[intent]
     number = message.get("contactId") or message.get("from") or message.get("number")
     if not number:
@@ -35,32 +46,52 @@ async def respond(message):
         "message": reply,
         "meta": {"source": "agent-zero", "intent": intent},
     }
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            r = await client.post(f"{WHATSAPP_BASE_URL}/v1/messages", json=payload)
-            r.raise_for_status()
-        except Exception as e:  # noqa
-            logger.error("send error: %s", e)
-            raise
+    try:
+        with stage_timer('send'):
+            r = await _wa.post("/v1/messages", payload, dest=number)
+        r.raise_for_status()
+    except Exception as e:  # noqa
+        logger.error("send error: %s", e)
+        raise
+    if reply_latency and received_at:
+        reply_latency.labels(tenant=tenant, intent=intent).observe(max(0.0, time.time() - received_at))
+
+async def handle_event(ev: dict):
+    # webhook enfileira {"payload": evento, "tenant": ...}; /debug/inject enfileira o evento puro
+    received_at, tenant = ev.get("received_at"), ev.get("tenant") or "default"
+    if ev.get("enqueued_at"):
+        observe_stage('queue_wait', time.time() - ev["enqueued_at"])
+    if "payload" in ev:
+        ev = ev.get("payload") or {}
+    logger.debug("event id=%s type=%s ts=%s", ev.get('message', {}).get('id'), ev.get('event'), ev.get('timestamp'))
+    if ev.get("event") == "message_received":
+        msg = ev.get("message", {})
+        if msg.get("direction") == "inbound":
+            for attempt in range(3):
+                try:
+                    await respond(msg, received_at, tenant)
+                    break
+                except Exception:
+                    if attempt == 2:
+                        logger.error("failed after retries for message %s", msg.get('id'))
+                    else:
+                        await asyncio.sleep(0.5 * (2 ** attempt) + random.random()/10)
 
 async def loop():
     logger.info("started")
     from az_queue import queue as _queue
+    from config import get_settings
+    batch_size = max(1, get_settings().memory_queue_batch_size)
     while True:
-        ev = await _queue.get()
-        logger.debug("event id=%s type=%s ts=%s", ev.get('message', {}).get('id'), ev.get('event'), ev.get('timestamp'))
-        if ev.get("event") == "message_received":
-            msg = ev.get("message", {})
-            if msg.get("direction") == "inbound":
-                for attempt in range(3):
-                    try:
-                        await respond(msg)
-                        break
-                    except Exception:
-                        if attempt == 2:
-                            logger.error("failed after retries for message %s", msg.get('id'))
-                        else:
-                            await asyncio.sleep(0.5 * (2 ** attempt) + random.random()/10)
+        batch = await _queue.get_many(batch_size)
+        for ev in batch:
+            if events_in_flight:
+                events_in_flight.inc()
+            try:
+                await handle_event(ev)
+            finally:
+                if events_in_flight:
+                    events_in_flight.dec()
 
 if __name__ == "__main__":
     asyncio.run(loop())
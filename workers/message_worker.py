@@ -2,43 +2,117 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import os
+import signal
 import time
 from typing import Any
 
 from config import get_settings
 from services.classifier import classifier
 from services.whatsapp_client import client as waclient
-from metrics import events_processed_total, processing_latency, events_intent_total
+from metrics import (
+    events_processed_total, processing_latency, events_intent_total,
+    tenant_queue_depth, tenant_queue_wait, tenant_processing_latency,
+    reply_latency, events_in_flight, stage_timer, observe_stage,
+)
 from debug_state import add_reply
 
 logger = logging.getLogger("message_worker")
 settings = get_settings()
 
 class MessageWorker:
-    def __init__(self, queue, dedupe_store=None) -> None:
+    def __init__(self, queue, dedupe_store=None, concurrency: int | None = None) -> None:
         self.queue = queue
         self.dedupe_store = dedupe_store
+        # >1: itens processados em paralelo
+        self.concurrency = max(1, concurrency or settings.worker_concurrency)
         self._stopping = False
+        self._tasks: set[asyncio.Task] = set()
 
     async def start(self):
-        logger.info("MessageWorker start loop backend=%s", settings.queue_backend)
+        logger.info("MessageWorker start loop backend=%s concurrency=%s", settings.queue_backend, self.concurrency)
+        slots = asyncio.Semaphore(self.concurrency)
         while not self._stopping:
             try:
-                item = None
-                if settings.queue_backend == 'redis':
-                    item = self.queue.pop(timeout=5)  # brpop
-                else:
+                if not settings.durable_queue:
                     await asyncio.sleep(1)
                     continue  # memory worker já existente separado
+                await slots.acquire()
+                try:
+                    # brpop / claim sqlite bloqueiam: em thread, o loop segue livre para
+                    # anotações, heartbeat e sinais enquanto a fila está vazia
+                    item = await asyncio.to_thread(self.queue.pop, 5)
+                except BaseException:
+                    slots.release()
+                    raise
+                self._export_depths()
                 if not item:
+                    slots.release()
+                    continue
+                if self.concurrency == 1:
+                    try:
+                        await self._handle(item)
+                    finally:
+                        slots.release()
                     continue
-                start = time.time()
-                await self.process(item)
-                if processing_latency:
-                    processing_latency.observe(time.time() - start)
+                task = asyncio.create_task(self._handle(item))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                task.add_done_callback(lambda _t: slots.release())
             except Exception as e:  # pragma: no cover
                 logger.exception("Loop error: %s", e)
                 await asyncio.sleep(2)
+        # parada graciosa: termina o que já saiu da fila antes de devolver
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info("MessageWorker parado")
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    async def _handle(self, item: dict):
+        tenant = str(item.get('tenant') or settings.static_tenant_id)
+        start = time.time()
+        enqueued_at = item.get('enqueued_at')
+        if isinstance(enqueued_at, (int, float)):
+            observe_stage('queue_wait', start - enqueued_at)
+            if tenant_queue_wait:
+                tenant_queue_wait.labels(tenant=tenant).observe(max(0.0, start - enqueued_at))
+        if events_in_flight:
+            events_in_flight.inc()
+        try:
+            await self.process(item)
+        except Exception as e:  # pragma: no cover
+            # sem ack: backends com visibilidade reentregam o item
+            logger.exception("Process error: %s", e)
+            return
+        finally:
+            if events_in_flight:
+                events_in_flight.dec()
+        ack = getattr(self.queue, 'ack', None)
+        if ack:
+            ack(item)
+        elapsed = time.time() - start
+        if processing_latency:
+            processing_latency.observe(elapsed)
+        if tenant_processing_latency:
+            tenant_processing_latency.labels(tenant=tenant).observe(elapsed)
+
+    def _incr_stat(self, name: str) -> None:
+        if not settings.durable_queue:
+            return
+        try:
+            incr = getattr(self.queue, 'incr', None) or self.queue.client.incr  # type: ignore[attr-defined]
+            incr(name)
+        except Exception:
+            pass
+
+    def _export_depths(self) -> None:
+        depths = getattr(self.queue, 'depths', None)
+        if not tenant_queue_depth or depths is None:
+            return
+        for tenant, depth in depths().items():
+            tenant_queue_depth.labels(tenant=tenant).set(depth)
 
     async def process(self, item: dict):
         attempt = int(item.get('attempt', 0))
@@ -61,7 +135,8 @@ class MessageWorker:
             if events_processed_total:
                 events_processed_total.labels(status='ignored').inc()
             return
-        classification = classifier.classify(text)
+        with stage_timer('classify'):
+            classification = classifier.classify(text)
         logger.debug(
             "Processing message id=%s attempt=%s intent=%s text_len=%s",
             msg.get('id'), attempt, classification['intent'], len(text)
@@ -88,7 +163,16 @@ class MessageWorker:
             if events_processed_total:
                 events_processed_total.labels(status='ignored').inc()
             return
-        ok = await waclient.send_message(to, reply)
+        with stage_timer('send'):
+            # agrupar respostas só faz sentido com envios simultâneos
+            ok = await waclient.send_message(
+                to, reply, sender=item.get('tenant'), coalesce=self.concurrency > 1
+            )
+        received_at = item.get('received_at')
+        if ok and reply_latency and isinstance(received_at, (int, float)):
+            reply_latency.labels(
+                tenant=str(item.get('tenant') or settings.static_tenant_id), intent=intent
+            ).observe(max(0.0, time.time() - received_at))
         logger.info(
             "Reply dispatch to=%s ok=%s original_id=%s intent=%s text='%s' reply='%s' attempt=%s",
             to, ok, msg.get('id'), intent, text[:120], reply[:120], attempt
@@ -116,11 +200,7 @@ class MessageWorker:
                 )
             except Exception:  # pragma: no cover
                 pass
-            if settings.queue_backend == 'redis':
-                try:
-                    self.queue.client.incr('stats:processed_success')  # type: ignore[attr-defined]
-                except Exception:
-                    pass
+            self._incr_stat('stats:processed_success')
         else:
             if attempt + 1 < settings.worker_max_attempts:
                 backoff = 2 ** attempt * 2
@@ -129,14 +209,52 @@ class MessageWorker:
                 )
                 await asyncio.sleep(backoff)
                 item['attempt'] = attempt + 1
-                if settings.queue_backend == 'redis':
+                if settings.durable_queue:
                     self.queue.put(item)
             else:
                 logger.error(
                     "Mensagem falhou após %s tentativas id=%s", attempt + 1, msg.get('id')
                 )
-                if settings.queue_backend == 'redis':
-                    try:
-                        self.queue.client.incr('stats:processed_failed')  # type: ignore[attr-defined]
-                    except Exception:
-                        pass
+                self._incr_stat('stats:processed_failed')
+
+
+async def _heartbeat(path: str, interval: float = 2.0) -> None:
+    # mtime do arquivo = prova de que o event loop ainda gira (lido pelo supervisor)
+    while True:
+        try:
+            with open(path, "a"):
+                os.utime(path)
+        except OSError as e:  # pragma: no cover
+            logger.debug("Falha heartbeat %s: %s", path, e)
+        await asyncio.sleep(interval)
+
+
+async def run_worker_process() -> None:
+    from queues.factory import build_queue
+    from storage.processed_events_store import build_store
+    queue = build_queue(settings)
+    mw = MessageWorker(queue, build_store(settings))
+    # signal.signal e não loop.add_signal_handler: o pop síncrono prende o loop por
+    # até 5s e o callback do loop só rodaria depois de mais um pop inteiro
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: mw.stop())
+    heartbeat_file = os.getenv("AGENT_WORKER_HEARTBEAT_FILE")
+    hb = asyncio.create_task(_heartbeat(heartbeat_file)) if heartbeat_file else None
+    try:
+        await mw.start()
+        await waclient.aclose()
+    finally:
+        if hb:
+            hb.cancel()
+        close = getattr(queue, 'close', None)
+        if close:
+            close()  # sqlite: grava acks pendentes
+
+
+if __name__ == "__main__":
+    # processo de worker do modo supervisor (az_daemon com AGENT_DAEMON_MODE=supervisor)
+    from logging_config import setup_logging
+    setup_logging()
+    if not settings.durable_queue:
+        raise SystemExit("QUEUE_BACKEND=memory não é compartilhável entre processos; use redis ou sqlite")
+    asyncio.run(run_worker_process())